@@ -0,0 +1,276 @@
+"""Read-only JSON API under ``/api/v1`` for the front-desk tablets.
+
+Each resource is a set of named columns, like the exports, so ``?fields=``
+narrows the SELECT itself rather than trimming full objects. Lists are keyset
+paginated by id with the same ``cursor``/``per_page`` parameters as the admin
+pages. Every response carries an ETag of its body, and a single item with an
+``updated_at`` also gets a Last-Modified header; a matching ``If-None-Match``
+or ``If-Modified-Since`` gets an empty 304. Lists are validated by the ETag
+alone, since the newest row on a page says nothing of rows added or removed.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from flask import Blueprint, jsonify, request
+
+from models import db, User, StudentProfile, TeacherProfile, Batch, Classroom, ClassSession, RegistrationRequest, Job
+from pagination import paginate_keyset, get_page_size, page_url
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class Resource:
+    """Columns, filters and change timestamps exposed for one entity"""
+
+    def __init__(self, model, fields, modified, filters=(), date_column=None, base=None):
+        self.model = model
+        self.fields = fields
+        self.modified = modified  # updated_at columns; the newest one is the row's Last-Modified
+        self.filters = filters  # field names usable as ?name=value
+        self.date_column = date_column  # column ?from= and ?to= apply to
+        self.base = base  # extra joins and conditions for the query
+
+    def query(self, names, stamped=False):
+        columns = [self.fields[name].label(name) for name in names]
+        if stamped:
+            columns += [column.label(f'_modified{i}') for i, column in enumerate(self.modified)]
+        query = db.session.query(*columns).select_from(self.model)
+        return self.base(query) if self.base else query
+
+
+def _students(query):
+    return query.outerjoin(StudentProfile, StudentProfile.user_id == User.id).filter(User.role == 'student')
+
+
+def _teachers(query):
+    return query.outerjoin(TeacherProfile, TeacherProfile.user_id == User.id).filter(User.role == 'teacher')
+
+
+RESOURCES = {
+    'students': Resource(User, {
+        'id': User.id,
+        'name': User.name,
+        'email': User.email,
+        'phone': User.phone,
+        'status': User.status,
+        'student_id_number': StudentProfile.student_id_number,
+        'grade': StudentProfile.grade,
+        'batch_id': StudentProfile.batch_id,
+        'class_type': StudentProfile.class_type,
+        'dob': StudentProfile.dob,
+        'contact_number': StudentProfile.contact_number,
+        'address': StudentProfile.address,
+        'created_at': User.created_at,
+    }, [User.updated_at, StudentProfile.updated_at], filters=('status', 'batch_id', 'grade'), base=_students),
+    'teachers': Resource(User, {
+        'id': User.id,
+        'name': User.name,
+        'email': User.email,
+        'phone': User.phone,
+        'status': User.status,
+        'subjects': TeacherProfile.subjects,
+        'contact_number': TeacherProfile.contact_number,
+        'bio': TeacherProfile.bio,
+        'active_flag': TeacherProfile.active_flag,
+        'created_at': User.created_at,
+    }, [User.updated_at, TeacherProfile.updated_at], filters=('status',), base=_teachers),
+    'batches': Resource(Batch, {
+        'id': Batch.id,
+        'name': Batch.name,
+        'grade': Batch.grade,
+        'subject': Batch.subject,
+        'capacity': Batch.capacity,
+        'current_enrollment': Batch.current_enrollment,
+        'teacher_id': Batch.teacher_id,
+        'teacher_name': Batch.teacher_name,
+        'class_type': Batch.class_type,
+        'start_date': Batch.start_date,
+        'end_date': Batch.end_date,
+        'is_active': Batch.is_active,
+        'created_at': Batch.created_at,
+    }, [Batch.updated_at], filters=('is_active', 'teacher_id', 'grade', 'subject')),
+    'classrooms': Resource(Classroom, {
+        'id': Classroom.id,
+        'name': Classroom.name,
+        'capacity': Classroom.capacity,
+        'location': Classroom.location,
+        'is_active': Classroom.is_active,
+        'created_at': Classroom.created_at,
+    }, [Classroom.updated_at], filters=('is_active',)),
+    'sessions': Resource(ClassSession, {
+        'id': ClassSession.id,
+        'batch_id': ClassSession.batch_id,
+        'teacher_user_id': ClassSession.teacher_user_id,
+        'classroom_id': ClassSession.classroom_id,
+        'date': ClassSession.date,
+        'start_time': ClassSession.start_time,
+        'end_time': ClassSession.end_time,
+        'topic': ClassSession.topic,
+        'status': ClassSession.status,
+        'recurrence_id': ClassSession.recurrence_id,
+    }, [ClassSession.updated_at], filters=('batch_id', 'teacher_user_id', 'classroom_id', 'status'),
+        date_column=ClassSession.date),
+    'registrations': Resource(RegistrationRequest, {
+        'id': RegistrationRequest.id,
+        'name': RegistrationRequest.name,
+        'email': RegistrationRequest.email,
+        'mobile': RegistrationRequest.mobile,
+        'grade': RegistrationRequest.grade,
+        'class_type': RegistrationRequest.class_type,
+        'selected_batch_id': RegistrationRequest.selected_batch_id,
+        'student_id_number': RegistrationRequest.student_id_number,
+        'registration_type': RegistrationRequest.registration_type,
+        'payment_status': RegistrationRequest.payment_status,
+        'status': RegistrationRequest.status,
+        'claimed_by': RegistrationRequest.claimed_by,
+        'claimed_at': RegistrationRequest.claimed_at,
+        'version': RegistrationRequest.version,
+        'submitted_at': RegistrationRequest.submitted_at,
+        'processed_at': RegistrationRequest.processed_at,
+    }, [RegistrationRequest.updated_at], filters=('status', 'payment_status', 'registration_type', 'selected_batch_id'),
+        date_column=RegistrationRequest.submitted_at),
+    'jobs': Resource(Job, {
+        'id': Job.id,
+        'kind': Job.kind,
+        'payload': Job.payload,
+        'status': Job.status,
+        'attempts': Job.attempts,
+        'max_attempts': Job.max_attempts,
+        'run_at': Job.run_at,
+        'last_error': Job.last_error,
+        'result': Job.result,
+        'created_at': Job.created_at,
+        'finished_at': Job.finished_at,
+    }, [Job.updated_at], filters=('status', 'kind'), date_column=Job.created_at),
+}
+
+
+class ApiError(ValueError):
+    """A bad request parameter; the message is returned with a 400"""
+
+
+@api.errorhandler(ApiError)
+def _bad_request(e):
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _coerce(column, value):
+    """Turn a query-string value into the column's Python type"""
+    column_type = column.type
+    try:
+        if isinstance(column_type, db.Boolean):
+            if value.lower() not in ('1', '0', 'true', 'false'):
+                raise ValueError(value)
+            return value.lower() in ('1', 'true')
+        if isinstance(column_type, db.Integer):
+            return int(value)
+    except ValueError:
+        raise ApiError(f'Invalid value for {column.key}: {value}')
+    return value
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError('Dates must be YYYY-MM-DD')
+
+
+def _selected_fields(resource):
+    """Field names from ``?fields=a,b``; ``id`` is always included"""
+    requested = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    if not requested:
+        return list(resource.fields)
+    unknown = [name for name in requested if name not in resource.fields]
+    if unknown:
+        raise ApiError(f'Unknown field(s): {", ".join(unknown)}')
+    return ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+
+def _filtered(resource, query):
+    for name in resource.filters:
+        value = request.args.get(name)
+        if value is not None and value != '':
+            column = resource.fields[name]
+            query = query.filter(column == _coerce(column, value))
+    if resource.date_column is not None:
+        # ?from= and ?to= are whole days, inclusive
+        column = resource.date_column
+        is_datetime = isinstance(column.type, db.DateTime)
+        date_from = _parse_day(request.args.get('from'))
+        date_to = _parse_day(request.args.get('to'))
+        if date_from:
+            query = query.filter(column >= (datetime.combine(date_from, time.min) if is_datetime else date_from))
+        if date_to:
+            if is_datetime:
+                query = query.filter(column < datetime.combine(date_to + timedelta(days=1), time.min))
+            else:
+                query = query.filter(column <= date_to)
+    return query
+
+
+def _last_modified(row, resource):
+    """Newest change time of a stamped row, or None if it has never been stamped"""
+    stamps = [getattr(row, f'_modified{i}') for i in range(len(resource.modified))]
+    # A row missing any stamp predates updated_at; its change time is unknown
+    if any(stamp is None for stamp in stamps):
+        return None
+    return max(stamps)
+
+
+def _conditional(payload, last_modified=None):
+    """JSON response with validators, turned into a 304 if the client is current"""
+    response = jsonify(payload)
+    response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'  # Always revalidate, never serve stale
+    return response.make_conditional(request)
+
+
+@api.route('/<resource_name>')
+def list_resource(resource_name):
+    """List a resource, keyset paginated by id"""
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return jsonify({'success': False, 'message': f'Unknown resource: {resource_name}'}), 404
+    names = _selected_fields(resource)
+    query = _filtered(resource, resource.query(names))
+
+    id_column = resource.fields['id']
+    page = paginate_keyset(query, [(id_column, False)], cursor=request.args.get('cursor'),
+                           per_page=get_page_size())
+
+    payload = {
+        'data': [{name: _plain(getattr(row, name)) for name in names} for row in page.items],
+        'meta': {'total': page.total, 'per_page': page.per_page},
+        'links': {
+            'next': page_url(page.next_cursor) if page.has_next else None,
+            'prev': page_url(page.prev_cursor) if page.has_prev else None,
+        },
+    }
+    return _conditional(payload)
+
+
+@api.route('/<resource_name>/<int:item_id>')
+def get_resource(resource_name, item_id):
+    """One item of a resource"""
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return jsonify({'success': False, 'message': f'Unknown resource: {resource_name}'}), 404
+    names = _selected_fields(resource)
+    row = resource.query(names, stamped=True).filter(resource.fields['id'] == item_id).first()
+    if row is None:
+        return jsonify({'success': False, 'message': f'{resource_name} {item_id} not found'}), 404
+    payload = {'data': {name: _plain(getattr(row, name)) for name in names}}
+    return _conditional(payload, _last_modified(row, resource))
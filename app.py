@@ -1,15 +1,53 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from datetime import datetime
 import os
-from models import db, User, StudentProfile, TeacherProfile, Batch, RegistrationRequest, Classroom, ClassSession
+import time
+import click
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
+from models import db, User, StudentProfile, TeacherProfile, Batch, RegistrationRequest, Classroom, ClassSession, SessionRecurrence, Holiday
+from pagination import paginate_keyset, get_page_size, page_url
+from stats import batch_enrollment_counts, stats_cache
+from search import apply_search
+from registrations import (accept_registrations, claim_request, reject_request, mark_request_paid,
+                           RegistrationConflict)
+from enrollment import move_student, reserve_seats, reconcile_enrollment, EnrollmentError
+from importer import import_people
+from exporter import stream_export, resolve_columns, EXPORT_COLUMNS, EXPORT_FORMATS
+from scheduling import find_conflicts, conflict_report, describe_conflicts, extend_recurrences, RECURRENCE_HORIZON_DAYS
+from timetable import plan_week, apply_plan
+from migrations import run_migrations, pending_migrations, MIGRATIONS
+from database import engine_options, apply_profile, normalize_uri
+from api import api
+from fragments import cached_fragment, schedule_filter_options
+from profiling import init_profiling
+from metrics import init_metrics
+from jobs import init_jobs, enqueue, enqueue_many, retry_job, job_worker
+import notifications  # Registers the notification tasks
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///nanapatha.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = normalize_uri(os.environ.get('DATABASE_URL', 'sqlite:///nanapatha.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLITE_PROFILE'])
+app.config['PROFILING'] = os.environ.get('PROFILING') == '1'
+app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')  # Shared by all workers of one deployment
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', '2'))  # Background job threads per process
 
 # Initialize database
 db.init_app(app)
+with app.app_context():
+    apply_profile(db.engine, app.config['SQLITE_PROFILE'])
+app.register_blueprint(api)
+init_metrics(app)
+init_jobs(app)
+if app.config['PROFILING']:
+    init_profiling(app)
+
+# Template helpers
+app.jinja_env.globals['page_url'] = page_url
+app.jinja_env.globals['cached_fragment'] = cached_fragment
 
 # Ensure data directory exists
 os.makedirs('data', exist_ok=True)
@@ -19,9 +57,9 @@ os.makedirs('data', exist_ok=True)
 def admin_dashboard():
     """Admin Dashboard - main overview page"""
     # Get summary statistics
-    total_students = User.query.filter_by(role='student', status='active').count()
-    total_teachers = User.query.filter_by(role='teacher', status='active').count()
-    pending_registrations = RegistrationRequest.query.filter_by(status='pending').count()
+    total_students = stats_cache.get('active_students')
+    total_teachers = stats_cache.get('active_teachers')
+    pending_registrations = stats_cache.get('pending_registrations')
     
     # Get recent pending registrations
     recent_registrations = RegistrationRequest.query.filter_by(status='pending').order_by(RegistrationRequest.submitted_at.desc()).limit(10).all()
@@ -57,7 +95,7 @@ def admin_registrations():
     search_query = request.args.get('search', '')
     type_filter = request.args.get('filter', 'all')  # New filter for registration type
     
-    query = RegistrationRequest.query
+    query = RegistrationRequest.query.options(joinedload(RegistrationRequest.selected_batch))
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
@@ -68,16 +106,20 @@ def admin_registrations():
     elif type_filter == 'new':
         query = query.filter_by(registration_type='new')
     
+    sort_keys = [(RegistrationRequest.submitted_at, True), (RegistrationRequest.id, True)]
     if search_query:
-        query = query.filter(
-            (RegistrationRequest.name.contains(search_query)) |
-            (RegistrationRequest.email.contains(search_query))
-        )
+        query, sort_keys = apply_search(query, RegistrationRequest, search_query, sort_keys)
     
-    registrations = query.order_by(RegistrationRequest.submitted_at.desc()).all()
+    page = paginate_keyset(
+        query,
+        sort_keys,
+        cursor=request.args.get('cursor'),
+        per_page=get_page_size()
+    )
     
     return render_template('admin/registrations.html', 
-                         registrations=registrations,
+                         registrations=page.items,
+                         page=page,
                          status_filter=status_filter,
                          search_query=search_query,
                          type_filter=type_filter)
@@ -90,7 +132,7 @@ def admin_registration_detail(reg_id):
     # Get related batch if selected
     selected_batch = None
     if registration.selected_batch_id:
-        selected_batch = Batch.query.get(registration.selected_batch_id)
+        selected_batch = Batch.query.options(selectinload(Batch.students)).get(registration.selected_batch_id)
     
     return render_template('admin/registration_detail.html', 
                          registration=registration,
@@ -101,44 +143,56 @@ def accept_registration(reg_id):
     """Accept a registration request and create student account"""
     registration = RegistrationRequest.query.get_or_404(reg_id)
     
-    if registration.status != 'pending':
-        flash('Registration has already been processed', 'error')
+    # The version the admin was looking at; a stale one means someone else acted first
+    version = request.form.get('version', type=int)
+    result, = accept_registrations([reg_id], versions={reg_id: version} if version else None)
+    if not result['success']:
+        flash(result['message'], 'error')
         return redirect(url_for('admin_registration_detail', reg_id=reg_id))
     
-    # Create user account
-    user = User(
-        name=registration.name,
-        email=registration.email,
-        role='student',
-        status='active',
-        temp_password='temp123',  # In real app, generate secure temp password
-        created_at=datetime.utcnow()
-    )
-    db.session.add(user)
-    db.session.flush()  # Get user ID
-    
-    # Create student profile
-    student_profile = StudentProfile(
-        user_id=user.id,
-        dob=registration.dob,
-        grade=registration.grade,
-        contact_number=registration.mobile,
-        address=registration.address,
-        class_type=registration.class_type,
-        batch_id=registration.selected_batch_id,
-        student_id_number=registration.student_id_number
-    )
-    db.session.add(student_profile)
-    
-    # Update registration status
-    registration.status = 'accepted'
-    registration.admin_note = f"Accepted by admin on {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
-    
-    db.session.commit()
+    stats_cache.adjust('pending_registrations', -1)
+    stats_cache.adjust('active_students', 1)
+    enqueue('welcome_email', {'user_id': result['user_id']})
     
     flash(f'Registration accepted! Student account created for {registration.name}. Temporary password: temp123', 'success')
     return redirect(url_for('admin_registrations'))
 
+@app.route('/admin/registrations/bulk-accept', methods=['POST'])
+def bulk_accept_registrations():
+    """Accept many registration requests in one transaction"""
+    if request.is_json:
+        reg_ids = (request.get_json(silent=True) or {}).get('registration_ids', [])
+    else:
+        reg_ids = request.form.getlist('registration_ids')
+    
+    try:
+        results = accept_registrations(reg_ids)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('admin_registrations'))
+    
+    accepted = [r for r in results if r['success']]
+    stats_cache.adjust('pending_registrations', -len(accepted))
+    stats_cache.adjust('active_students', len(accepted))
+    # Welcome emails go out in the background; their ids can be polled at /api/v1/jobs/<id>
+    job_ids = enqueue_many('welcome_email', [{'user_id': r['user_id']} for r in accepted])
+    for result, job_id in zip(accepted, job_ids):
+        result['job_id'] = job_id
+    
+    if request.is_json:
+        return jsonify({'success': len(accepted) == len(results), 'accepted': len(accepted), 'results': results})
+    
+    if not results:
+        flash('Select at least one registration to accept', 'error')
+    elif len(accepted) == len(results):
+        flash(f'{len(accepted)} registration(s) accepted. Temporary password: temp123', 'success')
+    else:
+        flash(f'{len(accepted)} of {len(results)} registration(s) accepted. '
+              + '; '.join(f"#{r['id']}: {r['message']}" for r in results if not r['success']), 'error')
+    return redirect(url_for('admin_registrations'))
+
 @app.route('/admin/registrations/<int:reg_id>/reject', methods=['POST'])
 def reject_registration(reg_id):
     """Reject a registration request with reason"""
@@ -149,10 +203,12 @@ def reject_registration(reg_id):
         flash('Rejection reason is required', 'error')
         return redirect(url_for('admin_registration_detail', reg_id=reg_id))
     
-    registration.status = 'rejected'
-    registration.admin_note = f"Rejected: {reason}"
-    
-    db.session.commit()
+    try:
+        reject_request(reg_id, reason, version=request.form.get('version', type=int))
+    except RegistrationConflict as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_registration_detail', reg_id=reg_id))
+    stats_cache.adjust('pending_registrations', -1)
     
     flash(f'Registration rejected for {registration.name}', 'success')
     return redirect(url_for('admin_registrations'))
@@ -160,23 +216,25 @@ def reject_registration(reg_id):
 @app.route('/admin/registrations/<int:reg_id>/claim', methods=['POST'])
 def claim_registration(reg_id):
     """Claim a registration for review"""
-    registration = RegistrationRequest.query.get_or_404(reg_id)
-    
-    registration.claimed_by = 'Admin User'  # In real app, use current admin user
-    registration.claimed_at = datetime.utcnow()
+    RegistrationRequest.query.get_or_404(reg_id)
     
-    db.session.commit()
+    try:
+        claim_request(reg_id)  # In real app, use current admin user
+    except RegistrationConflict as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
     
     return jsonify({'success': True, 'message': 'Registration claimed'})
 
 @app.route('/admin/registrations/<int:reg_id>/mark-paid', methods=['POST'])
 def mark_paid(reg_id):
     """Mark registration payment as received"""
-    registration = RegistrationRequest.query.get_or_404(reg_id)
-    
-    registration.payment_status = 'paid'
+    RegistrationRequest.query.get_or_404(reg_id)
     
-    db.session.commit()
+    try:
+        mark_request_paid(reg_id, version=request.form.get('version', type=int))
+    except RegistrationConflict as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_registration_detail', reg_id=reg_id))
     
     flash('Payment marked as received', 'success')
     return redirect(url_for('admin_registration_detail', reg_id=reg_id))
@@ -208,6 +266,7 @@ def student_register_new_submit():
     
     db.session.add(registration)
     db.session.commit()
+    stats_cache.adjust('pending_registrations', 1)
     
     flash('Registration submitted successfully! Please wait for admin approval.', 'success')
     return redirect(url_for('student_register_new'))
@@ -233,6 +292,7 @@ def student_register_existing_submit():
     
     db.session.add(registration)
     db.session.commit()
+    stats_cache.adjust('pending_registrations', 1)
     
     flash('Registration submitted successfully! Please wait for admin approval.', 'success')
     return redirect(url_for('student_register_existing'))
@@ -244,36 +304,44 @@ def admin_students():
     search_query = request.args.get('search', '')
     status_filter = request.args.get('status', 'all')
     
-    query = User.query.filter_by(role='student')
+    query = User.query.filter_by(role='student').options(
+        joinedload(User.student_profile).joinedload(StudentProfile.batch)
+    )
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
+    sort_keys = [(User.created_at, True), (User.id, True)]
     if search_query:
-        query = query.filter(
-            db.or_(
-                User.name.contains(search_query),
-                User.email.contains(search_query)
-            )
-        )
+        query, sort_keys = apply_search(query, User, search_query, sort_keys)
     
-    students = query.order_by(User.created_at.desc()).all()
+    page = paginate_keyset(
+        query,
+        sort_keys,
+        cursor=request.args.get('cursor'),
+        per_page=get_page_size()
+    )
     
     return render_template('admin/students.html', 
-                         students=students,
+                         students=page.items,
+                         page=page,
                          status_filter=status_filter,
                          search_query=search_query)
 
 @app.route('/admin/students/<int:student_id>')
 def admin_student_detail(student_id):
     """Admin Student Detail View"""
-    student = User.query.filter_by(id=student_id, role='student').first_or_404()
+    student = User.query.filter_by(id=student_id, role='student').options(
+        joinedload(User.student_profile).joinedload(StudentProfile.batch)
+    ).first_or_404()
     return render_template('admin/student_detail.html', student=student)
 
 @app.route('/admin/students/<int:student_id>/edit')
 def admin_student_edit(student_id):
     """Edit Student Form"""
-    student = User.query.filter_by(id=student_id, role='student').first_or_404()
+    student = User.query.filter_by(id=student_id, role='student').options(
+        joinedload(User.student_profile)
+    ).first_or_404()
     batches = Batch.query.all()
     return render_template('admin/student_edit.html', 
                          student=student, 
@@ -301,19 +369,19 @@ def admin_student_edit_submit(student_id):
     profile.address = request.form.get('address')
     profile.class_type = request.form.get('class_type')
     
-    # Handle batch assignment
-    batch_id = request.form.get('batch_id')
-    if batch_id:
-        profile.batch_id = int(batch_id)
-    else:
-        profile.batch_id = None
-    
     # Handle date of birth
     dob_str = request.form.get('dob')
     if dob_str:
-        from datetime import datetime
         profile.dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
     
+    # Handle batch assignment
+    batch_id = request.form.get('batch_id')
+    try:
+        move_student(profile, int(batch_id) if batch_id else None, commit=False)
+    except EnrollmentError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_student_edit', student_id=student_id))
+    
     db.session.commit()
     flash(f'Student {student.name} updated successfully!', 'success')
     return redirect(url_for('admin_student_detail', student_id=student.id))
@@ -322,10 +390,13 @@ def admin_student_edit_submit(student_id):
 def admin_student_deactivate(student_id):
     """Deactivate Student"""
     student = User.query.filter_by(id=student_id, role='student').first_or_404()
+    was_active = student.status == 'active'
     student.status = 'inactive'
     student.updated_at = datetime.utcnow()
     
     db.session.commit()
+    if was_active:
+        stats_cache.adjust('active_students', -1)
     flash(f'Student {student.name} has been deactivated.', 'info')
     return redirect(url_for('admin_students'))
 
@@ -350,6 +421,12 @@ def admin_student_create_submit():
     db.session.add(user)
     db.session.flush()
     
+    batch_id = int(request.form['batch_id']) if request.form.get('batch_id') else None
+    if batch_id and not reserve_seats(batch_id):
+        db.session.rollback()
+        flash('Selected batch is full or invalid!', 'error')
+        return redirect(url_for('admin_student_create'))
+    
     student_profile = StudentProfile(
         user_id=user.id,
         grade=request.form.get('grade'),
@@ -357,65 +434,99 @@ def admin_student_create_submit():
         guardian_name=request.form.get('guardian_name'),
         guardian_phone=request.form.get('guardian_phone'),
         emergency_contact=request.form.get('emergency_contact'),
-        batch_id=int(request.form['batch_id']) if request.form.get('batch_id') else None,
+        batch_id=batch_id,
         student_id_number=request.form.get('student_id_number') or f"STU{user.id:06d}"
     )
     db.session.add(student_profile)
     db.session.commit()
+    stats_cache.invalidate('active_students')
+    enqueue('welcome_email', {'user_id': user.id})
     
     flash(f'Student {user.name} created successfully!', 'success')
     return redirect(url_for('admin_students'))
 
+def _import_upload(role, list_endpoint):
+    """Run an uploaded CSV/XLSX file through the import pipeline"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+        flash('Please choose a CSV or Excel file to import', 'error')
+        return redirect(url_for(list_endpoint))
+    
+    file_format = 'xlsx' if upload.filename.lower().endswith('.xlsx') else 'csv'
+    try:
+        report = import_people(upload.stream, role, file_format=file_format)
+    except ValueError as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for(list_endpoint))
+    
+    stats_cache.invalidate('active_students' if role == 'student' else 'active_teachers')
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': report.failed == 0, **report.to_dict()})
+    
+    if report.failed:
+        first_errors = '; '.join(f"row {e['row']}: {', '.join(e['errors'])}" for e in report.errors[:5])
+        flash(f'Imported {report.inserted} of {report.rows} rows. {report.failed} failed - {first_errors}', 'error')
+    else:
+        flash(f'Imported {report.inserted} {role}s successfully!', 'success')
+    return redirect(url_for(list_endpoint))
+
+@app.route('/admin/students/import', methods=['POST'])
+def admin_student_import():
+    """Import Students from CSV/Excel"""
+    return _import_upload('student', 'admin_students')
+
 # Student-Batch Assignment Routes
 @app.route('/admin/students/<int:student_id>/assign-batch')
 def admin_student_assign_batch(student_id):
     """Student Batch Assignment Form"""
-    student = StudentProfile.query.get_or_404(student_id)
-    batches = Batch.query.filter_by(is_active=True).all()
+    student = StudentProfile.query.options(
+        joinedload(StudentProfile.user),
+        joinedload(StudentProfile.batch)
+    ).get_or_404(student_id)
+    batches = Batch.query.filter_by(is_active=True).options(
+        joinedload(Batch.teacher).joinedload(TeacherProfile.user)
+    ).all()
     return render_template('admin/student_assign_batch.html', student=student, batches=batches)
 
 @app.route('/admin/students/<int:student_id>/assign-batch', methods=['POST'])
 def admin_student_assign_batch_submit(student_id):
     """Assign Student to Batch"""
     student = StudentProfile.query.get_or_404(student_id)
-    old_batch = student.batch
     new_batch_id = request.form.get('batch_id')
+    had_batch = student.batch_id is not None
+    
+    try:
+        move_student(student, int(new_batch_id) if new_batch_id else None)
+    except EnrollmentError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_students'))
     
     if new_batch_id:
-        new_batch = Batch.query.get(int(new_batch_id))
-        if new_batch and new_batch.current_enrollment < new_batch.capacity:
-            # Update student's batch
-            student.batch_id = int(new_batch_id)
-            
-            # Update enrollment counts
-            if old_batch:
-                old_batch.current_enrollment = max(0, old_batch.current_enrollment - 1)
-            new_batch.current_enrollment += 1
-            
-            db.session.commit()
-            flash(f'Student {student.user.name} assigned to batch {new_batch.name}!', 'success')
-        else:
-            flash('Selected batch is full or invalid!', 'error')
-    else:
-        # Remove from current batch
-        if old_batch:
-            old_batch.current_enrollment = max(0, old_batch.current_enrollment - 1)
-            student.batch_id = None
-            db.session.commit()
-            flash(f'Student {student.user.name} removed from batch!', 'info')
+        flash(f'Student {student.user.name} assigned to batch {db.session.get(Batch, int(new_batch_id)).name}!', 'success')
+    elif had_batch:
+        flash(f'Student {student.user.name} removed from batch!', 'info')
     
     return redirect(url_for('admin_students'))
 
 @app.route('/admin/batches/<int:batch_id>/manage-students')
 def admin_batch_manage_students(batch_id):
     """Batch Student Management"""
-    batch = Batch.query.get_or_404(batch_id)
-    current_students = StudentProfile.query.filter_by(batch_id=batch_id).all()
+    batch = Batch.query.options(
+        joinedload(Batch.teacher).joinedload(TeacherProfile.user)
+    ).get_or_404(batch_id)
+    current_students = StudentProfile.query.filter_by(batch_id=batch_id).options(
+        joinedload(StudentProfile.user)
+    ).all()
     # Get available students through User model join for status check
     available_students = StudentProfile.query.join(User).filter(
         StudentProfile.batch_id.is_(None),
         User.status == 'active'
-    ).all()
+    ).options(contains_eager(StudentProfile.user)).all()
     return render_template('admin/batch_manage_students.html', 
                          batch=batch, 
                          current_students=current_students,
@@ -426,18 +537,18 @@ def admin_batch_add_student(batch_id):
     """Add Student to Batch"""
     batch = Batch.query.get_or_404(batch_id)
     student_id = request.form.get('student_id')
+    student = StudentProfile.query.get(int(student_id)) if student_id else None
     
-    if student_id and batch.current_enrollment < batch.capacity:
-        student = StudentProfile.query.get(int(student_id))
-        if student and not student.batch_id:
-            student.batch_id = batch_id
-            batch.current_enrollment += 1
-            db.session.commit()
-            flash(f'Student {student.user.name} added to batch {batch.name}!', 'success')
-        else:
-            flash('Student is already in a batch!', 'error')
-    else:
+    if not student:
         flash('Batch is full or invalid student!', 'error')
+    elif student.batch_id:
+        flash('Student is already in a batch!', 'error')
+    else:
+        try:
+            move_student(student, batch_id)
+            flash(f'Student {student.user.name} added to batch {batch.name}!', 'success')
+        except EnrollmentError as e:
+            flash(str(e), 'error')
     
     return redirect(url_for('admin_batch_manage_students', batch_id=batch_id))
 
@@ -448,10 +559,11 @@ def admin_batch_remove_student(batch_id, student_id):
     student = StudentProfile.query.get_or_404(student_id)
     
     if student.batch_id == batch_id:
-        student.batch_id = None
-        batch.current_enrollment = max(0, batch.current_enrollment - 1)
-        db.session.commit()
-        flash(f'Student {student.user.name} removed from batch {batch.name}!', 'info')
+        try:
+            move_student(student, None)
+            flash(f'Student {student.user.name} removed from batch {batch.name}!', 'info')
+        except EnrollmentError as e:
+            flash(str(e), 'error')
     
     return redirect(url_for('admin_batch_manage_students', batch_id=batch_id))
 
@@ -462,23 +574,25 @@ def admin_teachers():
     search_query = request.args.get('search', '')
     status_filter = request.args.get('status', 'all')
     
-    query = User.query.filter_by(role='teacher')
+    query = User.query.filter_by(role='teacher').options(joinedload(User.teacher_profile))
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
+    sort_keys = [(User.name, False), (User.id, False)]
     if search_query:
-        query = query.filter(
-            db.or_(
-                User.name.contains(search_query),
-                User.email.contains(search_query)
-            )
-        )
+        query, sort_keys = apply_search(query, User, search_query, sort_keys)
     
-    teachers = query.order_by(User.name).all()
+    page = paginate_keyset(
+        query,
+        sort_keys,
+        cursor=request.args.get('cursor'),
+        per_page=get_page_size()
+    )
     
     return render_template('admin/teachers.html', 
-                         teachers=teachers,
+                         teachers=page.items,
+                         page=page,
                          search_query=search_query,
                          status_filter=status_filter)
 
@@ -514,14 +628,23 @@ def admin_teacher_create_submit():
     )
     db.session.add(teacher_profile)
     db.session.commit()
+    stats_cache.invalidate('active_teachers')
+    enqueue('welcome_email', {'user_id': user.id})
     
     flash(f'Teacher {user.name} created successfully!', 'success')
     return redirect(url_for('admin_teachers'))
 
+@app.route('/admin/teachers/import', methods=['POST'])
+def admin_teacher_import():
+    """Import Teachers from CSV/Excel"""
+    return _import_upload('teacher', 'admin_teachers')
+
 @app.route('/admin/teachers/<int:teacher_id>/edit')
 def admin_teacher_edit(teacher_id):
     """Edit Teacher Form"""
-    teacher = User.query.filter_by(id=teacher_id, role='teacher').first_or_404()
+    teacher = User.query.filter_by(id=teacher_id, role='teacher').options(
+        joinedload(User.teacher_profile)
+    ).first_or_404()
     return render_template('admin/teacher_edit.html', 
                          teacher=teacher,
                          today=datetime.now().date())
@@ -570,6 +693,7 @@ def admin_teacher_deactivate(teacher_id):
         teacher.teacher_profile.active_flag = False
     
     db.session.commit()
+    stats_cache.invalidate('active_teachers')
     flash(f'Teacher {teacher.name} has been deactivated.', 'info')
     return redirect(url_for('admin_teachers'))
 
@@ -577,8 +701,10 @@ def admin_teacher_deactivate(teacher_id):
 @app.route('/admin/teachers/<int:teacher_id>/assign-batch')
 def admin_teacher_assign_batch(teacher_id):
     """Teacher Batch Assignment Form"""
-    teacher = TeacherProfile.query.get_or_404(teacher_id)
-    batches = Batch.query.filter_by(is_active=True).all()
+    teacher = TeacherProfile.query.options(joinedload(TeacherProfile.user)).get_or_404(teacher_id)
+    batches = Batch.query.filter_by(is_active=True).options(
+        joinedload(Batch.teacher).joinedload(TeacherProfile.user)
+    ).all()
     return render_template('admin/teacher_assign_batch.html', teacher=teacher, batches=batches)
 
 @app.route('/admin/teachers/<int:teacher_id>/assign-batch', methods=['POST'])
@@ -614,12 +740,13 @@ def admin_teacher_assign_batch_submit(teacher_id):
 @app.route('/admin/teachers/<int:teacher_id>/teaching-load')
 def admin_teacher_teaching_load(teacher_id):
     """Teacher Teaching Load Management"""
-    teacher = TeacherProfile.query.get_or_404(teacher_id)
+    teacher = TeacherProfile.query.options(joinedload(TeacherProfile.user)).get_or_404(teacher_id)
     assigned_batches = Batch.query.filter_by(teacher_id=teacher_id, is_active=True).all()
     available_batches = Batch.query.filter_by(teacher_id=None, is_active=True).all()
     
     # Calculate total students and hours
-    total_students = sum(batch.current_enrollment for batch in assigned_batches)
+    enrollment_counts = batch_enrollment_counts([batch.id for batch in assigned_batches])
+    total_students = sum(enrollment_counts.values())
     total_batches = len(assigned_batches)
     
     return render_template('admin/teacher_teaching_load.html', 
@@ -632,11 +759,16 @@ def admin_teacher_teaching_load(teacher_id):
 @app.route('/admin/batches/<int:batch_id>/assign-teacher')
 def admin_batch_assign_teacher(batch_id):
     """Batch Teacher Assignment Form"""
-    batch = Batch.query.get_or_404(batch_id)
+    batch = Batch.query.options(
+        joinedload(Batch.teacher).joinedload(TeacherProfile.user)
+    ).get_or_404(batch_id)
     # Get active teachers through User model join
     teachers = TeacherProfile.query.join(User).filter(
         TeacherProfile.active_flag == True,
         User.status == 'active'
+    ).options(
+        contains_eager(TeacherProfile.user),
+        selectinload(TeacherProfile.assigned_batches)
     ).all()
     return render_template('admin/batch_assign_teacher.html', batch=batch, teachers=teachers)
 
@@ -675,11 +807,13 @@ def admin_batch_assign_teacher_submit(batch_id):
 @app.route('/admin/teachers/<int:teacher_id>/schedule')
 def admin_teacher_schedule(teacher_id):
     """Teacher Schedule Management"""
-    teacher = TeacherProfile.query.get_or_404(teacher_id)
+    teacher = TeacherProfile.query.options(joinedload(TeacherProfile.user)).get_or_404(teacher_id)
     # Get teacher's assigned batches and their sessions
     assigned_batches = Batch.query.filter_by(teacher_id=teacher_id, is_active=True).all()
     # Get upcoming sessions for this teacher
-    sessions = ClassSession.query.filter_by(teacher_user_id=teacher.user_id).all()
+    sessions = ClassSession.query.filter_by(teacher_user_id=teacher.user_id).options(
+        joinedload(ClassSession.batch)
+    ).all()
     return render_template('admin/teacher_schedule.html', 
                          teacher=teacher, 
                          assigned_batches=assigned_batches,
@@ -688,11 +822,13 @@ def admin_teacher_schedule(teacher_id):
 @app.route('/admin/teachers/<int:teacher_id>/performance')
 def admin_teacher_performance(teacher_id):
     """Teacher Performance Dashboard"""
-    teacher = TeacherProfile.query.get_or_404(teacher_id)
-    assigned_batches = Batch.query.filter_by(teacher_id=teacher_id, is_active=True).all()
+    teacher = TeacherProfile.query.options(joinedload(TeacherProfile.user)).get_or_404(teacher_id)
+    assigned_batches = Batch.query.filter_by(teacher_id=teacher_id, is_active=True).options(
+        selectinload(Batch.sessions)
+    ).all()
     
     # Calculate performance metrics
-    total_students = sum(batch.current_enrollment for batch in assigned_batches)
+    total_students = sum(batch_enrollment_counts([batch.id for batch in assigned_batches]).values())
     total_sessions = ClassSession.query.filter_by(teacher_user_id=teacher.user_id).count()
     completed_sessions = ClassSession.query.filter_by(
         teacher_user_id=teacher.user_id, 
@@ -716,9 +852,10 @@ def admin_batches():
     status_filter = request.args.get('status', '')
     
     query = Batch.query
+    sort_keys = [(Batch.created_at, True), (Batch.id, True)]
     
     if search_query:
-        query = query.filter(Batch.name.contains(search_query))
+        query, sort_keys = apply_search(query, Batch, search_query, sort_keys)
     
     if subject_filter:
         query = query.filter_by(subject=subject_filter)
@@ -729,17 +866,30 @@ def admin_batches():
     if status_filter:
         query = query.filter_by(status=status_filter)
     
-    batches = query.order_by(Batch.created_at.desc()).all()
+    page = paginate_keyset(
+        query.options(joinedload(Batch.teacher)),
+        sort_keys,
+        cursor=request.args.get('cursor'),
+        per_page=get_page_size()
+    )
+    
+    # Enrollment per batch and in total across every matching batch
+    enrollment_counts = batch_enrollment_counts(query.with_entities(Batch.id).order_by(None))
     
     return render_template('admin/batches.html', 
-                         batches=batches,
+                         batches=page.items,
+                         page=page,
+                         enrollment_counts=enrollment_counts,
+                         total_enrolled=sum(enrollment_counts.values()),
                          search_query=search_query,
                          now=datetime.now())
 
 @app.route('/admin/batches/create')
 def admin_batch_create():
     """Create New Batch Form"""
-    teachers = User.query.filter_by(role='teacher', status='active').all()
+    teachers = User.query.filter_by(role='teacher', status='active').options(
+        joinedload(User.teacher_profile)
+    ).all()
     return render_template('admin/batch_create.html', teachers=teachers)
 
 @app.route('/admin/batches/create', methods=['POST'])
@@ -765,8 +915,10 @@ def admin_batch_create_submit():
 @app.route('/admin/batches/<int:batch_id>/edit')
 def admin_batch_edit(batch_id):
     """Edit Batch Form"""
-    batch = Batch.query.get_or_404(batch_id)
-    teachers = User.query.filter_by(role='teacher', status='active').all()
+    batch = Batch.query.options(selectinload(Batch.students)).get_or_404(batch_id)
+    teachers = User.query.filter_by(role='teacher', status='active').options(
+        joinedload(User.teacher_profile)
+    ).all()
     return render_template('admin/batch_edit.html', 
                          batch=batch, 
                          teachers=teachers)
@@ -809,22 +961,28 @@ def admin_classrooms():
     status_filter = request.args.get('status', '')
     
     query = Classroom.query
+    sort_keys = [(Classroom.name, False), (Classroom.id, False)]
     
     if search_query:
-        query = query.filter(
-            db.or_(
-                Classroom.name.contains(search_query),
-                Classroom.location.contains(search_query) if Classroom.location else False
-            )
-        )
+        query, sort_keys = apply_search(query, Classroom, search_query, sort_keys)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
     
-    classrooms = query.order_by(Classroom.name).all()
+    page = paginate_keyset(
+        query,
+        sort_keys,
+        cursor=request.args.get('cursor'),
+        per_page=get_page_size()
+    )
+    
+    # Capacity across all matching classrooms, not just this page
+    total_capacity = query.with_entities(db.func.coalesce(db.func.sum(Classroom.capacity), 0)).scalar()
     
     return render_template('admin/classrooms.html', 
-                         classrooms=classrooms,
+                         classrooms=page.items,
+                         page=page,
+                         total_capacity=total_capacity,
                          search_query=search_query)
 
 @app.route('/admin/classrooms/create')
@@ -882,6 +1040,22 @@ def admin_classroom_archive(classroom_id):
     return redirect(url_for('admin_classrooms'))
 
 # Schedule Management Routes
+def build_session_grid(sessions):
+    """Index sessions by (date, hour) for every hour each session covers"""
+    grid = {}
+    for session in sessions:
+        last_hour = session.end_time.hour
+        # A session ending exactly on the hour does not occupy that hour
+        if session.end_time.minute == 0 and session.end_time.second == 0:
+            last_hour -= 1
+        for hour in range(session.start_time.hour, max(last_hour, session.start_time.hour) + 1):
+            grid.setdefault((session.date, hour), []).append(session)
+    
+    for cell_sessions in grid.values():
+        cell_sessions.sort(key=lambda s: (s.start_time, s.id or 0))
+    
+    return grid
+
 @app.route('/admin/schedule')
 def admin_schedule():
     """Admin Schedule View"""
@@ -898,13 +1072,23 @@ def admin_schedule():
     week_start = current_date - timedelta(days=current_date.weekday())
     week_end = week_start + timedelta(days=6)
     
+    # Recurring sessions are materialized when a rule is added and by the
+    # extend-recurrences command, never by viewing the page
+    session_loaders = (
+        joinedload(ClassSession.batch),
+        joinedload(ClassSession.classroom),
+        joinedload(ClassSession.teacher)
+    )
     sessions = ClassSession.query.filter(
         ClassSession.date >= week_start,
         ClassSession.date <= week_end
-    ).all()
+    ).options(*session_loaders).all()
+    
+    # Bucket the week's sessions by (date, hour) once for the grid
+    session_grid = build_session_grid(sessions)
     
     # Get today's sessions
-    today_sessions = ClassSession.query.filter_by(date=current_date).all()
+    today_sessions = ClassSession.query.filter_by(date=current_date).options(*session_loaders).all()
     
     # Get active sessions
     now = datetime.now().time()
@@ -914,13 +1098,12 @@ def admin_schedule():
     upcoming_sessions = [s for s in today_sessions if s.start_time > now]
     
     # Get data for filters
-    teachers = User.query.filter_by(role='teacher', status='active').all()
-    batches = Batch.query.all()
-    classrooms = Classroom.query.all()
+    teachers, batches, classrooms = schedule_filter_options()
     
     return render_template('admin/schedule.html',
                          current_date=current_date,
                          sessions=sessions,
+                         session_grid=session_grid,
                          today_sessions=today_sessions,
                          active_sessions=active_sessions,
                          upcoming_sessions=upcoming_sessions,
@@ -932,9 +1115,7 @@ def admin_schedule():
 @app.route('/admin/schedule/create')
 def admin_schedule_create_form():
     """Create Session Form"""
-    teachers = User.query.filter_by(role='teacher', status='active').all()
-    batches = Batch.query.all()
-    classrooms = Classroom.query.all()
+    teachers, batches, classrooms = schedule_filter_options()
     
     # Pre-fill form with query parameters
     date = request.args.get('date')
@@ -961,24 +1142,198 @@ def admin_schedule_create():
         status='scheduled'
     )
     
+    if session.end_time <= session.start_time:
+        flash('End time must be after start time', 'error')
+        return redirect(url_for('admin_schedule_create_form', date=request.form['date'], time=request.form['start_time']))
+    
+    # Reject double-booking of the classroom or teacher
+    conflicts = find_conflicts(session.date, session.start_time, session.end_time,
+                               classroom_id=session.classroom_id,
+                               teacher_user_id=session.teacher_user_id)
+    if conflicts['classroom'] or conflicts['teacher']:
+        flash(f'Scheduling conflict: {describe_conflicts(conflicts)}', 'error')
+        return redirect(url_for('admin_schedule_create_form', date=request.form['date'], time=request.form['start_time']))
+    
     db.session.add(session)
     db.session.commit()
     
     flash('Class session scheduled successfully!', 'success')
     return redirect(url_for('admin_schedule'))
 
+@app.route('/admin/batches/<int:batch_id>/recurrences', methods=['POST'])
+def admin_batch_recurrence_create(batch_id):
+    """Add a weekly/biweekly session rule to a batch and generate its sessions"""
+    from datetime import timedelta
+    
+    batch = Batch.query.get_or_404(batch_id)
+    try:
+        rule = SessionRecurrence(
+            batch_id=batch.id,
+            teacher_user_id=int(request.form['teacher_id']) if request.form.get('teacher_id') else None,
+            classroom_id=int(request.form['classroom_id']) if request.form.get('classroom_id') else None,
+            frequency=request.form.get('frequency', 'weekly'),
+            weekday=int(request.form['weekday']),
+            start_time=datetime.strptime(request.form['start_time'], '%H:%M').time(),
+            end_time=datetime.strptime(request.form['end_time'], '%H:%M').time(),
+            start_date=datetime.strptime(request.form['start_date'], '%Y-%m-%d').date(),
+            end_date=datetime.strptime(request.form['end_date'], '%Y-%m-%d').date() if request.form.get('end_date') else None,
+            topic=request.form.get('topic'),
+            is_active=True
+        )
+    except (KeyError, ValueError):
+        flash('Please fill in the weekday, times and start date of the recurring session', 'error')
+        return redirect(url_for('admin_batch_detail', batch_id=batch_id))
+    
+    if rule.frequency not in ('weekly', 'biweekly') or not 0 <= rule.weekday <= 6:
+        flash('Invalid recurrence frequency or weekday', 'error')
+        return redirect(url_for('admin_batch_detail', batch_id=batch_id))
+    if rule.end_time <= rule.start_time:
+        flash('End time must be after start time', 'error')
+        return redirect(url_for('admin_batch_detail', batch_id=batch_id))
+    
+    db.session.add(rule)
+    db.session.commit()
+    
+    horizon = max(datetime.now().date(), rule.start_date) + timedelta(days=RECURRENCE_HORIZON_DAYS)
+    report = extend_recurrences(horizon, recurrence_ids=[rule.id])
+    
+    message = f"Recurring session added: {report['created']} session(s) scheduled"
+    if report['holidays']:
+        message += f", {report['holidays']} holiday(s) skipped"
+    if report['conflicts']:
+        message += f", {len(report['conflicts'])} date(s) skipped because of conflicts ({', '.join(c['date'] for c in report['conflicts'][:5])})"
+    flash(message, 'error' if report['conflicts'] else 'success')
+    return redirect(url_for('admin_batch_detail', batch_id=batch_id))
+
+@app.route('/admin/recurrences/<int:recurrence_id>/deactivate', methods=['POST'])
+def admin_recurrence_deactivate(recurrence_id):
+    """Stop a recurring session and cancel its future occurrences"""
+    rule = SessionRecurrence.query.get_or_404(recurrence_id)
+    rule.is_active = False
+    ClassSession.query.filter(
+        ClassSession.recurrence_id == rule.id,
+        ClassSession.date >= datetime.now().date(),
+        ClassSession.status == 'scheduled'
+    ).update({ClassSession.status: 'cancelled'}, synchronize_session=False)
+    db.session.commit()
+    
+    flash('Recurring session stopped and future sessions cancelled', 'info')
+    return redirect(url_for('admin_batch_detail', batch_id=rule.batch_id))
+
+@app.route('/admin/holidays', methods=['POST'])
+def admin_holiday_create():
+    """Add a holiday: no recurring sessions are generated on it"""
+    try:
+        holiday_date = datetime.strptime(request.form['date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        flash('Holiday date must be YYYY-MM-DD', 'error')
+        return redirect(url_for('admin_schedule'))
+    
+    if not Holiday.query.filter_by(date=holiday_date).first():
+        db.session.add(Holiday(date=holiday_date, name=request.form.get('name')))
+    
+    # Cancel recurring sessions that were already generated for that day
+    cancelled = ClassSession.query.filter(
+        ClassSession.date == holiday_date,
+        ClassSession.recurrence_id.isnot(None),
+        ClassSession.status == 'scheduled'
+    ).update({ClassSession.status: 'cancelled'}, synchronize_session=False)
+    db.session.commit()
+    
+    flash(f'Holiday added for {holiday_date.isoformat()}; {cancelled} recurring session(s) cancelled', 'success')
+    return redirect(url_for('admin_schedule', date=holiday_date.isoformat()))
+
+@app.route('/admin/schedule/conflicts')
+def admin_schedule_conflicts():
+    """Room and teacher double-bookings in a date range"""
+    from datetime import timedelta
+    
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else datetime.now().date()
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else date_from + timedelta(days=6)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    report = conflict_report(date_from, date_to)
+    return jsonify({
+        'success': True,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'total': len(report['classroom']) + len(report['teacher']),
+        **report
+    })
+
+@app.route('/admin/schedule/solve', methods=['POST'])
+def admin_schedule_solve():
+    """Propose a conflict-free week for active batches, optionally applying it"""
+    try:
+        week = datetime.strptime(request.form['week'], '%Y-%m-%d').date() if request.form.get('week') else datetime.now().date()
+        sessions = int(request.form.get('sessions', 2))
+        duration = int(request.form.get('duration', 1))
+        batch_ids = [int(batch_id) for batch_id in request.form.getlist('batch_ids')]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid week, sessions, duration or batch id'}), 400
+    if not 1 <= sessions <= 7 or not 1 <= duration <= 4:
+        return jsonify({'success': False, 'message': 'Sessions must be 1-7 and duration 1-4 hours'}), 400
+    
+    diff = plan_week(week, sessions_per_batch=sessions, duration=duration, batch_ids=batch_ids or None)
+    applied = apply_plan(diff) if request.form.get('apply') == '1' else None
+    return jsonify({'success': True, 'applied': applied, **diff})
+
+# Export Routes
+@app.route('/admin/export/<kind>')
+def admin_export(kind):
+    """Stream students, registrations or sessions as CSV/JSON"""
+    if kind not in EXPORT_COLUMNS:
+        return jsonify({'success': False, 'message': f'Unknown export: {kind}'}), 404
+    
+    file_format = request.args.get('format', 'csv')
+    column_param = request.args.get('columns', '')
+    try:
+        columns = resolve_columns(kind, [c.strip() for c in column_param.split(',') if c.strip()])
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f'Unsupported export format: {file_format}')
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{file_format}"
+    chunks = stream_export(kind, file_format, columns, date_from, date_to)
+    return Response(stream_with_context(chunks),
+                    mimetype=EXPORT_FORMATS[file_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# Background Job Routes (status is read through /api/v1/jobs)
+@app.route('/admin/jobs/<int:job_id>/retry', methods=['POST'])
+def admin_job_retry(job_id):
+    """Queue a failed background job again"""
+    if not retry_job(job_id):
+        return jsonify({'success': False, 'message': 'Only failed jobs can be retried'}), 409
+    return jsonify({'success': True, 'message': 'Job queued again'})
+
 # Detail routes
 @app.route('/admin/teachers/<int:teacher_id>')
 def admin_teacher_detail(teacher_id):
     """Teacher Detail View"""
-    teacher = User.query.get_or_404(teacher_id)
+    teacher = User.query.options(joinedload(User.teacher_profile)).get_or_404(teacher_id)
     return render_template('admin/teacher_detail.html', teacher=teacher)
 
 @app.route('/admin/batches/<int:batch_id>')
 def admin_batch_detail(batch_id):
     """Batch Detail View"""
-    batch = Batch.query.get_or_404(batch_id)
-    return render_template('admin/batch_detail.html', batch=batch)
+    batch = Batch.query.options(
+        selectinload(Batch.students).joinedload(StudentProfile.user),
+        selectinload(Batch.recurrences).joinedload(SessionRecurrence.classroom),
+        selectinload(Batch.recurrences).joinedload(SessionRecurrence.teacher)
+    ).get_or_404(batch_id)
+    teachers = User.query.filter_by(role='teacher', status='active').all()
+    classrooms = Classroom.query.filter_by(is_active=True).all()
+    return render_template('admin/batch_detail.html', 
+                         batch=batch,
+                         teachers=teachers,
+                         classrooms=classrooms,
+                         today=datetime.now().date())
 
 @app.route('/admin/classrooms/<int:classroom_id>')
 def admin_classroom_detail(classroom_id):
@@ -986,61 +1341,114 @@ def admin_classroom_detail(classroom_id):
     classroom = Classroom.query.get_or_404(classroom_id)
     return render_template('admin/classroom_detail.html', classroom=classroom)
 
-def migrate_database():
-    """Add missing columns to existing database"""
+@app.cli.command('import-people')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--role', type=click.Choice(['student', 'teacher']), required=True)
+@click.option('--chunk-size', default=1000, show_default=True)
+def import_people_command(path, role, chunk_size):
+    """Import students or teachers from a CSV or XLSX file"""
+    file_format = 'xlsx' if path.lower().endswith('.xlsx') else 'csv'
+    with open(path, 'rb') as stream:
+        report = import_people(stream, role, file_format=file_format, chunk_size=chunk_size)
+    
+    click.echo(f"Rows: {report.rows}  Inserted: {report.inserted}  Failed: {report.failed}")
+    for error in report.errors:
+        click.echo(f"  row {error['row']} ({error['email']}): {', '.join(error['errors'])}")
+
+@app.cli.command('extend-recurrences')
+@click.option('--days', default=RECURRENCE_HORIZON_DAYS, show_default=True, help='Horizon from today')
+def extend_recurrences_command(days):
+    """Generate recurring class sessions up to the given horizon"""
+    from datetime import timedelta
+    
+    report = extend_recurrences(datetime.now().date() + timedelta(days=days))
+    click.echo(f"Created: {report['created']}  Holidays skipped: {report['holidays']}  Conflicts: {len(report['conflicts'])}")
+    for conflict in report['conflicts']:
+        click.echo(f"  rule {conflict['recurrence_id']} on {conflict['date']}: {conflict['reason']}")
+
+@app.cli.command('solve-timetable')
+@click.option('--week', type=click.DateTime(formats=['%Y-%m-%d']), help='Any date in the week (default: this week)')
+@click.option('--sessions', default=2, show_default=True, help='Sessions per batch per week')
+@click.option('--duration', default=1, show_default=True, help='Session length in hours')
+@click.option('--apply', 'apply_changes', is_flag=True, help='Write the plan instead of only printing it')
+def solve_timetable_command(week, sessions, duration, apply_changes):
+    """Plan a conflict-free week for all active batches"""
+    week = week.date() if week else datetime.now().date()
+    diff = plan_week(week, sessions_per_batch=sessions, duration=duration)
+    click.echo(f"Add: {len(diff['add'])}  Keep: {len(diff['keep'])}  Remove: {len(diff['remove'])}  Unplaced: {len(diff['unplaced'])}")
+    for item in diff['unplaced']:
+        click.echo(f"  batch {item['batch_id']}: {item['missing_sessions']} session(s) could not be placed")
+    if apply_changes:
+        result = apply_plan(diff)
+        click.echo(f"Added {result['added']}, cancelled {result['cancelled']}")
+
+@app.cli.command('migrate')
+@click.option('--chunk-size', default=500, show_default=True, help='Rows per backfill transaction')
+@click.option('--status', 'show_status', is_flag=True, help='List pending migrations without applying them')
+def migrate_command(chunk_size, show_status):
+    """Create missing tables and apply pending schema migrations"""
+    if show_status:
+        pending = pending_migrations(db.engine)
+        click.echo(f"{len(MIGRATIONS) - len(pending)} of {len(MIGRATIONS)} migration(s) applied")
+        for migration in pending:
+            click.echo(f"  pending {migration.version}: {migration.description}")
+        return
+    
+    db.create_all()
+    applied = run_migrations(db.engine, chunk_size=chunk_size, echo=click.echo)
+    click.echo(f"Applied {len(applied)} migration(s); schema is up to date")
+
+@app.cli.command('run-jobs')
+@click.option('--threads', default=2, show_default=True, help='Worker threads')
+@click.option('--burst', is_flag=True, help='Run the jobs that are due now, then exit')
+def run_jobs_command(threads, burst):
+    """Work the background job queue, e.g. in a process of its own"""
+    if burst:
+        click.echo(f"Ran {job_worker.run_pending()} job(s)")
+        return
+    job_worker.threads = threads
+    job_worker.start()
+    click.echo(f"Running jobs with {threads} thread(s); Ctrl+C to stop")
     try:
-        # Check if columns exist and add them if they don't
-        with db.engine.begin() as conn:
-            # Add missing columns to batches table
-            try:
-                conn.execute(db.text("ALTER TABLE batches ADD COLUMN current_enrollment INTEGER DEFAULT 0"))
-                # Update existing records to calculate current enrollment
-                conn.execute(db.text("""
-                    UPDATE batches SET current_enrollment = (
-                        SELECT COUNT(*) FROM student_profiles 
-                        WHERE student_profiles.batch_id = batches.id
-                    ) WHERE current_enrollment IS NULL OR current_enrollment = 0
-                """))
-            except:
-                pass  # Column already exists
-            
-            try:
-                conn.execute(db.text("ALTER TABLE batches ADD COLUMN teacher_id INTEGER"))
-            except:
-                pass
-                
-            try:
-                conn.execute(db.text("ALTER TABLE batches ADD COLUMN start_date DATE"))
-            except:
-                pass
-                
-            try:
-                conn.execute(db.text("ALTER TABLE batches ADD COLUMN end_date DATE"))
-            except:
-                pass
-                
-            try:
-                conn.execute(db.text("ALTER TABLE batches ADD COLUMN is_active BOOLEAN DEFAULT 1"))
-                # Set all existing batches as active
-                conn.execute(db.text("UPDATE batches SET is_active = 1 WHERE is_active IS NULL"))
-            except:
-                pass
-            
-            # Add missing columns to classrooms table
-            try:
-                conn.execute(db.text("ALTER TABLE classrooms ADD COLUMN is_active BOOLEAN DEFAULT 1"))
-                # Set all existing classrooms as active
-                conn.execute(db.text("UPDATE classrooms SET is_active = 1 WHERE is_active IS NULL"))
-            except:
-                pass  # Column already exists
-                
-        print("Database migration completed successfully!")
-        
-    except Exception as e:
-        print(f"Database migration error: {e}")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_worker.stop()
+
+@app.cli.command('reconcile-enrollment')
+@click.option('--chunk-size', default=500, show_default=True, help='Batches per transaction')
+def reconcile_enrollment_command(chunk_size):
+    """Recount batch enrollment from student profiles (run from cron)"""
+    fixes = reconcile_enrollment(chunk_size=chunk_size)
+    click.echo(f"Fixed {len(fixes)} batch(es)")
+    for fix in fixes:
+        click.echo(f"  batch {fix['batch_id']}: {fix['stored']} -> {fix['actual']}")
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORT_COLUMNS)))
+@click.option('--format', 'file_format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--columns', default='', help='Comma-separated column names (default: all)')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First date to include')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last date to include')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Output file (default: stdout)')
+def export_command(kind, file_format, columns, date_from, date_to, output):
+    """Stream an export of students, registrations or sessions"""
+    try:
+        column_names = resolve_columns(kind, [c.strip() for c in columns.split(',') if c.strip()])
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--columns')
+    
+    chunks = stream_export(kind, file_format, column_names,
+                           date_from.date() if date_from else None,
+                           date_to.date() if date_to else None)
+    with click.open_file(output or '-', 'w', encoding='utf-8') as out:
+        for chunk in chunks:
+            out.write(chunk)
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-        migrate_database()
+        pending = pending_migrations(db.engine)
+        if pending:
+            print(f"{len(pending)} pending migration(s); run 'flask --app app migrate'")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""Route benchmark suite with JSON baselines and regression checks.
+
+For every dataset size a fresh process builds a scratch database with
+``seed.generate_dataset`` and requests each route in ``ROUTES`` through the
+Flask test client: the admin pages, the schedule week view, the JSON API and
+the registration accept/reject/claim flows. Per route it records latency
+percentiles, SQL statements per request and peak Python memory (tracemalloc,
+measured on a separate request so it does not skew the timings).
+
+Results are compared with a baseline file; a route fails when its latency
+(p50 by default, ``--metric p95`` on a quiet machine with more requests) or
+peak memory grows past ``--threshold`` times the baseline, ignoring
+differences below a small noise floor, or when it runs more statements.
+Baselines hold timings from one machine: refresh them with
+``--update-baseline`` after an intended change or on new hardware.
+
+Usage: python benchmarks/bench_routes.py [--sizes 500,5000] [--requests 20] [--threshold 1.5]
+                                         [--metric p50] [--update-baseline]
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'routes.json')
+
+# Generated data is relative to this Monday so every run sees the same dataset
+ANCHOR = date(2025, 1, 6)
+
+# Differences below these are noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 5.0
+MIN_MEMORY_DELTA_KB = 256
+
+# name -> (method, URL template, form data); templates are filled from sample ids.
+# POST flows take a fresh pending registration ({pending}) on every request.
+ROUTES = {
+    'dashboard': ('GET', '/', None),
+    'profile': ('GET', '/admin/profile', None),
+    'registrations': ('GET', '/admin/registrations?status=all', None),
+    'registrations_pending': ('GET', '/admin/registrations?status=pending', None),
+    'registrations_search': ('GET', '/admin/registrations?status=all&search=perera', None),
+    'registration_detail': ('GET', '/admin/registrations/{reg}', None),
+    'register_new_form': ('GET', '/student/register/new', None),
+    'register_existing_form': ('GET', '/student/register/existing', None),
+    'students': ('GET', '/admin/students', None),
+    'students_search': ('GET', '/admin/students?search=perera', None),
+    'student_detail': ('GET', '/admin/students/{student}', None),
+    'student_edit': ('GET', '/admin/students/{student}/edit', None),
+    'student_create_form': ('GET', '/admin/students/create', None),
+    'student_assign_batch': ('GET', '/admin/students/{student_profile}/assign-batch', None),
+    'teachers': ('GET', '/admin/teachers', None),
+    'teacher_detail': ('GET', '/admin/teachers/{teacher}', None),
+    'teacher_edit': ('GET', '/admin/teachers/{teacher}/edit', None),
+    'teacher_create_form': ('GET', '/admin/teachers/create', None),
+    'teacher_assign_batch': ('GET', '/admin/teachers/{teacher_profile}/assign-batch', None),
+    'teacher_teaching_load': ('GET', '/admin/teachers/{teacher_profile}/teaching-load', None),
+    'teacher_schedule': ('GET', '/admin/teachers/{teacher_profile}/schedule', None),
+    'teacher_performance': ('GET', '/admin/teachers/{teacher_profile}/performance', None),
+    'batches': ('GET', '/admin/batches', None),
+    'batch_detail': ('GET', '/admin/batches/{batch}', None),
+    'batch_edit': ('GET', '/admin/batches/{batch}/edit', None),
+    'batch_create_form': ('GET', '/admin/batches/create', None),
+    'batch_manage_students': ('GET', '/admin/batches/{batch}/manage-students', None),
+    'batch_assign_teacher': ('GET', '/admin/batches/{batch}/assign-teacher', None),
+    'classrooms': ('GET', '/admin/classrooms', None),
+    'classroom_detail': ('GET', '/admin/classrooms/{classroom}', None),
+    'classroom_edit': ('GET', '/admin/classrooms/{classroom}/edit', None),
+    'classroom_create_form': ('GET', '/admin/classrooms/create', None),
+    'schedule_week': ('GET', '/admin/schedule?date={anchor}', None),
+    'schedule_create_form': ('GET', '/admin/schedule/create', None),
+    'schedule_conflicts': ('GET', '/admin/schedule/conflicts?from={anchor}', None),
+    'export_sessions_csv': ('GET', '/admin/export/sessions?from={anchor}&to={anchor}', None),
+    'api_students': ('GET', '/api/v1/students?fields=name,email,batch_id', None),
+    'api_sessions_week': ('GET', '/api/v1/sessions?from={anchor}&to={week_end}', None),
+    'api_registration': ('GET', '/api/v1/registrations/{reg}', None),
+    'metrics': ('GET', '/metrics', None),
+    'claim': ('POST', '/admin/registrations/{pending}/claim', {}),
+    'accept': ('POST', '/admin/registrations/{pending}/accept', {'version': '1'}),
+    'reject': ('POST', '/admin/registrations/{pending}/reject', {'reason': 'Benchmark'}),
+}
+
+
+def sample_ids():
+    """Ids of representative rows: the fullest batch and the people around it"""
+    from models import db, Batch, StudentProfile, ClassSession, RegistrationRequest, TeacherProfile
+
+    batch = Batch.query.order_by(Batch.current_enrollment.desc(), Batch.id).first()
+    student = StudentProfile.query.filter_by(batch_id=batch.id).order_by(StudentProfile.id).first()
+    teacher = db.session.get(TeacherProfile, batch.teacher_id)
+    session = ClassSession.query.filter(ClassSession.classroom_id.isnot(None)).order_by(ClassSession.id).first()
+    return {
+        'batch': batch.id,
+        'student': student.user_id,
+        'student_profile': student.id,
+        'teacher': teacher.user_id,
+        'teacher_profile': teacher.id,
+        'classroom': session.classroom_id,
+        'reg': RegistrationRequest.query.order_by(RegistrationRequest.id).first().id,
+        'anchor': ANCHOR.isoformat(),
+        'week_end': date.fromordinal(ANCHOR.toordinal() + 6).isoformat(),
+    }
+
+
+def add_pending(count):
+    """Fresh pending registrations for the POST flows; returns their ids"""
+    from models import db, RegistrationRequest
+
+    first = (db.session.query(db.func.max(RegistrationRequest.id)).scalar() or 0) + 1
+    db.session.execute(RegistrationRequest.__table__.insert(), [{
+        'id': first + i, 'name': f'Bench Applicant {i}', 'email': f'bench{i}@example.lk', 'mobile': '0770000000',
+        'registration_type': 'new', 'status': 'pending', 'payment_status': 'paid', 'grade': 'O/L',
+        'class_type': 'online', 'submitted_at': datetime.utcnow(),
+    } for i in range(count)])
+    db.session.commit()
+    return list(range(first, first + count))
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_size(students, requests, seed):
+    """Build one dataset and measure every route in this process"""
+    from sqlalchemy import event
+
+    from app import app
+    from models import db
+    from seed import generate_dataset
+
+    client = app.test_client()
+    with app.app_context():
+        started = time.perf_counter()
+        generate_dataset(students, weeks=12, seed=seed, anchor=ANCHOR, echo=lambda message: None)
+        build_seconds = time.perf_counter() - started
+        ids = sample_ids()
+        posts = sum(1 for method, _url, _data in ROUTES.values() if method == 'POST')
+        pending = iter(add_pending(posts * (requests + 2)))
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def call(method, template, data):
+        url = template.format(pending=next(pending) if '{pending}' in template else None, **ids)
+        response = client.post(url, data=data) if method == 'POST' else client.get(url)
+        response.get_data()  # Drain streamed responses so the whole route is measured
+        if response.status_code >= 400:
+            raise SystemExit(f'{url} returned {response.status_code}')
+
+    results = {}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for name, (method, template, data) in ROUTES.items():
+            call(method, template, data)  # Warm caches and lazy imports
+
+            # Timed like timeit: a collection pause is not the route's cost
+            latencies, queries = [], []
+            gc.collect()
+            gc.disable()
+            for _ in range(requests):
+                statements.clear()
+                started = time.perf_counter()
+                call(method, template, data)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(len(statements))
+            gc.enable()
+
+            tracemalloc.start()
+            call(method, template, data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            latencies.sort()
+            queries.sort()
+            results[name] = {
+                'p50_ms': round(percentile(latencies, 0.5), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'queries': queries[len(queries) // 2],
+                'peak_kb': round(peak / 1024),
+            }
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+    covered = {app.url_map.bind('localhost').match(template.format(pending=1, **ids).split('?')[0],
+                                                   method=method)[0]
+               for method, template, _data in ROUTES.values()}
+    uncovered = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                       if 'GET' in rule.methods and rule.endpoint != 'static' and rule.endpoint not in covered)
+    return {'build_seconds': round(build_seconds, 1), 'routes': results, 'uncovered': uncovered}
+
+
+def compare(baseline, current, threshold, metric='p50_ms'):
+    """Regression messages for ``current`` against ``baseline`` (same shape)"""
+    failures = []
+    for size, result in current.items():
+        base_routes = baseline.get(size, {}).get('routes', {})
+        for name, now in result['routes'].items():
+            before = base_routes.get(name)
+            if before is None:
+                continue
+            if now[metric] > before[metric] * threshold and now[metric] - before[metric] > MIN_LATENCY_DELTA_MS:
+                failures.append(f"{size} students, {name}: {metric[:3]} {before[metric]}ms -> {now[metric]}ms")
+            if now['queries'] > before['queries']:
+                failures.append(f"{size} students, {name}: {before['queries']} -> {now['queries']} statements")
+            if now['peak_kb'] > before['peak_kb'] * threshold and now['peak_kb'] - before['peak_kb'] > MIN_MEMORY_DELTA_KB:
+                failures.append(f"{size} students, {name}: peak memory {before['peak_kb']}KB -> {now['peak_kb']}KB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='500,5000', help='comma-separated student counts')
+    parser.add_argument('--requests', type=int, default=20, help='timed requests per route')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threshold', type=float, default=1.5, help='allowed latency/memory growth factor')
+    parser.add_argument('--metric', choices=['p50', 'p95', 'p99'], default='p50', help='latency percentile to gate on')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_size(args.worker, args.requests, args.seed)))
+        return
+
+    current = {}
+    for size in [int(value) for value in args.sizes.split(',')]:
+        # Each size gets a fresh process and database: the engine is configured at import
+        db_dir = tempfile.mkdtemp(prefix='nanapatha-bench-')
+        # No job threads: they would run SQL during the timed requests
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(db_dir, 'bench.db'), JOB_WORKERS='0')
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', str(size), '--requests', str(args.requests),
+             '--seed', str(args.seed)],
+            env=env, capture_output=True, text=True
+        )
+        if output.returncode:
+            raise SystemExit(f'{size} students: worker failed\n{output.stderr or output.stdout}')
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        current[str(size)] = result
+
+        print(f"\n{size} students (dataset built in {result['build_seconds']}s)")
+        print(f"{'route':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KB':>8}")
+        for name, row in result['routes'].items():
+            print(f"{name:<26} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                  f"{row['queries']:>8} {row['peak_kb']:>8}")
+        if result['uncovered']:
+            print(f"Not benchmarked: {', '.join(result['uncovered'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {os.path.relpath(args.baseline)}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {os.path.relpath(args.baseline)}; run with --update-baseline to create one')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    failures = compare(baseline, current, args.threshold, f'{args.metric}_ms')
+    if failures:
+        print('\nRegressions against the baseline:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print(f'\nNo route regressed past {args.threshold}x the baseline.')
+
+
+if __name__ == '__main__':
+    main()
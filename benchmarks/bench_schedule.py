@@ -0,0 +1,89 @@
+"""Benchmark the /admin/schedule week grid with a large number of sessions.
+
+Renders the 7x16 grid once with the old per-cell ``selectattr`` scans and once
+with the pre-bucketed ``session_grid`` lookup used by ``admin_schedule()``.
+
+Usage: python benchmarks/bench_schedule.py [--sessions 5000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, build_session_grid
+
+GRID_BEFORE = """
+{% for hour in range(6, 22) %}{% for day_offset in range(7) %}
+{% set cell_date = current_date + timedelta(days=day_offset) %}
+{% set cell_sessions = sessions | selectattr('date', 'equalto', cell_date) | selectattr('start_time.hour', 'equalto', hour) | list %}
+{% for session in cell_sessions %}{{ session.id }} {{ session.batch.name }} {{ session.start_time.strftime('%H:%M') }}
+{% endfor %}{% endfor %}{% endfor %}
+"""
+
+GRID_AFTER = """
+{% for hour in range(6, 22) %}{% for day_offset in range(7) %}
+{% set cell_date = current_date + timedelta(days=day_offset) %}
+{% set cell_sessions = session_grid.get((cell_date, hour), []) %}
+{% for session in cell_sessions %}{{ session.id }} {{ session.batch.name }} {{ session.start_time.strftime('%H:%M') }}
+{% endfor %}{% endfor %}{% endfor %}
+"""
+
+
+def make_sessions(count, week_start, seed=42):
+    """Build fake session objects spread over one week"""
+    rng = random.Random(seed)
+    batches = [SimpleNamespace(name=f"Batch {i}") for i in range(50)]
+    sessions = []
+    for i in range(count):
+        start_hour = rng.randint(6, 20)
+        duration = rng.choice([1, 1, 2, 3])
+        end_hour = min(start_hour + duration, 22)
+        sessions.append(SimpleNamespace(
+            id=i + 1,
+            date=week_start + timedelta(days=rng.randint(0, 6)),
+            start_time=dtime(start_hour, 0),
+            end_time=dtime(end_hour, 0) if end_hour < 24 else dtime(23, 59),
+            batch=rng.choice(batches),
+        ))
+    return sessions
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    week_start = date(2024, 10, 7)
+    sessions = make_sessions(args.sessions, week_start)
+    context = {'current_date': week_start, 'timedelta': timedelta, 'sessions': sessions}
+
+    before = app.jinja_env.from_string(GRID_BEFORE)
+    after = app.jinja_env.from_string(GRID_AFTER)
+
+    before_time = timed(lambda: before.render(**context), args.repeat)
+    after_time = timed(lambda: after.render(session_grid=build_session_grid(sessions), **context), args.repeat)
+
+    print(f"Sessions in week: {args.sessions}")
+    print(f"Before (selectattr per cell): {before_time * 1000:.1f} ms")
+    print(f"After (session_grid lookup):  {after_time * 1000:.1f} ms")
+    print(f"Speedup: {before_time / after_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark name/email search: LIKE '%x%' scans versus the FTS5 index.
+
+Fills a scratch SQLite database with synthetic users (100k by default) and
+times the old ``contains`` filter against ``search.apply_search``, which also
+ranks the matches best first.
+
+Usage: python benchmarks/bench_search.py [--users 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp(prefix='nanapatha-search-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'search.db')
+
+from app import app
+from models import db, User
+from search import apply_search
+
+FIRST_NAMES = ['Ashan', 'Kavindi', 'Nipun', 'Sachini', 'Ruwan', 'Malsha', 'Isuru', 'Dilini',
+               'Tharindu', 'Nadeesha', 'Chamod', 'Hiruni', 'Kasun', 'Sanduni', 'Pasindu', 'Yasodha']
+LAST_NAMES = ['Perera', 'Fernando', 'Silva', 'Jayasinghe', 'Bandara', 'Wijesinghe', 'Dissanayake',
+              'Rajapaksa', 'Gunawardena', 'Herath', 'Karunaratne', 'Weerasinghe']
+QUERIES = ['ashan', 'perera', 'kavindi silva', 'user4242', 'gunaw', 'zzz']
+
+
+def populate(count, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            'name': f'{first} {last}',
+            'email': f'{first.lower()}.{last.lower()}.user{i}@example.com',
+            'role': 'student',
+            'status': 'active',
+        })
+        if len(rows) == 10000:
+            db.session.execute(User.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        populate(args.users)
+        print(f'Inserted {args.users} users (with FTS triggers) in {time.perf_counter() - started:.1f}s\n')
+
+        print(f"{'query':<16} {'matches':>8} {'LIKE ms':>9} {'FTS ms':>9}")
+        for text in QUERIES:
+            def like():
+                return User.query.filter(db.or_(User.name.contains(text), User.email.contains(text))) \
+                    .order_by(User.created_at.desc()).limit(25).all()
+
+            query, sort_keys = apply_search(User.query, User, text, [(User.created_at, True), (User.id, True)])
+
+            def fts():
+                return query.order_by(*[column.desc() if descending else column for column, descending in sort_keys]) \
+                    .limit(25).all()
+
+            matches = query.count()
+            like_time = timed(like, args.repeat)
+            fts_time = timed(fts, args.repeat)
+            print(f'{text:<16} {matches:>8} {like_time * 1000:>9.1f} {fts_time * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
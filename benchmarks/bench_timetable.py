@@ -0,0 +1,98 @@
+"""Benchmark the weekly timetable solver on synthetic batches and rooms.
+
+Builds random demand (batch sizes, class types, shared teachers, a partly
+booked week) and times ``timetable.TimetableSolver``. Each run checks the
+result has no room, teacher or batch double-booking and that every room
+seats its batch. An online batch whose preferred room was deactivated is
+checked too.
+
+Usage: python benchmarks/bench_timetable.py [--batches 400] [--rooms 120] [--teachers 150]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from timetable import TimetableSolver, Demand, Room, DEFAULT_DAYS, DEFAULT_HOURS
+
+
+def build(batches, rooms, teachers, sessions, busy_ratio, seed=11):
+    rng = random.Random(seed)
+    room_list = [Room(i, rng.choice([20, 25, 30, 40, 60, 80])) for i in range(1, rooms + 1)]
+    demands = [
+        Demand(
+            batch_id=i,
+            teacher_id=rng.randint(1, teachers),
+            enrollment=rng.randint(8, 60),
+            needs_room=rng.random() > 0.2,
+            sessions=sessions,
+            duration=rng.choice([1, 1, 2])
+        )
+        for i in range(1, batches + 1)
+    ]
+    # Room hours already taken by sessions the solver may not move
+    busy = [('room', room.id, day, hour)
+            for room in room_list for day in DEFAULT_DAYS for hour in DEFAULT_HOURS
+            if rng.random() < busy_ratio]
+    return room_list, demands, busy
+
+
+def verify(placements, demands, rooms):
+    capacity = {room.id: room.capacity for room in rooms}
+    by_batch = {demand.batch_id: demand for demand in demands}
+    cells = Counter()
+    for p in placements:
+        for hour in range(p.hour, p.hour + p.duration):
+            cells[('batch', p.batch_id, p.day, hour)] += 1
+            if p.teacher_id:
+                cells[('teacher', p.teacher_id, p.day, hour)] += 1
+            if p.room_id:
+                cells[('room', p.room_id, p.day, hour)] += 1
+                assert capacity[p.room_id] >= by_batch[p.batch_id].enrollment, p
+        assert not by_batch[p.batch_id].needs_room or p.room_id, p
+    clashes = [cell for cell, count in cells.items() if count > 1]
+    assert not clashes, clashes[:5]
+
+
+def check_inactive_preferred_room():
+    # An online batch whose existing session uses a room that is no longer active
+    placements, unplaced = TimetableSolver([Room(1, 30)]).solve([Demand(5, 2, 10, False, 1, 1)], {5: [(0, 9, 99)]})
+    assert unplaced == [], unplaced
+    assert [(p.day, p.hour, p.room_id) for p in placements] == [(0, 9, None)], placements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=400)
+    parser.add_argument('--rooms', type=int, default=120)
+    parser.add_argument('--teachers', type=int, default=150)
+    parser.add_argument('--sessions', type=int, default=3, help='Sessions per batch per week')
+    parser.add_argument('--busy', type=float, default=0.3, help='Share of room hours already booked')
+    args = parser.parse_args()
+
+    check_inactive_preferred_room()
+
+    print(f"{'batches':>8} {'rooms':>6} {'sessions':>9} {'placed':>7} {'unplaced':>9} {'ms':>9}")
+    for scale in (0.25, 0.5, 1.0):
+        batches = max(1, int(args.batches * scale))
+        rooms = max(1, int(args.rooms * scale))
+        teachers = max(1, int(args.teachers * scale))
+        room_list, demands, busy = build(batches, rooms, teachers, args.sessions, args.busy)
+
+        started = time.perf_counter()
+        placements, unplaced = TimetableSolver(room_list, busy=busy).solve(demands)
+        elapsed = time.perf_counter() - started
+
+        verify(placements, demands, room_list)
+        missing = sum(count for _, count in unplaced)
+        print(f'{batches:>8} {rooms:>6} {batches * args.sessions:>9} {len(placements):>7} '
+              f'{missing:>9} {elapsed * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
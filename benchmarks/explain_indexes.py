@@ -0,0 +1,91 @@
+"""Check that the hot queries are answered from an index.
+
+Builds a throwaway SQLite database with the model schema, runs EXPLAIN QUERY
+PLAN for each query the list pages, dashboard and scheduler issue, and fails
+if any of them scans a whole table instead of searching an index.
+
+Usage: python benchmarks/explain_indexes.py [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp(prefix='nanapatha-explain-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'explain.db')
+
+from app import app
+from jobs import due_jobs
+from models import db, User, StudentProfile, Batch, RegistrationRequest, ClassSession
+
+# A bare "SCAN <table>" reads every row; "SCAN <table> USING INDEX" walks an index
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+
+def hot_queries():
+    """(name, query) for each query that must use an index"""
+    today = date.today()
+    return [
+        ('active students count', User.query.filter_by(role='student', status='active')),
+        ('active teachers list', User.query.filter_by(role='teacher', status='active')),
+        ('students list', User.query.filter_by(role='student').order_by(User.created_at.desc())),
+        ('pending registrations', RegistrationRequest.query.filter_by(status='pending')
+            .order_by(RegistrationRequest.submitted_at.desc()).limit(10)),
+        ('registrations by status', RegistrationRequest.query.filter_by(status='accepted')
+            .order_by(RegistrationRequest.submitted_at.desc(), RegistrationRequest.id.desc()).limit(25)),
+        ('batch students', StudentProfile.query.filter_by(batch_id=1)),
+        ('batch enrollment counts', db.session.query(StudentProfile.batch_id, db.func.count(StudentProfile.id))
+            .filter(StudentProfile.batch_id.in_([1, 2, 3])).group_by(StudentProfile.batch_id)),
+        ('teacher batches', Batch.query.filter_by(teacher_id=1, is_active=True)),
+        ('unassigned batches', Batch.query.filter_by(teacher_id=None, is_active=True)),
+        ('weekly schedule', ClassSession.query.filter(ClassSession.date >= today,
+                                                      ClassSession.date <= today + timedelta(days=6))),
+        ('holiday sessions', ClassSession.query.filter(ClassSession.date == today)),
+        ('teacher sessions', ClassSession.query.filter_by(teacher_user_id=1)),
+        ('teacher completed sessions', ClassSession.query.filter_by(teacher_user_id=1, status='completed')),
+        ('room double-booking', ClassSession.query.filter_by(classroom_id=1, date=today)),
+        ('due jobs', due_jobs().limit(1)),
+    ]
+
+
+def query_plan(query):
+    statement = query.statement if hasattr(query, 'statement') else query
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return [row[-1] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        for name, query in hot_queries():
+            plan = query_plan(query)
+            scans = [line for line in plan if FULL_SCAN_RE.match(line)]
+            status = 'FULL SCAN' if scans else 'ok'
+            print(f'{name:<28} {status}')
+            if args.verbose or scans:
+                for line in plan:
+                    print(f'    {line}')
+            if scans:
+                failures.append(name)
+
+    if failures:
+        print(f'\n{len(failures)} quer{"y" if len(failures) == 1 else "ies"} without an index: {", ".join(failures)}')
+        sys.exit(1)
+    print('\nAll hot queries use an index.')
+
+
+if __name__ == '__main__':
+    main()
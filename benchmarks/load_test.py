@@ -0,0 +1,155 @@
+"""Concurrent write load test for the SQLite engine profiles.
+
+Runs a mix of admin writes (claim, mark paid) and public registration
+submissions from several threads against a scratch database, once per
+profile in ``database.SQLITE_PROFILES``, and reports throughput, latency
+and failed requests ("database is locked" surfaces as a 500). Afterwards it
+reads the pragmas back from a pooled connection and fails if the profile's
+settings did not take effect.
+
+Usage: python benchmarks/load_test.py [--threads 8] [--seconds 10] [--profile production]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+REGISTRATIONS = 2000
+
+# PRAGMA reads return these settings as numbers
+PRAGMA_CODES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+}
+
+
+def pragma_mismatches(engine, profile):
+    """{pragma: (wanted, actual)} for profile settings missing on a pooled connection"""
+    from database import SQLITE_PROFILES, current_pragmas
+
+    with engine.connect() as conn:
+        actual = current_pragmas(conn)
+    mismatches = {}
+    for name, value in SQLITE_PROFILES[profile].items():
+        wanted = PRAGMA_CODES.get(name, {}).get(value, value)
+        if str(actual[name]).lower() != str(wanted).lower():
+            mismatches[name] = (value, actual[name])
+    return mismatches
+
+
+def run_profile(threads, seconds):
+    """Run the load in this process; the profile comes from SQLITE_PROFILE"""
+    from datetime import datetime
+
+    from app import app
+    from models import db, RegistrationRequest
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(RegistrationRequest.__table__.insert(), [{
+            'name': f'Load {i}', 'email': f'load{i}@example.com', 'registration_type': 'new',
+            'status': 'pending', 'payment_status': 'pending', 'submitted_at': datetime.utcnow(),
+        } for i in range(REGISTRATIONS)])
+        db.session.commit()
+        ids = [row.id for row in db.session.query(RegistrationRequest.id)]
+
+    counts = {'ok': 0, 'failed': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        local, failed, i = [], 0, 0
+        while time.perf_counter() < deadline:
+            i += 1
+            choice = rng.random()
+            started = time.perf_counter()
+            if choice < 0.4:
+                response = client.post(f'/admin/registrations/{rng.choice(ids)}/claim')
+            elif choice < 0.7:
+                response = client.post(f'/admin/registrations/{rng.choice(ids)}/mark-paid')
+            else:
+                response = client.post('/student/register/new', data={
+                    'name': f'Thread {n} #{i}', 'email': f't{n}.{i}@example.com', 'mobile': '0770000000',
+                    'address': 'Colombo', 'dob': '2008-01-01', 'grade': 'A/L', 'class_type': 'online',
+                    'selected_batch': '',
+                })
+            local.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            counts['failed'] += failed
+            counts['ok'] += len(local) - failed
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        mismatches = pragma_mismatches(db.engine, app.config['SQLITE_PROFILE'])
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+    return {
+        'writes_per_sec': counts['ok'] / elapsed,
+        'ok': counts['ok'],
+        'failed': counts['failed'],
+        'p50_ms': pick(0.5),
+        'p99_ms': pick(0.99),
+        'pragma_mismatches': mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', action='append', help='Profile(s) to run (default: all)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_profile(args.threads, args.seconds)))
+        return
+
+    from database import SQLITE_PROFILES
+
+    problems = []
+    print(f"{'profile':<12} {'threads':>7} {'writes/s':>9} {'ok':>7} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for profile in args.profile or list(SQLITE_PROFILES):
+        # Each profile gets a fresh process and database: the engine is configured at import
+        db_dir = tempfile.mkdtemp(prefix='nanapatha-load-')
+        env = dict(os.environ, SQLITE_PROFILE=profile,
+                   DATABASE_URL='sqlite:///' + os.path.join(db_dir, 'load.db'))
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', '--threads', str(args.threads), '--seconds', str(args.seconds)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<12} {args.threads:>7} {result['writes_per_sec']:>9.0f} {result['ok']:>7} "
+              f"{result['failed']:>7} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+        for name, (wanted, actual) in result['pragma_mismatches'].items():
+            problems.append(f'{profile}: PRAGMA {name} is {actual}, the profile sets {wanted}')
+
+    if problems:
+        print('\n' + '\n'.join(problems))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
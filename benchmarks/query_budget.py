@@ -0,0 +1,170 @@
+"""Check that list and detail pages run a bounded number of SQL statements.
+
+Builds a throwaway SQLite database, requests every GET page with the Flask
+test client at two data sizes and counts the statements each one executes.
+A route fails if it goes over its budget or if its count grows with the data
+(the signature of an N+1 lazy load).
+
+Usage: python benchmarks/query_budget.py [--scale 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp(prefix='nanapatha-budget-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'budget.db')
+os.environ['JOB_WORKERS'] = '0'  # Job threads would add their own statements to the counts
+
+from sqlalchemy import event
+
+from app import app
+from models import db, User, StudentProfile, TeacherProfile, Batch, RegistrationRequest, Classroom, ClassSession
+
+# Maximum statements per page; keys are URL templates filled from sample ids
+BUDGETS = {
+    '/': 6,
+    '/admin/registrations?status=all': 4,
+    '/admin/registrations/{reg}': 4,
+    '/admin/students': 3,
+    '/admin/students/{student}': 2,
+    '/admin/students/{student}/edit': 3,
+    '/admin/students/{student_profile}/assign-batch': 3,
+    '/admin/batches/{batch}/manage-students': 4,
+    '/admin/teachers': 3,
+    '/admin/teachers/{teacher}': 2,
+    '/admin/teachers/{teacher}/edit': 2,
+    '/admin/teachers/{teacher_profile}/assign-batch': 3,
+    '/admin/teachers/{teacher_profile}/teaching-load': 5,
+    '/admin/teachers/{teacher_profile}/schedule': 4,
+    '/admin/teachers/{teacher_profile}/performance': 7,
+    '/admin/batches': 4,
+    '/admin/batches/create': 2,
+    '/admin/batches/{batch}': 6,
+    '/admin/batches/{batch}/edit': 4,
+    '/admin/batches/{batch}/assign-teacher': 4,
+    '/admin/classrooms': 4,
+    '/admin/classrooms/{classroom}': 2,
+    '/admin/schedule': 6,
+    '/admin/schedule/create': 4,
+    '/api/v1/students': 2,
+    '/api/v1/students/{student}': 1,
+    '/api/v1/teachers': 2,
+    '/api/v1/batches': 2,
+    '/api/v1/batches/{batch}': 1,
+    '/api/v1/classrooms': 2,
+    '/api/v1/sessions': 2,
+    '/api/v1/registrations?status=pending': 2,
+    '/api/v1/jobs?status=failed': 2,
+    '/api/v1/registrations/{reg}': 1,
+}
+
+
+def add_rows(scale, offset):
+    """Insert ``scale`` teachers/batches and a few students per batch"""
+    today = date.today()
+    for i in range(offset, offset + scale):
+        teacher = User(name=f'Teacher {i}', email=f'teacher{i}@example.com', role='teacher', status='active')
+        db.session.add(teacher)
+        db.session.flush()
+        profile = TeacherProfile(user_id=teacher.id, subjects=['Physics'])
+        db.session.add(profile)
+        db.session.flush()
+
+        classroom = Classroom(name=f'Room {i}', capacity=30, location='Main Building')
+        batch = Batch(name=f'Batch {i}', grade='A/L', subject='Physics', capacity=30,
+                      teacher_id=profile.id, class_type='physical', is_active=True)
+        db.session.add_all([classroom, batch])
+        db.session.flush()
+
+        for j in range(5):
+            student = User(name=f'Student {i}-{j}', email=f'student{i}-{j}@example.com',
+                           role='student', status='active')
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=student.id, batch_id=batch.id,
+                                          student_id_number=f'NP{i:05d}{j}'))
+            db.session.add(RegistrationRequest(name=f'Applicant {i}-{j}', email=f'applicant{i}-{j}@example.com',
+                                               registration_type='new', status='pending',
+                                               selected_batch_id=batch.id, submitted_at=datetime.utcnow()))
+        batch.current_enrollment = 5
+
+        for day in range(7):
+            db.session.add(ClassSession(batch_id=batch.id, teacher_user_id=teacher.id, classroom_id=classroom.id,
+                                        date=today + timedelta(days=day), start_time=time(8 + i % 10),
+                                        end_time=time(9 + i % 10), status='scheduled'))
+    db.session.commit()
+
+
+def sample_ids():
+    teacher = TeacherProfile.query.order_by(TeacherProfile.id).first()
+    student = StudentProfile.query.order_by(StudentProfile.id).first()
+    return {
+        'reg': RegistrationRequest.query.order_by(RegistrationRequest.id).first().id,
+        'student': student.user_id,
+        'student_profile': student.id,
+        'teacher': teacher.user_id,
+        'teacher_profile': teacher.id,
+        'batch': Batch.query.order_by(Batch.id).first().id,
+        'classroom': Classroom.query.order_by(Classroom.id).first().id,
+    }
+
+
+def measure(client, ids):
+    counts = {}
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for template in BUDGETS:
+            url = template.format(**ids)
+            statements.clear()
+            response = client.get(url)
+            if response.status_code >= 400:
+                raise SystemExit(f'{url} returned {response.status_code}')
+            counts[template] = len(statements)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        add_rows(args.scale, 0)
+        ids = sample_ids()
+        small = measure(client, ids)
+        add_rows(args.scale * 4, args.scale)
+        large = measure(client, ids)
+
+    failures = []
+    print(f"{'route':<52} {'small':>6} {'large':>6} {'budget':>6}")
+    for template, budget in BUDGETS.items():
+        print(f'{template:<52} {small[template]:>6} {large[template]:>6} {budget:>6}')
+        if large[template] > budget:
+            failures.append(f'{template}: {large[template]} statements, budget {budget}')
+        elif large[template] > small[template]:
+            failures.append(f'{template}: grew from {small[template]} to {large[template]} statements')
+
+    if failures:
+        print('\nQuery budget exceeded:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nAll routes within budget.')
+
+
+if __name__ == '__main__':
+    main()
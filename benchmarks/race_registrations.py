@@ -0,0 +1,138 @@
+"""Concurrency check for registration claim/accept/reject.
+
+Several threads act on the same pending registrations at once through the
+admin routes: accepting (singly and in bulk), rejecting and claiming.
+Afterwards each accepted registration must have exactly one user and one
+seat, and no email more than one user. A registration left pending is fine:
+every action on it lost to a stale version or a claim. Claim expiry
+is then checked at the service level with two admin names. Exits non-zero
+on any violation.
+
+Usage: python benchmarks/race_registrations.py [--threads 8] [--registrations 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp(prefix='nanapatha-race-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'race.db')
+os.environ['JOB_WORKERS'] = '0'  # Welcome emails stay queued
+
+from app import app
+from models import db, User, Batch, RegistrationRequest, CLAIM_TTL
+from registrations import claim_request, reject_request, RegistrationConflict
+
+
+def populate(count):
+    db.create_all()
+    batch = Batch(name='Race batch', capacity=count, current_enrollment=0, is_active=True)
+    db.session.add(batch)
+    db.session.flush()
+    registrations = [
+        RegistrationRequest(name=f'Racer {i}', email=f'racer{i}@example.com', mobile='0770000000',
+                            address='Colombo', dob=date(2008, 1, 1), grade='A/L', class_type='online',
+                            selected_batch_id=batch.id, registration_type='new', payment_status='paid',
+                            status='pending', submitted_at=datetime.utcnow())
+        for i in range(count)
+    ]
+    db.session.add_all(registrations)
+    db.session.commit()
+    return [r.id for r in registrations]
+
+
+def check_claim_expiry(reg_id):
+    """A live claim blocks other admins; a lapsed one can be taken over"""
+    problems = []
+    claim_request(reg_id, admin='Admin A')
+    try:
+        claim_request(reg_id, admin='Admin B')
+        problems.append('second admin took over a live claim')
+    except RegistrationConflict:
+        pass
+    try:
+        reject_request(reg_id, 'race check', admin='Admin B')
+        problems.append('second admin rejected a registration claimed by someone else')
+    except RegistrationConflict:
+        pass
+
+    RegistrationRequest.query.filter_by(id=reg_id).update(
+        {'claimed_at': datetime.utcnow() - CLAIM_TTL - CLAIM_TTL})
+    db.session.commit()
+    claim_request(reg_id, admin='Admin B')
+    if db.session.get(RegistrationRequest, reg_id, populate_existing=True).claimed_by != 'Admin B':
+        problems.append('expired claim was not taken over')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--registrations', type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        reg_ids = populate(args.registrations + 1)
+    expiry_id = reg_ids.pop()
+
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        local = Counter()
+        for reg_id in rng.sample(reg_ids, len(reg_ids)):
+            action = rng.random()
+            if action < 0.4:
+                response = client.post(f'/admin/registrations/{reg_id}/accept', data={'version': 1})
+            elif action < 0.6:
+                response = client.post('/admin/registrations/bulk-accept',
+                                       json={'registration_ids': [reg_id] + rng.sample(reg_ids, 3)})
+            elif action < 0.8:
+                response = client.post(f'/admin/registrations/{reg_id}/reject', data={'reason': f'thread {n}'})
+            else:
+                response = client.post(f'/admin/registrations/{reg_id}/claim')
+            local[response.status_code] += 1
+        with lock:
+            statuses.update(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Requests: {sum(statuses.values())}  by status: {dict(sorted(statuses.items()))}")
+
+    problems = []
+    with app.app_context():
+        outcomes = Counter(r.status for r in RegistrationRequest.query.filter(RegistrationRequest.id.in_(reg_ids)))
+        emails = Counter(email for (email,) in db.session.query(User.email))
+        batch = Batch.query.first()
+        print(f'Outcomes: {dict(outcomes)}  users: {sum(emails.values())}  seats taken: {batch.current_enrollment}')
+
+        duplicated = [email for email, count in emails.items() if count > 1]
+        if duplicated:
+            problems.append(f'duplicate users for {duplicated[:5]}')
+        if sum(emails.values()) != outcomes['accepted']:
+            problems.append(f"{sum(emails.values())} users for {outcomes['accepted']} accepted registrations")
+        if batch.current_enrollment != outcomes['accepted']:
+            problems.append(f"{batch.current_enrollment} seats taken for {outcomes['accepted']} accepted registrations")
+        problems.extend(check_claim_expiry(expiry_id))
+
+    if problems:
+        print('\n' + '\n'.join(problems))
+        sys.exit(1)
+    print('\nOne user and one seat per accepted registration, no duplicate emails; claims expire.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Concurrency stress test for batch enrollment counters.
+
+Several threads move students between a few small batches as fast as they
+can through the admin routes (assign, add, remove). Afterwards every
+``current_enrollment`` must equal the number of students in the batch and
+never exceed its capacity, and ``reconcile_enrollment`` must find nothing
+to fix. Exits non-zero on any drift.
+
+Usage: python benchmarks/stress_enrollment.py [--threads 8] [--seconds 10]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp(prefix='nanapatha-stress-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'stress.db')
+
+from app import app
+from models import db, User, StudentProfile, Batch
+from enrollment import reconcile_enrollment
+
+
+def populate(batches, capacity, students):
+    db.create_all()
+    batch_rows = [Batch(name=f'Stress {i}', capacity=capacity, current_enrollment=0, is_active=True)
+                  for i in range(batches)]
+    db.session.add_all(batch_rows)
+    users = [User(name=f'Student {i}', email=f'stress{i}@example.com', role='student', status='active')
+             for i in range(students)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([StudentProfile(user_id=user.id, student_id_number=f'STRESS{user.id}') for user in users])
+    db.session.commit()
+    return [batch.id for batch in batch_rows], [row.id for row in db.session.query(StudentProfile.id)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--batches', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=10)
+    parser.add_argument('--students', type=int, default=60)
+    args = parser.parse_args()
+
+    with app.app_context():
+        batch_ids, student_ids = populate(args.batches, args.capacity, args.students)
+
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        local = Counter()
+        while time.perf_counter() < deadline:
+            student_id = rng.choice(student_ids)
+            batch_id = rng.choice(batch_ids)
+            action = rng.random()
+            if action < 0.4:
+                response = client.post(f'/admin/students/{student_id}/assign-batch', data={'batch_id': batch_id})
+            elif action < 0.7:
+                response = client.post(f'/admin/batches/{batch_id}/add-student', data={'student_id': student_id})
+            elif action < 0.9:
+                response = client.post(f'/admin/batches/{batch_id}/remove-student/{student_id}')
+            else:
+                response = client.post(f'/admin/students/{student_id}/assign-batch', data={'batch_id': ''})
+            local[response.status_code] += 1
+        with lock:
+            statuses.update(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Requests: {sum(statuses.values())}  by status: {dict(sorted(statuses.items()))}")
+
+    drift = []
+    with app.app_context():
+        actual = Counter(batch_id for (batch_id,) in db.session.query(StudentProfile.batch_id) if batch_id)
+        print(f"{'batch':>6} {'capacity':>9} {'counter':>8} {'students':>9}")
+        for batch in Batch.query.order_by(Batch.id):
+            print(f'{batch.id:>6} {batch.capacity:>9} {batch.current_enrollment:>8} {actual[batch.id]:>9}')
+            if batch.current_enrollment != actual[batch.id] or actual[batch.id] > batch.capacity:
+                drift.append(batch.id)
+        fixes = reconcile_enrollment()
+
+    if drift or fixes:
+        print(f'\nDrift in batch(es) {drift}; reconciliation fixed {len(fixes)}')
+        sys.exit(1)
+    print('\nNo drift: counters match student profiles and no batch is over capacity.')
+
+
+if __name__ == '__main__':
+    main()
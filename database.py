@@ -0,0 +1,87 @@
+"""Engine settings per backend: SQLite profiles and pooled PostgreSQL.
+
+The ``production`` profile switches the database to WAL so readers never
+block the writer, relaxes fsyncs to ``synchronous=NORMAL`` (safe with WAL),
+memory-maps the file, enlarges the page cache and makes writers wait for the
+lock instead of failing with "database is locked". ``default`` leaves
+SQLite's own settings alone. Profiles are picked with the ``SQLITE_PROFILE``
+config key and only apply to SQLite URLs. PostgreSQL URLs get a larger
+pool with pre-ping, as the server handles many concurrent writers.
+"""
+from sqlalchemy import event
+
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # Negative means KiB: 64 MiB
+        'busy_timeout': 5000,      # Milliseconds a writer waits for the lock
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Connection pool for multi-threaded servers. A file database allows one
+# writer at a time, so a large pool only adds lock waits.
+POOL_OPTIONS = {
+    'pool_size': 8,
+    'max_overflow': 8,
+    'pool_timeout': 30,
+}
+
+POSTGRES_POOL_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+
+def normalize_uri(uri):
+    """Accept the ``postgres://`` scheme hosting providers still hand out"""
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def _is_file_sqlite(uri):
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') not in ('sqlite:', 'sqlite')
+
+
+def engine_options(uri, profile='production'):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL and profile"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f'Unknown SQLite profile: {profile}')
+    if uri.startswith('postgresql'):
+        return dict(POSTGRES_POOL_OPTIONS)
+    if not _is_file_sqlite(uri) or profile == 'default':
+        return {}
+    return {
+        **POOL_OPTIONS,
+        # Connections are handed between request threads by the pool
+        'connect_args': {'check_same_thread': False, 'timeout': SQLITE_PROFILES[profile]['busy_timeout'] / 1000},
+    }
+
+
+def apply_profile(engine, profile='production'):
+    """Run the profile's pragmas on every new connection of ``engine``"""
+    pragmas = SQLITE_PROFILES[profile]
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+
+def current_pragmas(connection):
+    """Effective values of the tuned pragmas on a connection"""
+    return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in SQLITE_PROFILES['production']}
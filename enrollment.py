@@ -0,0 +1,105 @@
+"""Seat accounting for batches.
+
+Every change to a student's batch goes through this module. Seats are taken
+with a conditional ``UPDATE batches SET current_enrollment = current_enrollment
++ n WHERE id = ? AND current_enrollment + n <= capacity`` and the row count
+says whether it worked, so two admins cannot over-fill a batch or lose an
+increment. A student's own batch is changed with a compare-and-set on the
+batch they were in. ``reconcile_enrollment`` recounts ``current_enrollment``
+from ``student_profiles`` to repair drift from older code or manual edits.
+"""
+from sqlalchemy import case, select, update
+
+from models import db, Batch, StudentProfile
+
+# Batches recounted per reconciliation transaction
+RECONCILE_CHUNK = 500
+
+_enrolled = db.func.coalesce(Batch.current_enrollment, 0)
+
+
+class EnrollmentError(ValueError):
+    """A batch change that could not be made; the message is shown to admins"""
+
+
+def reserve_seats(batch_id, count=1):
+    """Take ``count`` seats in a batch if it has room; True on success"""
+    result = db.session.execute(
+        update(Batch)
+        .where(Batch.id == batch_id, _enrolled + count <= db.func.coalesce(Batch.capacity, 0))
+        .values(current_enrollment=_enrolled + count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_seats(batch_id, count=1):
+    """Give back ``count`` seats, never going below zero"""
+    db.session.execute(
+        update(Batch)
+        .where(Batch.id == batch_id)
+        .values(current_enrollment=case((_enrolled > count, _enrolled - count), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def move_student(student, batch_id, commit=True):
+    """Put ``student`` (a StudentProfile) in ``batch_id``; None removes them.
+
+    Raises EnrollmentError if the new batch is full or the student's batch
+    was changed by someone else in the meantime; the transaction is then
+    rolled back.
+    """
+    old_batch_id = student.batch_id
+    if batch_id == old_batch_id:
+        return
+
+    try:
+        if batch_id is not None and not reserve_seats(batch_id):
+            raise EnrollmentError('Selected batch is full or invalid!')
+
+        current = StudentProfile.batch_id.is_(None) if old_batch_id is None else StudentProfile.batch_id == old_batch_id
+        moved = db.session.execute(
+            update(StudentProfile)
+            .where(StudentProfile.id == student.id, current)
+            .values(batch_id=batch_id)
+        )
+        if moved.rowcount != 1:
+            raise EnrollmentError('The student was just moved by someone else; please try again')
+
+        if old_batch_id is not None:
+            release_seats(old_batch_id)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def reconcile_enrollment(chunk_size=RECONCILE_CHUNK):
+    """Recount ``current_enrollment`` for every batch; returns the fixes made"""
+    actual = select(db.func.count(StudentProfile.id)) \
+        .where(StudentProfile.batch_id == Batch.id).scalar_subquery()
+
+    fixes = []
+    last_id = 0
+    while True:
+        rows = db.session.query(Batch.id, Batch.current_enrollment, actual.label('actual')) \
+            .filter(Batch.id > last_id).order_by(Batch.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        drifted = [row for row in rows if row.current_enrollment != row.actual]
+        if drifted:
+            # Recount again inside the UPDATE so moves made since the SELECT are included
+            db.session.execute(
+                update(Batch)
+                .where(Batch.id.in_([row.id for row in drifted]))
+                .values(current_enrollment=actual)
+                .execution_options(synchronize_session=False)
+            )
+            fixes.extend({'batch_id': row.id, 'stored': row.current_enrollment, 'actual': row.actual}
+                         for row in drifted)
+        db.session.commit()
+    return fixes
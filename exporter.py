@@ -0,0 +1,168 @@
+"""Streaming CSV/JSON exports of students, registrations and class sessions.
+
+Rows are fetched with ``yield_per`` and written out a chunk at a time, so an
+export never holds the full result set in memory. The same generator backs
+the HTTP export routes and the ``flask export`` command.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from models import db, User, StudentProfile, RegistrationRequest, ClassSession
+
+# Rows fetched from the database per round trip
+YIELD_PER = 1000
+
+# Available columns per export, in default output order
+EXPORT_COLUMNS = {
+    'students': {
+        'id': User.id,
+        'name': User.name,
+        'email': User.email,
+        'phone': User.phone,
+        'status': User.status,
+        'created_at': User.created_at,
+        'student_id_number': StudentProfile.student_id_number,
+        'grade': StudentProfile.grade,
+        'batch_id': StudentProfile.batch_id,
+        'class_type': StudentProfile.class_type,
+        'dob': StudentProfile.dob,
+        'contact_number': StudentProfile.contact_number,
+        'address': StudentProfile.address,
+    },
+    'registrations': {
+        'id': RegistrationRequest.id,
+        'name': RegistrationRequest.name,
+        'email': RegistrationRequest.email,
+        'mobile': RegistrationRequest.mobile,
+        'grade': RegistrationRequest.grade,
+        'class_type': RegistrationRequest.class_type,
+        'selected_batch_id': RegistrationRequest.selected_batch_id,
+        'student_id_number': RegistrationRequest.student_id_number,
+        'registration_type': RegistrationRequest.registration_type,
+        'payment_status': RegistrationRequest.payment_status,
+        'payment_amount': RegistrationRequest.payment_amount,
+        'payment_method': RegistrationRequest.payment_method,
+        'transaction_id': RegistrationRequest.transaction_id,
+        'status': RegistrationRequest.status,
+        'claimed_by': RegistrationRequest.claimed_by,
+        'submitted_at': RegistrationRequest.submitted_at,
+        'processed_at': RegistrationRequest.processed_at,
+    },
+    'sessions': {
+        'id': ClassSession.id,
+        'batch_id': ClassSession.batch_id,
+        'teacher_user_id': ClassSession.teacher_user_id,
+        'classroom_id': ClassSession.classroom_id,
+        'date': ClassSession.date,
+        'start_time': ClassSession.start_time,
+        'end_time': ClassSession.end_time,
+        'topic': ClassSession.topic,
+        'status': ClassSession.status,
+    },
+}
+
+# Column the from/to date range applies to
+EXPORT_DATE_COLUMNS = {
+    'students': User.created_at,
+    'registrations': RegistrationRequest.submitted_at,
+    'sessions': ClassSession.date,
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+
+def resolve_columns(kind, names=None):
+    """Validate requested column names, defaulting to every column"""
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError(f'Unknown export: {kind}')
+    available = EXPORT_COLUMNS[kind]
+    if not names:
+        return list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f'Unknown column(s) for {kind}: {", ".join(unknown)}')
+    return list(names)
+
+
+def build_export_query(kind, columns, date_from=None, date_to=None):
+    """SELECT statement for an export, ordered by id"""
+    available = EXPORT_COLUMNS[kind]
+    statement = db.select(*[available[name].label(name) for name in columns])
+
+    if kind == 'students':
+        statement = statement.select_from(User).outerjoin(StudentProfile, StudentProfile.user_id == User.id) \
+            .where(User.role == 'student')
+    else:
+        statement = statement.select_from(available['id'].class_)
+
+    date_column = EXPORT_DATE_COLUMNS[kind]
+    is_datetime = isinstance(date_column.type, db.DateTime)
+    if date_from:
+        statement = statement.where(date_column >= (datetime.combine(date_from, time.min) if is_datetime else date_from))
+    if date_to:
+        if is_datetime:
+            statement = statement.where(date_column < datetime.combine(date_to + timedelta(days=1), time.min))
+        else:
+            statement = statement.where(date_column <= date_to)
+
+    return statement.order_by(available['id'])
+
+
+def iter_export_rows(kind, columns, date_from=None, date_to=None):
+    """Yield result rows without buffering the whole result set"""
+    statement = build_export_query(kind, columns, date_from, date_to)
+    result = db.session.execute(statement.execution_options(yield_per=YIELD_PER))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_export(kind, file_format='csv', columns=None, date_from=None, date_to=None, chunk_rows=YIELD_PER):
+    """Yield the export as text chunks of roughly ``chunk_rows`` rows each"""
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+    columns = resolve_columns(kind, columns)
+    rows = iter_export_rows(kind, columns, date_from, date_to)
+
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(['' if v is None else _plain(v) for v in row])
+            if count % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    # JSON: a streamed array of objects
+    buffer.write('[')
+    for count, row in enumerate(rows, start=1):
+        if count > 1:
+            buffer.write(',')
+        buffer.write('\n')
+        buffer.write(json.dumps({name: _plain(value) for name, value in zip(columns, row)}))
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    buffer.write('\n]\n')
+    yield buffer.getvalue()
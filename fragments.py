@@ -0,0 +1,128 @@
+"""Fragment cache for rendered template blocks and small option lists.
+
+Entries are keyed by a name, an optional extra key and the current version of
+every table they were built from. Committing a change to one of those tables
+bumps its version, so later lookups miss and re-render; the stale entries are
+never read again and fall off the end of the LRU. Versions live in this
+process, so entries also expire after ``ttl`` seconds to pick up writes made
+by other workers.
+
+Templates use it through ``cached_fragment``::
+
+    {% call cached_fragment('schedule-filters', 'users', 'batches', 'classrooms') %}
+        ...
+    {% endcall %}
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User, Batch, Classroom
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments keyed by table versions"""
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _key(self, name, tables, key):
+        return name, key, tuple((table, self._versions.get(table, 0)) for table in tables)
+
+    def get(self, name, tables, build, key=None):
+        """Cached value for ``name``, calling ``build()`` to fill a miss"""
+        now = time.monotonic()
+        with self._lock:
+            cache_key = self._key(name, tables, key)
+            cached = self._entries.get(cache_key)
+            if cached is not None and now - cached[1] < self.ttl:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        value = build()
+        with self._lock:
+            self._entries[cache_key] = (value, now)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Bump the given tables' versions, or drop everything without arguments"""
+        with self._lock:
+            if not tables:
+                self._entries.clear()
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def info(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'versions': dict(self._versions),
+            }
+
+
+fragment_cache = FragmentCache()
+
+
+def cached_fragment(name, *tables, key=None, caller=None):
+    """Jinja ``{% call %}`` helper: render the block once per table versions"""
+    return Markup(fragment_cache.get(name, tables, lambda: str(caller()), key=key))
+
+
+def schedule_filter_options():
+    """(teachers, batches, classrooms) id/name rows for the schedule filters and form"""
+    return fragment_cache.get('schedule-options', ('users', 'batches', 'classrooms'), lambda: (
+        db.session.query(User.id, User.name).filter_by(role='teacher', status='active').order_by(User.id).all(),
+        db.session.query(Batch.id, Batch.name).order_by(Batch.id).all(),
+        db.session.query(Classroom.id, Classroom.name, Classroom.capacity).order_by(Classroom.id).all(),
+    ))
+
+
+# Tables written in the current transaction are collected on the session and
+# their versions bumped once it commits, so no reader can cache a fragment
+# built from uncommitted data under the new version. Tables from a rolled
+# back transaction are bumped with the next commit, which is merely early.
+def _changed_tables(session):
+    return session.info.setdefault('fragment_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    tables = _changed_tables(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tables.add(obj.__table__.name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_statement(state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if state.is_insert or state.is_update or state.is_delete:
+        _changed_tables(state.session).add(state.statement.table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions(session):
+    tables = session.info.pop('fragment_tables', None)
+    if tables:
+        fragment_cache.invalidate(*tables)
@@ -0,0 +1,288 @@
+"""Streaming CSV/Excel import of students and teachers.
+
+Rows are read one at a time, validated against the User/StudentProfile/
+TeacherProfile columns and de-duplicated against an index of existing emails
+and student ids that is loaded once. Valid rows are written in chunks with
+executemany INSERTs, each chunk in its own short transaction, so memory use
+and write-lock time stay bounded however large the file is. A chunk the
+database refuses is written again row by row, so only the offending rows
+are rejected, each with the database's error.
+"""
+import csv
+import io
+import re
+from collections import Counter
+from datetime import datetime
+
+from enrollment import reserve_seats, EnrollmentError
+from models import db, User, StudentProfile, TeacherProfile, Batch
+from pagination import clear_count_cache
+
+# Rows written per INSERT batch / transaction
+CHUNK_SIZE = 1000
+
+# Errors kept in the report; the counts stay exact beyond this
+MAX_REPORTED_ERRORS = 5000
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+USER_STATUSES = ('pending', 'active', 'inactive')
+CLASS_TYPES = ('online', 'physical', 'both')
+
+
+class ImportReport:
+    """Outcome of an import: counts plus one entry per rejected row"""
+
+    def __init__(self, role):
+        self.role = role
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, email, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'email': email, 'errors': messages})
+
+    def to_dict(self):
+        return {
+            'role': self.role,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def _iter_csv(stream):
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # Header is line 1, so data starts at line 2
+        yield reader.line_num, row
+
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Excel import requires the openpyxl package; upload a CSV file instead')
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+        for line, values in enumerate(rows, start=2):
+            yield line, {key: value for key, value in zip(header, values) if key}
+    finally:
+        workbook.close()
+
+
+def iter_rows(stream, file_format):
+    """Yield (line number, {column: value}) from a CSV or XLSX stream"""
+    if file_format == 'csv':
+        return _iter_csv(stream)
+    if file_format == 'xlsx':
+        return _iter_xlsx(stream)
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def _clean(row, key):
+    value = row.get(key)
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value).strip()
+
+
+class _Index:
+    """Existing emails, student ids and batch seats, loaded once per import"""
+
+    def __init__(self):
+        self.emails = {email.lower() for (email,) in db.session.query(User.email)}
+        self.student_ids = {number for (number,) in db.session.query(StudentProfile.student_id_number)
+                            if number}
+        self.free_seats = {batch_id: (capacity or 0) - (enrollment or 0)
+                           for batch_id, capacity, enrollment
+                           in db.session.query(Batch.id, Batch.capacity, Batch.current_enrollment)}
+
+
+def _validate(row, role, index):
+    """Return (user values, profile values, errors) for one input row"""
+    errors = []
+    name = _clean(row, 'name')
+    email = _clean(row, 'email')
+    status = _clean(row, 'status').lower() or 'active'
+
+    if not name:
+        errors.append('name is required')
+    if not EMAIL_RE.match(email):
+        errors.append('email is missing or invalid')
+    elif email.lower() in index.emails:
+        errors.append(f'email {email} already exists')
+    if status not in USER_STATUSES:
+        errors.append(f'status must be one of {", ".join(USER_STATUSES)}')
+
+    user = {
+        'name': name,
+        'email': email,
+        'phone': _clean(row, 'phone') or None,
+        'role': role,
+        'status': status,
+        'temp_password': 'temp123' if role == 'student' else None,
+    }
+
+    if role == 'student':
+        profile = {
+            'grade': _clean(row, 'grade') or None,
+            'contact_number': _clean(row, 'contact_number') or None,
+            'address': _clean(row, 'address') or None,
+            'class_type': _clean(row, 'class_type').lower() or None,
+            'student_id_number': _clean(row, 'student_id_number') or None,
+            'batch_id': None,
+            'dob': None,
+        }
+        if profile['class_type'] and profile['class_type'] not in CLASS_TYPES:
+            errors.append(f'class_type must be one of {", ".join(CLASS_TYPES)}')
+        if profile['student_id_number'] and profile['student_id_number'] in index.student_ids:
+            errors.append(f'student_id_number {profile["student_id_number"]} already exists')
+
+        dob = _clean(row, 'dob')
+        if dob:
+            try:
+                profile['dob'] = datetime.strptime(dob[:10], '%Y-%m-%d').date()
+            except ValueError:
+                errors.append('dob must be YYYY-MM-DD')
+
+        batch_id = _clean(row, 'batch_id')
+        if batch_id:
+            try:
+                profile['batch_id'] = int(float(batch_id))
+            except ValueError:
+                errors.append('batch_id must be a number')
+            else:
+                if profile['batch_id'] not in index.free_seats:
+                    errors.append(f'batch {profile["batch_id"]} does not exist')
+                elif index.free_seats[profile['batch_id']] <= 0:
+                    errors.append(f'batch {profile["batch_id"]} is full')
+    else:
+        subjects = _clean(row, 'subjects')
+        profile = {
+            'subjects': [s.strip() for s in re.split(r'[;,]', subjects) if s.strip()],
+            'contact_number': _clean(row, 'contact_number') or None,
+            'bio': _clean(row, 'bio') or None,
+            'active_flag': status != 'inactive',
+        }
+
+    return user, profile, errors
+
+
+def _generated_student_id(user_id, taken):
+    """STU<user id>, suffixed if that number was already given to someone by hand"""
+    number = base = f'STU{user_id:06d}'
+    suffix = 1
+    while number in taken:
+        suffix += 1
+        number = f'{base}-{suffix}'
+    return number
+
+
+def _write_chunk(role, users, profiles, index):
+    """Insert one chunk of users and their profiles in a single transaction.
+
+    The row dicts are copied, not changed, so a failed chunk can be retried.
+    """
+    now = datetime.utcnow()
+    users = [dict(user, created_at=now, updated_at=now) for user in users]
+
+    table = User.__table__
+    result = db.session.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True),
+        users
+    )
+    user_ids = [row.id for row in result]
+    profiles = [dict(profile, user_id=user_id) for user_id, profile in zip(user_ids, profiles)]
+
+    generated = set()
+    if role == 'student':
+        for profile in profiles:
+            if not profile['student_id_number']:
+                profile['student_id_number'] = _generated_student_id(profile['user_id'], index.student_ids | generated)
+                generated.add(profile['student_id_number'])
+        db.session.execute(StudentProfile.__table__.insert(), profiles)
+
+        for batch_id, added in Counter(p['batch_id'] for p in profiles if p['batch_id']).items():
+            if not reserve_seats(batch_id, added):
+                raise EnrollmentError(f'batch {batch_id} filled up during the import')
+    else:
+        db.session.execute(TeacherProfile.__table__.insert(), profiles)
+
+    db.session.commit()
+    index.student_ids |= generated
+
+
+def _failure_reason(e):
+    # Database errors carry the driver's message, e.g. the constraint that failed
+    return str(getattr(e, 'orig', None) or e)
+
+
+def import_people(stream, role, file_format='csv', chunk_size=CHUNK_SIZE):
+    """Import students or teachers from ``stream`` and return an ImportReport"""
+    if role not in ('student', 'teacher'):
+        raise ValueError(f'Unsupported import role: {role}')
+
+    report = ImportReport(role)
+    index = _Index()
+    users, profiles, lines = [], [], []
+
+    def write(chunk_users, chunk_profiles):
+        """Write rows in one transaction; returns the error, or None on success"""
+        try:
+            _write_chunk(role, chunk_users, chunk_profiles, index)
+        except Exception as e:
+            db.session.rollback()
+            return e
+        report.inserted += len(chunk_users)
+        return None
+
+    def flush_chunk():
+        error = write(users, profiles)
+        if error is not None:
+            # Retry row by row so only the offending rows are rejected
+            for line, user, profile in zip(lines, users, profiles):
+                row_error = error if len(users) == 1 else write([user], [profile])
+                if row_error is not None:
+                    report.add_error(line, user['email'], [f'write failed: {_failure_reason(row_error)}'])
+        users.clear()
+        profiles.clear()
+        lines.clear()
+
+    for line, row in iter_rows(stream, file_format):
+        report.rows += 1
+        user, profile, errors = _validate(row, role, index)
+        if errors:
+            report.add_error(line, user['email'], errors)
+            continue
+
+        # Reserve the unique values so later rows in the file cannot reuse them
+        index.emails.add(user['email'].lower())
+        if role == 'student':
+            if profile['student_id_number']:
+                index.student_ids.add(profile['student_id_number'])
+            if profile['batch_id']:
+                index.free_seats[profile['batch_id']] -= 1
+
+        users.append(user)
+        profiles.append(profile)
+        lines.append(line)
+        if len(users) >= chunk_size:
+            flush_chunk()
+
+    if users:
+        flush_chunk()
+
+    clear_count_cache()
+    return report
@@ -0,0 +1,240 @@
+"""Background jobs kept in the ``jobs`` table.
+
+Routes hand slow side effects to ``enqueue`` and return at once; worker
+threads started with the app run them. Because the queue is a table in the
+app's own database it survives restarts. Workers look for a due job with a
+plain SELECT and take it with a compare-and-set ``UPDATE ... RETURNING``,
+so idle polls never need the write lock and the threads of every app
+process can share the queue without running a job twice.
+
+A task that raises is retried with exponential backoff until it has had
+``max_attempts`` tries, then marked ``failed`` with the error. A job left
+``running`` by a worker that died is taken again once ``JOB_LEASE`` has
+passed, so tasks should be safe to run twice. Job status is served by the
+read-only API at ``/api/v1/jobs``.
+
+Tasks are plain functions registered by name::
+
+    @task('welcome_email')
+    def welcome_email(user_id):
+        ...
+
+    enqueue('welcome_email', {'user_id': user.id})
+"""
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from models import db, Job
+
+# A running job not finished after this long is assumed lost and run again
+JOB_LEASE = timedelta(minutes=10)
+
+# Delay before the first retry; doubled for every further attempt
+RETRY_DELAY = timedelta(seconds=30)
+
+# name -> function, filled by @task
+TASKS = {}
+
+
+def task(name):
+    """Register a function as the task run for jobs of kind ``name``"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, delay=None, max_attempts=3):
+    """Queue one job and commit; returns its id"""
+    return enqueue_many(kind, [payload], delay=delay, max_attempts=max_attempts)[0]
+
+
+def enqueue_many(kind, payloads, delay=None, max_attempts=3):
+    """Queue one job per payload in a single transaction; returns their ids"""
+    if kind not in TASKS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    run_at = datetime.utcnow() + (delay or timedelta(0))
+    jobs = [Job(kind=kind, payload=payload or {}, max_attempts=max_attempts, run_at=run_at)
+            for payload in payloads]
+    if not jobs:
+        return []
+    db.session.add_all(jobs)
+    db.session.flush()
+    job_ids = [job.id for job in jobs]  # Read before the commit expires them
+    db.session.commit()
+    job_worker.notify()
+    return job_ids
+
+
+def _due(now):
+    """Queued jobs whose time has come, and running ones whose lease ran out"""
+    return or_(
+        and_(Job.status == 'queued', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_at <= now - JOB_LEASE),
+    )
+
+
+def due_jobs(now=None):
+    """SELECT of due job ids, oldest first"""
+    return select(Job.id).where(_due(now or datetime.utcnow())).order_by(Job.run_at, Job.id)
+
+
+def claim_job(worker):
+    """Take the oldest due job for ``worker``; returns its row or None"""
+    now = datetime.utcnow()
+    while True:
+        # Idle polls stay read-only: on SQLite the UPDATE would take the write lock
+        job_id = db.session.execute(due_jobs(now).limit(1)).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        row = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, _due(now))
+            .values(status='running', locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        if row is not None:
+            return row
+        # Another worker took that job between the SELECT and the UPDATE; try the next
+
+
+def _finish(row, worker, values):
+    # Only the worker still holding the job may record its outcome
+    db.session.execute(
+        update(Job)
+        .where(Job.id == row.id, Job.status == 'running', Job.locked_by == worker, Job.attempts == row.attempts)
+        .values(locked_by=None, locked_at=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_job(row, worker):
+    """Run a claimed job and record success, a retry or the final failure"""
+    func = TASKS.get(row.kind)
+    if func is None or row.attempts > row.max_attempts:
+        error = (f'No task registered for {row.kind}' if func is None
+                 else f'Gave up after {row.max_attempts} attempt(s); the last worker was lost')
+        _finish(row, worker, {'status': 'failed', 'last_error': error, 'finished_at': datetime.utcnow()})
+        return False
+
+    try:
+        result = func(**(row.payload or {}))
+    except Exception as e:
+        db.session.rollback()
+        error = f'{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}'
+        now = datetime.utcnow()
+        if row.attempts < row.max_attempts:
+            _finish(row, worker, {'status': 'queued', 'last_error': error,
+                                  'run_at': now + RETRY_DELAY * 2 ** (row.attempts - 1)})
+        else:
+            _finish(row, worker, {'status': 'failed', 'last_error': error, 'finished_at': now})
+        return False
+    _finish(row, worker, {'status': 'done', 'result': result, 'finished_at': datetime.utcnow()})
+    return True
+
+
+def retry_job(job_id):
+    """Queue a failed job again with a fresh set of attempts; False if it is not failed"""
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == 'failed')
+        .values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        job_worker.notify()
+    return result.rowcount == 1
+
+
+class JobWorker:
+    """Threads that claim and run due jobs until stopped"""
+
+    def __init__(self, app=None, threads=2, poll_interval=5.0):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval  # Longest wait for jobs queued by other processes
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._running = []
+        self._lock = threading.Lock()
+
+    def notify(self):
+        """Wake idle threads; called whenever a job is queued"""
+        self._wake.set()
+
+    def start(self):
+        """Start the threads unless they are running already"""
+        if self._running or not self.threads:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._stopping.clear()
+            prefix = f'{socket.gethostname()}:{os.getpid()}'
+            for n in range(self.threads):
+                thread = threading.Thread(target=self._loop, args=(f'{prefix}:{n}',),
+                                          name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._running.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the threads to finish their current job and wait for them"""
+        with self._lock:
+            self._stopping.set()
+            self._wake.set()
+            for thread in self._running:
+                thread.join(timeout)
+            self._running = []
+
+    def run_pending(self, limit=None, worker=None):
+        """Run due jobs in this thread until none are left; returns how many ran"""
+        worker = worker or f'{socket.gethostname()}:{os.getpid()}:cli'
+        count = 0
+        while limit is None or count < limit:
+            row = claim_job(worker)
+            if row is None:
+                break
+            run_job(row, worker)
+            count += 1
+        return count
+
+    def _loop(self, worker):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    ran = self.run_pending(limit=1, worker=worker)
+            except Exception:
+                self.app.logger.exception('Job worker %s failed to take a job', worker)
+                ran = 0
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+job_worker = JobWorker()
+
+
+def init_jobs(app):
+    """Attach ``job_worker`` to ``app``; its threads start with the first request"""
+    app.config.setdefault('JOB_WORKERS', 2)
+    app.config.setdefault('JOB_POLL_INTERVAL', 5.0)
+    job_worker.app = app
+    job_worker.threads = app.config['JOB_WORKERS']
+    job_worker.poll_interval = app.config['JOB_POLL_INTERVAL']
+
+    # Not at import: CLI commands such as migrate must not start workers
+    @app.before_request
+    def _start_job_worker():
+        job_worker.start()
+
+    return job_worker
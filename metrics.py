@@ -0,0 +1,338 @@
+"""Prometheus text-format metrics at ``/metrics``.
+
+Request counts and latency histograms per endpoint, SQL write timings (on
+SQLite a writer waiting for the database lock shows up here), "database is
+locked" errors, connection pool usage, the stats and fragment cache hit
+ratios and a few business gauges. The business gauges read counters the app
+already keeps up to date — ``stats_cache`` and ``Batch.current_enrollment``
+— through the caches, so a scrape does not recount tables.
+
+Each worker process keeps its own counters. When ``METRICS_DIR`` is set,
+workers also write them to ``<METRICS_DIR>/<pid>-<start time>.json`` every
+``METRICS_FLUSH_SECONDS``, and whichever worker answers a scrape adds up
+every file. Counters of workers that are idle or have exited, the cache hit
+and miss totals included, keep counting, as totals should; a worker reusing
+a pid gets a file of its own. Pool and cache size gauges are dropped once a
+worker's file goes stale.
+
+No client library is needed: ``curl -s localhost:5000/metrics`` works.
+"""
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from sqlalchemy import event
+
+from models import db, Batch
+from stats import stats_cache
+from fragments import fragment_cache
+
+# Request latency buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SQL writes are fast unless they wait for the lock (busy_timeout is 5s)
+WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0)
+
+# Type and help text for every metric name, in output order
+METRICS = {
+    'nanapatha_http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'nanapatha_http_request_duration_seconds': ('histogram', 'Request handling time by endpoint.'),
+    'nanapatha_db_statements_total': ('counter', 'SQL statements executed, by kind (read/write).'),
+    'nanapatha_db_write_duration_seconds': ('histogram', 'Time for INSERT/UPDATE/DELETE statements, including lock waits.'),
+    'nanapatha_db_errors_total': ('counter', 'Database errors, by kind (locked/other).'),
+    'nanapatha_db_pool_connections': ('gauge', 'Pooled connections by state (checked_out/idle/overflow).'),
+    'nanapatha_db_pool_size': ('gauge', 'Configured connection pool size.'),
+    'nanapatha_cache_hits_total': ('counter', 'Cache hits, by cache.'),
+    'nanapatha_cache_misses_total': ('counter', 'Cache misses, by cache.'),
+    'nanapatha_cache_hit_ratio': ('gauge', 'Hits over lookups since start, by cache.'),
+    'nanapatha_cache_entries': ('gauge', 'Entries currently cached, by cache.'),
+    'nanapatha_pending_registrations': ('gauge', 'Registration requests waiting for review.'),
+    'nanapatha_active_students': ('gauge', 'Active student accounts.'),
+    'nanapatha_active_teachers': ('gauge', 'Active teacher accounts.'),
+    'nanapatha_batch_enrollment': ('gauge', 'Students enrolled in each active batch.'),
+    'nanapatha_batch_capacity': ('gauge', 'Seats in each active batch.'),
+    'nanapatha_batch_fill_ratio': ('gauge', 'Enrollment over capacity for each active batch.'),
+}
+
+_WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms for this process"""
+
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self.buckets = {}     # histogram name -> upper bounds
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            self.counters[name, labels] = self.counters.get((name, labels), 0) + amount
+
+    def set(self, name, labels, value):
+        """Set a counter whose total is kept elsewhere, such as a cache's hits"""
+        with self._lock:
+            self.counters[name, labels] = value
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            self.buckets.setdefault(name, buckets)
+            series = self.histograms.get((name, labels))
+            if series is None:
+                series = self.histograms[name, labels] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """JSON-friendly copy: lists of [name, labels, value]"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+                'buckets': dict(self.buckets),
+            }
+
+
+def _labels(pairs):
+    return tuple(tuple(pair) for pair in pairs)
+
+
+def _merge(snapshots):
+    """Add up counters and histograms from several snapshots"""
+    counters, histograms, buckets = {}, {}, {}
+    for snapshot in snapshots:
+        buckets.update({name: tuple(bounds) for name, bounds in snapshot['buckets'].items()})
+        for name, labels, value in snapshot['counters']:
+            key = (name, _labels(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, _labels(labels))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return counters, histograms, buckets
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+        return f'{name}{{{label_text}}} {value:.10g}'
+    return f'{name} {value:.10g}'
+
+
+def render(counters, histograms, buckets, gauges):
+    """Prometheus text exposition format (version 0.0.4)"""
+    samples = {}  # name -> [(labels, lines)]
+    for (name, labels), value in [*counters.items(), *gauges.items()]:
+        samples.setdefault(name, []).append((labels, [_series(name, labels, value)]))
+    for (name, labels), series in histograms.items():
+        lines = []
+        cumulative = 0
+        for bound, count in zip(buckets[name], series):
+            cumulative += count
+            lines.append(_series(f'{name}_bucket', labels + (('le', f'{bound:g}'),), cumulative))
+        lines.append(_series(f'{name}_bucket', labels + (('le', '+Inf'),), series[-1]))
+        lines.append(_series(f'{name}_sum', labels, series[-2]))
+        lines.append(_series(f'{name}_count', labels, series[-1]))
+        samples.setdefault(name, []).append((labels, lines))
+
+    out = []
+    for name, (kind, help_text) in METRICS.items():
+        if name in samples:
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+            for labels, lines in sorted(samples[name], key=lambda sample: [str(v) for pair in sample[0] for v in pair]):
+                out.extend(lines)
+    return '\n'.join(out) + '\n'
+
+
+def _cache_counters(registry):
+    # The caches count their own hits and misses; copied in so they merge as counters
+    for cache_name, info in (('stats', stats_cache.info()), ('fragments', fragment_cache.info())):
+        labels = (('cache', cache_name),)
+        registry.set('nanapatha_cache_hits_total', labels, info['hits'])
+        registry.set('nanapatha_cache_misses_total', labels, info['misses'])
+
+
+def _process_gauges(engine):
+    """Pool and cache figures of this worker: {(name, labels): value}"""
+    gauges = {}
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        gauges['nanapatha_db_pool_size', ()] = pool.size()
+        gauges['nanapatha_db_pool_connections', (('state', 'checked_out'),)] = pool.checkedout()
+        gauges['nanapatha_db_pool_connections', (('state', 'idle'),)] = pool.checkedin()
+        gauges['nanapatha_db_pool_connections', (('state', 'overflow'),)] = max(0, pool.overflow())
+    for cache_name, info in (('stats', stats_cache.info()), ('fragments', fragment_cache.info())):
+        labels = (('cache', cache_name),)
+        gauges['nanapatha_cache_entries', labels] = info.get('entries', len(info.get('cached', ())))
+    return gauges
+
+
+def _batch_rows():
+    return fragment_cache.get('metrics-batches', ('batches',), lambda: [
+        tuple(row) for row in db.session.query(Batch.id, Batch.name, Batch.capacity, Batch.current_enrollment)
+        .filter(Batch.is_active.is_(True)).order_by(Batch.id)
+    ])
+
+
+def _business_gauges():
+    gauges = {
+        ('nanapatha_pending_registrations', ()): stats_cache.get('pending_registrations'),
+        ('nanapatha_active_students', ()): stats_cache.get('active_students'),
+        ('nanapatha_active_teachers', ()): stats_cache.get('active_teachers'),
+    }
+    for batch_id, name, capacity, enrolled in _batch_rows():
+        labels = (('batch_id', batch_id), ('batch', name))
+        gauges['nanapatha_batch_enrollment', labels] = enrolled or 0
+        gauges['nanapatha_batch_capacity', labels] = capacity or 0
+        if capacity:
+            gauges['nanapatha_batch_fill_ratio', labels] = (enrolled or 0) / capacity
+    return gauges
+
+
+# pid -> name of that process's snapshot file; a forked worker picks its own
+_worker_files = {}
+
+
+def _worker_filename():
+    """Snapshot file of this process, unique even when a pid is reused"""
+    pid = os.getpid()
+    if pid not in _worker_files:
+        _worker_files[pid] = f'{pid}-{time.time_ns()}.json'
+    return _worker_files[pid]
+
+
+def _read_worker_files(directory, own_file, stale_after):
+    """Snapshots and per-worker gauges written by the other workers"""
+    snapshots, gauges = [], []
+    if not directory or not os.path.isdir(directory):
+        return snapshots, gauges
+    now = time.time()
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json') or filename == own_file:
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            modified = os.path.getmtime(path)
+        except (OSError, ValueError):
+            continue  # Being replaced right now, or removed
+        snapshots.append(data['metrics'])
+        if now - modified < stale_after:
+            gauges.append(data['gauges'])
+    return snapshots, gauges
+
+
+def init_metrics(app):
+    """Count requests and SQL on ``app`` and serve ``/metrics``"""
+    app.config.setdefault('METRICS_DIR', None)
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 5)
+    app.config.setdefault('METRICS_STALE_SECONDS', 60)
+
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    flushed = [0.0]
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _statement_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if statement.lstrip()[:7].upper().startswith(_WRITES):
+            registry.inc('nanapatha_db_statements_total', (('kind', 'write'),))
+            registry.observe('nanapatha_db_write_duration_seconds', (), elapsed, WRITE_BUCKETS)
+        else:
+            registry.inc('nanapatha_db_statements_total', (('kind', 'read'),))
+
+    @event.listens_for(engine, 'handle_error')
+    def _statement_failed(context):
+        started = context.connection.info.get('metrics_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        kind = 'locked' if 'locked' in str(context.original_exception).lower() else 'other'
+        registry.inc('nanapatha_db_errors_total', (('kind', kind),))
+
+    def _flush():
+        directory = app.config['METRICS_DIR']
+        os.makedirs(directory, exist_ok=True)
+        gauges = _process_gauges(db.engine)
+        _cache_counters(registry)
+        data = {
+            'metrics': registry.snapshot(),
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        }
+        path = os.path.join(directory, _worker_filename())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)  # Readers never see a half-written file
+
+    @app.before_request
+    def _request_started():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _request_finished(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        # Unrouted URLs share one label so random paths cannot add series
+        endpoint = request.endpoint or 'unmatched'
+        registry.inc('nanapatha_http_requests_total',
+                     (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+        registry.observe('nanapatha_http_request_duration_seconds', (('endpoint', endpoint),),
+                         time.perf_counter() - started, DURATION_BUCKETS)
+
+        if app.config['METRICS_DIR'] and time.monotonic() - flushed[0] >= app.config['METRICS_FLUSH_SECONDS']:
+            flushed[0] = time.monotonic()
+            try:
+                _flush()
+            except OSError as e:
+                app.logger.warning('Could not write metrics to %s: %s', app.config['METRICS_DIR'], e)
+        return response
+
+    def metrics():
+        """Prometheus scrape endpoint"""
+        others, other_gauges = _read_worker_files(app.config['METRICS_DIR'], _worker_filename(),
+                                                  app.config['METRICS_STALE_SECONDS'])
+        _cache_counters(registry)
+        counters, histograms, buckets = _merge([registry.snapshot(), *others])
+
+        gauges = _process_gauges(db.engine)
+        for worker_gauges in other_gauges:
+            for name, labels, value in worker_gauges:
+                key = (name, _labels(labels))
+                gauges[key] = gauges.get(key, 0) + value
+        # Ratios come from the summed hit and miss counters of every worker
+        for (name, labels), value in counters.items():
+            if name == 'nanapatha_cache_hits_total':
+                lookups = value + counters.get(('nanapatha_cache_misses_total', labels), 0)
+                gauges['nanapatha_cache_hit_ratio', labels] = value / lookups if lookups else 0.0
+        gauges.update(_business_gauges())
+
+        return Response(render(counters, histograms, buckets, gauges),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return registry
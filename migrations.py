@@ -0,0 +1,202 @@
+"""Versioned schema migrations.
+
+Each ``Migration`` has a version number, a DDL step and an optional backfill.
+``run_migrations`` records applied versions in the ``schema_version`` table,
+applies every pending DDL step in one transaction, then runs backfills in
+short id-range chunks so a large table is never write-locked for long. A
+backfill that is interrupted is resumed on the next run.
+
+A database created from scratch by ``db.create_all()`` already has the
+current schema, so it is stamped with every version instead. Steps are
+written to run on both SQLite and PostgreSQL.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from models import db
+from search import ensure_search_index
+
+# Rows updated per backfill transaction
+BACKFILL_CHUNK = 500
+
+schema_version = db.Table(
+    'schema_version', db.metadata,
+    db.Column('version', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('description', db.String(255)),
+    db.Column('applied_at', db.DateTime),
+    db.Column('backfilled_at', db.DateTime),  # NULL while a backfill is still pending
+)
+
+
+class Migration:
+    """One schema step; ``backfill_sql`` is run per chunk with :lo and :hi ids"""
+
+    def __init__(self, version, description, upgrade, backfill_table=None, backfill_sql=None):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.backfill_table = backfill_table
+        self.backfill_sql = backfill_sql
+
+
+def _add_column(conn, table, column, ddl):
+    # Databases migrated by the old startup code may already have the column
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def _batch_columns(conn):
+    _add_column(conn, 'batches', 'current_enrollment', 'INTEGER DEFAULT 0')
+
+
+def _batch_scheduling_columns(conn):
+    _add_column(conn, 'batches', 'teacher_id', 'INTEGER')
+    _add_column(conn, 'batches', 'start_date', 'DATE')
+    _add_column(conn, 'batches', 'end_date', 'DATE')
+    _add_column(conn, 'batches', 'is_active', 'BOOLEAN DEFAULT TRUE')
+
+
+def _classroom_active(conn):
+    _add_column(conn, 'classrooms', 'is_active', 'BOOLEAN DEFAULT TRUE')
+
+
+def _session_recurrence(conn):
+    _add_column(conn, 'class_sessions', 'recurrence_id', 'INTEGER REFERENCES session_recurrences(id)')
+
+
+def _model_indexes(conn):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _subjects_jsonb(conn):
+    # SQLite keeps JSON as text; PostgreSQL gets JSONB so the GIN index works
+    if conn.dialect.name != 'postgresql':
+        return
+    column = next(c for c in inspect(conn).get_columns('teacher_profiles') if c['name'] == 'subjects')
+    if column['type'].__class__.__name__ != 'JSONB':
+        conn.execute(db.text('ALTER TABLE teacher_profiles ALTER COLUMN subjects TYPE JSONB USING subjects::jsonb'))
+    for index in db.metadata.tables['teacher_profiles'].indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _registration_version(conn):
+    _add_column(conn, 'registration_requests', 'version', "INTEGER NOT NULL DEFAULT 1")
+
+
+def _updated_at_columns(conn):
+    # Left NULL on existing rows; the API only sends Last-Modified once a row has one
+    for table in ('student_profiles', 'teacher_profiles', 'batches', 'classrooms',
+                  'class_sessions', 'registration_requests'):
+        _add_column(conn, table, 'updated_at', 'TIMESTAMP')
+
+
+def _jobs_table(conn):
+    db.metadata.tables['jobs'].create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, 'batches.current_enrollment', _batch_columns,
+              backfill_table='batches',
+              backfill_sql="""
+                  UPDATE batches SET current_enrollment = (
+                      SELECT COUNT(*) FROM student_profiles
+                      WHERE student_profiles.batch_id = batches.id
+                  ) WHERE id >= :lo AND id <= :hi AND (current_enrollment IS NULL OR current_enrollment = 0)
+              """),
+    Migration(2, 'batches teacher, dates and is_active', _batch_scheduling_columns,
+              backfill_table='batches',
+              backfill_sql="UPDATE batches SET is_active = TRUE WHERE id >= :lo AND id <= :hi AND is_active IS NULL"),
+    Migration(3, 'classrooms.is_active', _classroom_active,
+              backfill_table='classrooms',
+              backfill_sql="UPDATE classrooms SET is_active = TRUE WHERE id >= :lo AND id <= :hi AND is_active IS NULL"),
+    Migration(4, 'class_sessions.recurrence_id', _session_recurrence),
+    Migration(5, 'indexes declared on the models', _model_indexes),
+    Migration(6, 'full-text search index', ensure_search_index),
+    Migration(7, 'teacher_profiles.subjects as JSONB with GIN index', _subjects_jsonb),
+    Migration(8, 'registration_requests.version for compare-and-set updates', _registration_version),
+    Migration(9, 'updated_at on profiles, batches, classrooms, sessions and registrations', _updated_at_columns),
+    Migration(10, 'profile user_id indexes', _model_indexes),
+    Migration(11, 'jobs table for the background queue', _jobs_table),
+]
+
+
+def _applied(conn):
+    return {row.version: row for row in conn.execute(db.select(schema_version))}
+
+
+def pending_migrations(engine):
+    """Migrations whose DDL or backfill has not run yet"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_version'):
+            return list(MIGRATIONS)
+        applied = _applied(conn)
+    return [m for m in MIGRATIONS
+            if m.version not in applied or (m.backfill_sql and applied[m.version].backfilled_at is None)]
+
+
+def _backfill(engine, migration, chunk_size, echo):
+    """Run one migration's backfill in id-range chunks, one transaction each"""
+    table = db.Table(migration.backfill_table, db.MetaData(), autoload_with=engine)
+    last_id = 0
+    chunks = 0
+    while True:
+        with engine.begin() as conn:
+            ids = [row[0] for row in conn.execute(
+                db.select(table.c.id).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+            )]
+            if not ids:
+                conn.execute(schema_version.update()
+                             .where(schema_version.c.version == migration.version)
+                             .values(backfilled_at=datetime.utcnow()))
+                break
+            conn.execute(db.text(migration.backfill_sql), {'lo': ids[0], 'hi': ids[-1]})
+        last_id = ids[-1]
+        chunks += 1
+    echo(f'  backfilled {migration.backfill_table} for version {migration.version} in {chunks} chunk(s)')
+
+
+def run_migrations(engine, chunk_size=BACKFILL_CHUNK, echo=print):
+    """Apply pending migrations; returns the versions whose DDL was applied.
+
+    All pending DDL steps share one transaction, so a failing step leaves
+    the schema and ``schema_version`` untouched and the error propagates.
+    """
+    with engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            # pysqlite does not open a transaction before DDL on its own
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        schema_version.create(conn, checkfirst=True)
+        applied = _applied(conn)
+        new_versions = []
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            echo(f'Applying {migration.version}: {migration.description}')
+            migration.upgrade(conn)
+            conn.execute(schema_version.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.utcnow(),
+                backfilled_at=None if migration.backfill_sql else datetime.utcnow()
+            ))
+            new_versions.append(migration.version)
+        conn.commit()
+
+    for migration in pending_migrations(engine):
+        _backfill(engine, migration, chunk_size, echo)
+    return new_versions
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _stamp_new_database(target, connection, tables=(), **kw):
+    # A brand new database is created at the latest version
+    if 'users' not in {table.name for table in tables}:
+        return
+    now = datetime.utcnow()
+    connection.execute(schema_version.insert(), [
+        {'version': m.version, 'description': m.description, 'applied_at': now, 'backfilled_at': now}
+        for m in MIGRATIONS
+    ])
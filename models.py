@@ -1,11 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import Numeric
+from sqlalchemy.dialects.postgresql import JSONB
 
 db = SQLAlchemy()
 
+# How long a registration claim blocks other admins before it lapses
+CLAIM_TTL = timedelta(minutes=30)
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Role/status filters on the list pages and dashboard counters
+        db.Index('ix_users_role_status', 'role', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -17,6 +25,7 @@ class User(db.Model):
     status = db.Column(db.Enum('pending', 'active', 'inactive', name='user_status'), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_rank = db.query_expression()  # bm25 score, loaded only by search.apply_search
     
     # Relationships
     student_profile = db.relationship('StudentProfile', backref='user', uselist=False, cascade='all, delete-orphan')
@@ -24,6 +33,11 @@ class User(db.Model):
 
 class StudentProfile(db.Model):
     __tablename__ = 'student_profiles'
+    __table_args__ = (
+        db.Index('ix_student_profiles_batch', 'batch_id'),
+        # User -> profile joins on every student list and detail page
+        db.Index('ix_student_profiles_user', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -36,22 +50,33 @@ class StudentProfile(db.Model):
     student_id_number = db.Column(db.String(50), unique=True)
     passport_photo_path = db.Column(db.String(255))
     student_id_card_path = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     batch = db.relationship('Batch', backref='students')
 
 class TeacherProfile(db.Model):
     __tablename__ = 'teacher_profiles'
+    __table_args__ = (
+        # Subject containment lookups; only PostgreSQL can index JSON this way
+        db.Index('ix_teacher_profiles_user', 'user_id'),
+        db.Index('ix_teacher_profiles_subjects', 'subjects', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    subjects = db.Column(db.JSON)  # Store as JSON array
+    subjects = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # Store as JSON array
     contact_number = db.Column(db.String(20))
     bio = db.Column(db.Text)
     active_flag = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Batch(db.Model):
     __tablename__ = 'batches'
+    __table_args__ = (
+        # Teacher assignment and teaching-load lookups
+        db.Index('ix_batches_teacher_active', 'teacher_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -67,6 +92,8 @@ class Batch(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_rank = db.query_expression()  # bm25 score, loaded only by search.apply_search
     
     # Relationships
     teacher = db.relationship('TeacherProfile', backref='assigned_batches')
@@ -81,9 +108,21 @@ class Classroom(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_rank = db.query_expression()  # bm25 score, loaded only by search.apply_search
 
 class ClassSession(db.Model):
     __tablename__ = 'class_sessions'
+    __table_args__ = (
+        # Used by the room/teacher double-booking checks
+        db.Index('ix_class_sessions_classroom_date_start', 'classroom_id', 'date', 'start_time'),
+        db.Index('ix_class_sessions_teacher_date_start', 'teacher_user_id', 'date', 'start_time'),
+        # One generated session per recurrence rule and day
+        db.Index('ux_class_sessions_recurrence_date', 'recurrence_id', 'date', unique=True),
+        # Weekly schedule range scans and per-teacher status counts
+        db.Index('ix_class_sessions_date', 'date'),
+        db.Index('ix_class_sessions_teacher_status', 'teacher_user_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), nullable=False)
@@ -94,14 +133,55 @@ class ClassSession(db.Model):
     end_time = db.Column(db.Time, nullable=False)
     topic = db.Column(db.String(255))
     status = db.Column(db.Enum('scheduled', 'completed', 'cancelled', name='session_status'), default='scheduled')
+    recurrence_id = db.Column(db.Integer, db.ForeignKey('session_recurrences.id'))  # Set for generated sessions
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     batch = db.relationship('Batch', backref='sessions')
     teacher = db.relationship('User', backref='taught_sessions')
     classroom = db.relationship('Classroom', backref='sessions')
 
+class SessionRecurrence(db.Model):
+    __tablename__ = 'session_recurrences'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), nullable=False)
+    teacher_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classrooms.id'))
+    frequency = db.Column(db.Enum('weekly', 'biweekly', name='recurrence_frequency'), nullable=False, default='weekly')
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)  # Open-ended when empty
+    topic = db.Column(db.String(255))
+    generated_until = db.Column(db.Date)  # Sessions exist up to and including this date
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    batch = db.relationship('Batch', backref='recurrences')
+    teacher = db.relationship('User')
+    classroom = db.relationship('Classroom')
+    
+    @property
+    def weekday_name(self):
+        """Return the weekday as a name"""
+        return ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][self.weekday]
+
+class Holiday(db.Model):
+    __tablename__ = 'holidays'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(255))
+
 class RegistrationRequest(db.Model):
     __tablename__ = 'registration_requests'
+    __table_args__ = (
+        # Status-filtered registration list, newest first
+        db.Index('ix_registration_requests_status_submitted', 'status', 'submitted_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -130,10 +210,13 @@ class RegistrationRequest(db.Model):
     claimed_by = db.Column(db.String(255))  # Admin who claimed this request
     claimed_at = db.Column(db.DateTime)
     admin_note = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped by every claim/accept/reject/mark-paid
     
     # Timestamps
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_rank = db.query_expression()  # bm25 score, loaded only by search.apply_search
     
     # Relationships
     selected_batch = db.relationship('Batch', backref='registration_requests')
@@ -158,9 +241,46 @@ class RegistrationRequest(db.Model):
         }
         return payment_classes.get(self.payment_status, 'bg-gray-100 text-gray-800')
     
+    @property
+    def claim_expires_at(self):
+        """When the current claim lapses, or None if there is no claim"""
+        if self.claimed_by and self.claimed_at:
+            return self.claimed_at + CLAIM_TTL
+        return None
+    
+    @property
+    def is_claimed(self):
+        """Whether an unexpired claim is held on this registration"""
+        expires = self.claim_expires_at
+        return expires is not None and expires > datetime.utcnow()
+    
     @property
     def formatted_submitted_date(self):
         """Return formatted submission date"""
         if self.submitted_at:
             return self.submitted_at.strftime('%Y-%m-%d %H:%M')
-        return 'N/A'
\ No newline at end of file
+        return 'N/A'
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers take the oldest due job of a status
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)  # Name of the registered task
+    payload = db.Column(db.JSON)  # Keyword arguments for the task
+    status = db.Column(db.Enum('queued', 'running', 'done', 'failed', name='job_status'), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not before; pushed back on retry
+    locked_by = db.Column(db.String(100))  # Worker running it
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
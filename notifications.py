@@ -0,0 +1,45 @@
+"""Messages to students and teachers, sent from background jobs.
+
+There is no mail server yet, so messages are written as ``.eml`` files to
+``OUTBOX_DIR`` (``data/outbox`` by default), from where they can be checked
+or handed to a relay. Each file is named after the message, so running a job
+twice rewrites the same file instead of sending a second copy.
+"""
+import os
+from email.message import EmailMessage
+
+from flask import current_app
+
+from jobs import task
+from models import db, User
+
+SENDER = 'NanaPatha <no-reply@nanapatha.com>'
+
+
+def _deliver(message, name):
+    outbox = current_app.config.get('OUTBOX_DIR', os.path.join('data', 'outbox'))
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, f'{name}.eml')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes(message))
+    os.replace(tmp_path, path)
+    return path
+
+
+@task('welcome_email')
+def welcome_email(user_id):
+    """Send a new account its login details"""
+    user = db.session.get(User, user_id)
+    if user is None:
+        return {'skipped': 'user no longer exists'}
+
+    message = EmailMessage()
+    message['From'] = SENDER
+    message['To'] = f'{user.name} <{user.email}>'
+    message['Subject'] = 'Welcome to NanaPatha'
+    lines = [f'Dear {user.name},', '', f'Your NanaPatha {user.role} account is ready.', f'Email: {user.email}']
+    if user.temp_password:
+        lines.append(f'Temporary password: {user.temp_password} (please change it after logging in)')
+    message.set_content('\n'.join(lines + ['', 'NanaPatha Administration']))
+    return {'path': _deliver(message, f'welcome-{user.id}')}
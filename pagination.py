@@ -0,0 +1,205 @@
+"""Keyset (cursor) pagination for the admin list pages.
+
+List routes hand a filtered query and their sort keys to ``paginate_keyset``.
+Instead of ``OFFSET`` the next/previous pages are fetched with a ``WHERE`` on
+the sort key of the boundary row, so every page costs the same no matter how
+deep it is. Cursor tokens are opaque url-safe strings.
+"""
+import base64
+import json
+import time
+from datetime import datetime, date
+
+from flask import request, url_for
+from sqlalchemy import and_, or_, false, func, event
+from sqlalchemy.orm import Session
+
+from models import db
+
+# Shared page size limits for every paginated list
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# How long a total count may be served from the cache (seconds)
+COUNT_CACHE_TTL = 60
+
+
+class KeysetPage:
+    """One page of results plus the tokens to reach its neighbours"""
+
+    def __init__(self, items, per_page, total, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def get_page_size():
+    """Read ``per_page`` from the request, clamped to the shared limit"""
+    try:
+        per_page = int(request.args.get('per_page', PAGE_SIZE))
+    except ValueError:
+        per_page = PAGE_SIZE
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values, direction):
+    """Pack the sort-key values of a boundary row into a cursor token"""
+    payload = {
+        'd': direction,
+        'k': [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values],
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort_keys):
+    """Unpack a cursor token, returning (values, direction) or None if invalid"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        raw_values = payload['k']
+        if direction not in ('next', 'prev') or len(raw_values) != len(sort_keys):
+            return None
+
+        values = []
+        for (column, _descending), value in zip(sort_keys, raw_values):
+            if value is not None and isinstance(column.type, db.DateTime):
+                value = datetime.fromisoformat(value)
+            elif value is not None and isinstance(column.type, db.Date):
+                value = date.fromisoformat(value)
+            values.append(value)
+        return values, direction
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _equals(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _beyond(column, value, forward_is_less):
+    """Rows strictly past ``value`` in one column; NULL sorts below every value"""
+    if forward_is_less:
+        # Only NULLs are smaller than a value, and nothing is smaller than NULL
+        return or_(column < value, column.is_(None)) if value is not None else None
+    return column > value if value is not None else column.isnot(None)
+
+
+def _after(sort_keys, values, backwards):
+    """Build the keyset predicate for rows after (or before) the given key"""
+    clauses = []
+    for i, (column, descending) in enumerate(sort_keys):
+        # Descending columns move forward towards smaller values
+        comparison = _beyond(column, values[i], descending != backwards)
+        if comparison is None:
+            continue
+        equals = [_equals(sort_keys[j][0], values[j]) for j in range(i)]
+        clauses.append(and_(*equals, comparison))
+    return or_(*clauses) if clauses else false()
+
+
+def _row_key(item, sort_keys):
+    return [getattr(item, column.key) for column, _descending in sort_keys]
+
+
+def paginate_keyset(query, sort_keys, cursor=None, per_page=PAGE_SIZE):
+    """Fetch one page of ``query`` ordered by ``sort_keys``.
+
+    ``sort_keys`` is a list of ``(column, descending)`` pairs and must end with
+    a unique column (normally the primary key) so that the order is total.
+    """
+    total = cached_count(query)
+
+    decoded = decode_cursor(cursor, sort_keys) if cursor else None
+    backwards = decoded is not None and decoded[1] == 'prev'
+
+    page_query = query
+    if decoded is not None:
+        page_query = page_query.filter(_after(sort_keys, decoded[0], backwards))
+
+    # NULLs sort as the smallest value on every backend (SQLite's own order),
+    # matching the predicate in _after
+    ordering = []
+    for column, descending in sort_keys:
+        ordering.append(column.desc().nulls_last() if descending != backwards else column.asc().nulls_first())
+
+    # Fetch one extra row to know whether there is another page in this direction
+    rows = page_query.order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = encode_cursor(_row_key(rows[-1], sort_keys), 'next')
+        if (has_more and backwards) or (decoded is not None and not backwards):
+            prev_cursor = encode_cursor(_row_key(rows[0], sort_keys), 'prev')
+
+    return KeysetPage(rows, per_page, total, next_cursor, prev_cursor)
+
+
+# Total counts are cached per distinct filtered query so that paging through a
+# large table does not run a full COUNT(*) on every request.
+_count_cache = {}
+
+
+def _count_key(query):
+    statement = query.order_by(None).statement
+    compiled = statement.compile()
+    params = tuple(sorted((k, str(v)) for k, v in compiled.params.items()))
+    return str(compiled), params
+
+
+def cached_count(query, ttl=COUNT_CACHE_TTL):
+    """Return the row count of ``query``, reusing a recent result if possible"""
+    key = _count_key(query)
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+
+    count_query = query.order_by(None)
+    entity = count_query.column_descriptions[0]['entity']
+    total = count_query.with_entities(func.count(entity.id)).scalar() or 0
+    _count_cache[key] = (total, now)
+    return total
+
+
+def clear_count_cache():
+    """Drop cached totals, e.g. after rows were added or removed"""
+    _count_cache.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_counts(session, flush_context):
+    # Any insert, delete or status change may move rows between filters
+    if session.new or session.deleted or session.dirty:
+        clear_count_cache()
+
+
+def page_url(cursor):
+    """URL of the current list page with a different cursor, keeping filters"""
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,284 @@
+"""Opt-in per-request profiling of SQL, template rendering and wall time.
+
+Turned on with ``PROFILING=1``. Every request then records its wall time,
+time spent in the database, statement and row counts and Jinja render time.
+SQL run while a template renders (lazy loads) is counted separately and
+taken out of the render time, so the three add up. A statement text run
+``PROFILING_REPEAT_THRESHOLD`` or more times in one request is flagged as an
+N+1 signature. The figures go out in a ``Server-Timing`` header (shown by
+the browser's network panel) and into a rolling window per endpoint shown at
+``/admin/_perf``.
+
+``PROFILING_SAMPLE_RATE`` additionally runs that fraction of requests under
+cProfile and writes the stats to ``PROFILING_DIR``. ``?_profile=1`` forces it
+for one request. Open a dump with ``python -m pstats <file>``.
+
+Timings stop when the view returns, so streamed responses such as exports
+do not include the time spent sending the body.
+"""
+import contextvars
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+from flask import before_render_template, template_rendered, render_template, request, jsonify, redirect, url_for, flash
+from sqlalchemy import event
+
+from models import db
+
+# Per-request profile of the request being handled in this context
+_current = contextvars.ContextVar('request_profile', default=None)
+
+# cProfile cannot profile two threads at once; sampled requests take turns
+_profiler_lock = threading.Lock()
+
+# Bound parameter lists from expanding IN clauses differ only in length
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Endpoints that are never recorded
+_SKIPPED = {'static', 'admin_perf', 'admin_perf_reset'}
+
+
+def _signature(statement):
+    """Statement text with whitespace and IN-list lengths normalised"""
+    return _IN_LIST.sub('(?)', _SPACE.sub(' ', statement).strip())
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class RequestProfile:
+    """Counters for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.template_time = 0.0
+        self.template_db_time = 0.0
+        self.template_statements = 0
+        self.signatures = Counter()
+        self.rendering = 0  # Depth of nested render_template calls
+        self.render_started = 0.0
+        self.profiler = None
+
+    def repeated(self, threshold):
+        """[(count, signature)] for statements run ``threshold`` or more times"""
+        return [(count, signature) for signature, count in self.signatures.most_common() if count >= threshold]
+
+    def server_timing(self):
+        app_time = max(0.0, self.wall - self.db_time - self.template_time + self.template_db_time)
+        return ', '.join([
+            f'total;dur={self.wall * 1000:.1f}',
+            f'db;dur={(self.db_time - self.template_db_time) * 1000:.1f};desc="{self.statements - self.template_statements} queries"',
+            f'lazy;dur={self.template_db_time * 1000:.1f};desc="{self.template_statements} queries in templates"',
+            f'tpl;dur={(self.template_time - self.template_db_time) * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+        ])
+
+
+class PerfStore:
+    """Rolling window of the last ``window`` request profiles per endpoint"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._repeats = defaultdict(dict)  # endpoint -> signature -> [requests, most runs in one]
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, profile, repeated):
+        sample = (profile.wall, profile.db_time, profile.statements, profile.rows,
+                  profile.template_time - profile.template_db_time, profile.template_statements)
+        with self._lock:
+            self._samples[endpoint].append(sample)
+            seen = self._repeats[endpoint]
+            for count, signature in repeated:
+                entry = seen.setdefault(signature, [0, 0])
+                entry[0] += 1
+                entry[1] = max(entry[1], count)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._repeats.clear()
+
+    def summary(self):
+        """One dict per endpoint, slowest p95 first; times are in milliseconds"""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+            repeats = {endpoint: dict(seen) for endpoint, seen in self._repeats.items()}
+
+        rows = []
+        for endpoint, samples in snapshot.items():
+            count = len(samples)
+            walls = sorted(sample[0] * 1000 for sample in samples)
+            totals = [sum(column) for column in zip(*samples)]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': count,
+                'p50_ms': round(percentile(walls, 0.50), 1),
+                'p95_ms': round(percentile(walls, 0.95), 1),
+                'p99_ms': round(percentile(walls, 0.99), 1),
+                'db_ms': round(totals[1] * 1000 / count, 1),
+                'statements': round(totals[2] / count, 1),
+                'rows': round(totals[3] / count, 1),
+                'template_ms': round(totals[4] * 1000 / count, 1),
+                'lazy_statements': round(totals[5] / count, 1),
+                'repeated': sorted(({'signature': signature, 'requests': seen, 'max_runs': most}
+                                    for signature, (seen, most) in repeats.get(endpoint, {}).items()),
+                                   key=lambda r: (-r['requests'], -r['max_runs']))[:5],
+            })
+        return sorted(rows, key=lambda r: r['p95_ms'], reverse=True)
+
+
+# SQL timing: every statement of the current request, and the ones issued
+# while a template renders
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = conn.info.get('profiling_started')
+    if profile is None or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    profile.db_time += elapsed
+    profile.statements += 1
+    profile.signatures[_signature(statement)] += 1
+    if profile.rendering:
+        profile.template_db_time += elapsed
+        profile.template_statements += 1
+    if cursor.rowcount > 0 and not cursor.description:
+        profile.rows += cursor.rowcount  # Rows written; reads are counted as they are fetched
+
+
+def _count_fetched_rows(dbapi_connection, connection_record):
+    """Count rows as sqlite3 builds them; the row itself is passed through"""
+    def row_factory(cursor, row):
+        profile = _current.get()
+        if profile is not None:
+            profile.rows += 1
+        return row
+    dbapi_connection.row_factory = row_factory
+
+
+def _template_started(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None:
+        if not profile.rendering:
+            profile.render_started = time.perf_counter()
+        profile.rendering += 1
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None and profile.rendering:
+        profile.rendering -= 1
+        if not profile.rendering:
+            profile.template_time += time.perf_counter() - profile.render_started
+
+
+def _write_profile(profiler, directory, endpoint):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(directory, f'{endpoint}-{stamp}.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+def init_profiling(app):
+    """Install the profiling hooks and the ``/admin/_perf`` page on ``app``"""
+    app.config.setdefault('PROFILING_WINDOW', 500)
+    app.config.setdefault('PROFILING_REPEAT_THRESHOLD', 3)
+    app.config.setdefault('PROFILING_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILING_DIR', os.path.join('data', 'profiles'))
+
+    store = PerfStore(app.config['PROFILING_WINDOW'])
+    app.extensions['profiling'] = store
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _count_fetched_rows)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def _start_profile():
+        if request.endpoint is None or request.endpoint in _SKIPPED:
+            return  # Unrouted URLs and the perf page itself
+        profile = RequestProfile()
+        sampled = request.args.get('_profile') == '1' or random.random() < app.config['PROFILING_SAMPLE_RATE']
+        if sampled and _profiler_lock.acquire(blocking=False):
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+        _current.set(profile)
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = _current.get()
+        if profile is None:
+            return response
+        profile.wall = time.perf_counter() - profile.started
+        if profile.profiler is not None:
+            profile.profiler.disable()
+            try:
+                path = _write_profile(profile.profiler, app.config['PROFILING_DIR'], request.endpoint)
+                response.headers['X-Profile-Path'] = path
+            finally:
+                profile.profiler = None
+                _profiler_lock.release()
+
+        repeated = profile.repeated(app.config['PROFILING_REPEAT_THRESHOLD'])
+        if repeated:
+            count, signature = repeated[0]
+            app.logger.warning('%s ran the same statement %d times (possible N+1): %s',
+                               request.endpoint, count, signature[:200])
+        store.record(request.endpoint, profile, repeated)
+        response.headers['Server-Timing'] = profile.server_timing()
+        return response
+
+    @app.teardown_request
+    def _end_profile(exc):
+        profile = _current.get()
+        if profile is not None and profile.profiler is not None:
+            # The request failed before after_request could stop the profiler
+            profile.profiler.disable()
+            profile.profiler = None
+            _profiler_lock.release()
+        _current.set(None)
+
+    def admin_perf():
+        """Rolling request timings per endpoint"""
+        endpoints = store.summary()
+        if request.args.get('format') == 'json':
+            return jsonify({'window': store.window, 'endpoints': endpoints})
+        directory = app.config['PROFILING_DIR']
+        dumps = sorted(os.listdir(directory), reverse=True)[:20] if os.path.isdir(directory) else []
+        return render_template('admin/perf.html', endpoints=endpoints, window=store.window,
+                               threshold=app.config['PROFILING_REPEAT_THRESHOLD'],
+                               sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+                               profile_dir=directory, dumps=dumps)
+
+    def admin_perf_reset():
+        """Clear the rolling timings"""
+        store.reset()
+        flash('Performance samples cleared', 'success')
+        return redirect(url_for('admin_perf'))
+
+    app.add_url_rule('/admin/_perf', 'admin_perf', admin_perf)
+    app.add_url_rule('/admin/_perf/reset', 'admin_perf_reset', admin_perf_reset, methods=['POST'])
+    return store
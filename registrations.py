@@ -0,0 +1,239 @@
+"""Registration processing: claims, accept, reject and mark-paid.
+
+Every state change is a compare-and-set ``UPDATE ... WHERE id = ? AND
+version = ?`` that also bumps ``version``, so two admins acting on the same
+request at once cannot both succeed and no table lock is needed. The loser
+gets a ``RegistrationConflict`` (or a failed result row) explaining what
+happened. Claims lapse after ``CLAIM_TTL`` and can then be taken over.
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import or_, tuple_, update
+
+from enrollment import reserve_seats, release_seats
+from models import db, User, StudentProfile, Batch, RegistrationRequest, CLAIM_TTL
+
+# Largest number of registrations accepted in one call
+MAX_BULK_ACCEPT = 1000
+
+# Name recorded on claims until admin accounts exist
+ADMIN_NAME = 'Admin User'
+
+
+class RegistrationConflict(ValueError):
+    """A claim/accept/reject/mark-paid lost a race; the message is shown to admins"""
+
+
+def _claim_free(admin, now):
+    """Rows ``admin`` may act on: unclaimed, claimed by them, or claim expired"""
+    return or_(
+        RegistrationRequest.claimed_by.is_(None),
+        RegistrationRequest.claimed_by == admin,
+        RegistrationRequest.claimed_at.is_(None),
+        RegistrationRequest.claimed_at <= now - CLAIM_TTL,
+    )
+
+
+def _conflict_message(status, claimed_by, claimed_at, admin, now):
+    if status != 'pending':
+        return f'Registration has already been {status}'
+    if claimed_by and claimed_by != admin and claimed_at and claimed_at > now - CLAIM_TTL:
+        expires = claimed_at + CLAIM_TTL
+        return f"Registration is claimed by {claimed_by} until {expires.strftime('%H:%M')} UTC"
+    return 'Registration was changed by another admin; reload and try again'
+
+
+def _compare_and_set(reg_id, version, values, *conditions):
+    """Apply ``values`` to one registration if it is unchanged; raise otherwise"""
+    criteria = [RegistrationRequest.id == reg_id, *conditions]
+    if version is not None:
+        criteria.append(RegistrationRequest.version == version)
+
+    result = db.session.execute(
+        update(RegistrationRequest)
+        .where(*criteria)
+        .values(version=RegistrationRequest.version + 1, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        db.session.commit()
+        return
+
+    db.session.rollback()
+    row = db.session.query(RegistrationRequest.status, RegistrationRequest.claimed_by,
+                           RegistrationRequest.claimed_at).filter(RegistrationRequest.id == reg_id).first()
+    if row is None:
+        raise RegistrationConflict('Registration not found')
+    admin = values.get('claimed_by', ADMIN_NAME)
+    raise RegistrationConflict(_conflict_message(*row, admin, datetime.utcnow()))
+
+
+def claim_request(reg_id, admin=ADMIN_NAME):
+    """Claim a pending registration for review, taking over a lapsed claim"""
+    now = datetime.utcnow()
+    _compare_and_set(reg_id, None, {'claimed_by': admin, 'claimed_at': now},
+                     RegistrationRequest.status == 'pending', _claim_free(admin, now))
+
+
+def reject_request(reg_id, reason, version=None, admin=ADMIN_NAME):
+    """Reject a pending registration; ``version`` is the one the admin saw"""
+    now = datetime.utcnow()
+    _compare_and_set(reg_id, version,
+                     {'status': 'rejected', 'admin_note': f'Rejected: {reason}', 'processed_at': now},
+                     RegistrationRequest.status == 'pending', _claim_free(admin, now))
+
+
+def mark_request_paid(reg_id, version=None):
+    """Record a received payment unless the registration changed meanwhile"""
+    _compare_and_set(reg_id, version, {'payment_status': 'paid'})
+
+
+def accept_registrations(registration_ids, temp_password='temp123', versions=None, admin=ADMIN_NAME):
+    """Accept pending registrations in a single transaction.
+
+    Each selected batch's seats are taken with one conditional update, the
+    registrations are switched to accepted with one compare-and-set update,
+    and only the rows that update won get a user and student profile.
+    ``versions`` optionally maps ids to the version the admin was looking
+    at. The result is a list with one ``{'id', 'success', 'message',
+    'user_id'}`` entry per requested id. Raises ``ValueError`` for ids that
+    are not integers or more than ``MAX_BULK_ACCEPT`` of them.
+    """
+    try:
+        ids = list(dict.fromkeys(int(reg_id) for reg_id in registration_ids))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid registration ids')
+    if len(ids) > MAX_BULK_ACCEPT:
+        raise ValueError(f'At most {MAX_BULK_ACCEPT} registrations can be accepted at once, got {len(ids)}')
+    results = {reg_id: {'id': reg_id, 'success': False, 'message': 'Registration not found', 'user_id': None}
+               for reg_id in ids}
+    if not ids:
+        return []
+
+    registrations = RegistrationRequest.query.filter(RegistrationRequest.id.in_(ids)).all()
+
+    # Existing emails, student ids and batch capacity, each loaded with one query
+    emails = {r.email for r in registrations}
+    taken_emails = {row.email for row in db.session.query(User.email).filter(User.email.in_(emails))}
+    id_numbers = {r.student_id_number for r in registrations if r.student_id_number}
+    taken_id_numbers = {row.student_id_number for row in db.session.query(StudentProfile.student_id_number)
+                        .filter(StudentProfile.student_id_number.in_(id_numbers))} if id_numbers else set()
+    batch_ids = {r.selected_batch_id for r in registrations if r.selected_batch_id}
+    free_seats = {batch.id: (batch.capacity or 0) - (batch.current_enrollment or 0)
+                  for batch in Batch.query.filter(Batch.id.in_(batch_ids))} if batch_ids else {}
+
+    now = datetime.utcnow()
+    position = {reg_id: i for i, reg_id in enumerate(ids)}
+    accepted = []
+    for registration in sorted(registrations, key=lambda r: position[r.id]):
+        result = results[registration.id]
+        if registration.status != 'pending':
+            result['message'] = 'Registration has already been processed'
+        elif versions and versions.get(registration.id, registration.version) != registration.version:
+            result['message'] = 'Registration was changed by another admin; reload and try again'
+        elif registration.is_claimed and registration.claimed_by != admin:
+            result['message'] = _conflict_message(registration.status, registration.claimed_by,
+                                                  registration.claimed_at, admin, now)
+        elif registration.email in taken_emails:
+            result['message'] = f'A user with email {registration.email} already exists'
+        elif registration.student_id_number and registration.student_id_number in taken_id_numbers:
+            result['message'] = f'Student ID {registration.student_id_number} is already in use'
+        elif registration.selected_batch_id and free_seats.get(registration.selected_batch_id, 0) <= 0:
+            result['message'] = 'Selected batch is full or invalid'
+        else:
+            taken_emails.add(registration.email)
+            if registration.student_id_number:
+                taken_id_numbers.add(registration.student_id_number)
+            if registration.selected_batch_id:
+                free_seats[registration.selected_batch_id] -= 1
+            accepted.append(registration)
+
+    if not accepted:
+        return [results[reg_id] for reg_id in ids]
+    accepted_ids = [registration.id for registration in accepted]
+
+    try:
+        # One conditional seat UPDATE per batch; a batch that filled up since
+        # the check above turns its whole group away
+        for batch_id, added in Counter(r.selected_batch_id for r in accepted if r.selected_batch_id).items():
+            if not reserve_seats(batch_id, added):
+                for registration in accepted:
+                    if registration.selected_batch_id == batch_id:
+                        results[registration.id]['message'] = 'Selected batch is full or invalid'
+                accepted = [r for r in accepted if r.selected_batch_id != batch_id]
+        if not accepted:
+            db.session.rollback()
+            return [results[reg_id] for reg_id in ids]
+
+        # Compare-and-set on (id, version): rows another admin changed since
+        # they were loaded are not returned and give their seats back
+        won = {row.id for row in db.session.execute(
+            update(RegistrationRequest)
+            .where(tuple_(RegistrationRequest.id, RegistrationRequest.version).in_([(r.id, r.version) for r in accepted]),
+                   RegistrationRequest.status == 'pending',
+                   _claim_free(admin, now))
+            .values(status='accepted', processed_at=now, version=RegistrationRequest.version + 1,
+                    admin_note=f"Accepted by admin on {now.strftime('%Y-%m-%d %H:%M')}"
+                               + (' (bulk)' if len(ids) > 1 else ''))
+            .returning(RegistrationRequest.id)
+            .execution_options(synchronize_session=False)
+        )}
+        lost = [r for r in accepted if r.id not in won]
+        if lost:
+            current = {row.id: row for row in db.session.query(
+                RegistrationRequest.id, RegistrationRequest.status,
+                RegistrationRequest.claimed_by, RegistrationRequest.claimed_at
+            ).filter(RegistrationRequest.id.in_([r.id for r in lost]))}
+            for registration in lost:
+                row = current[registration.id]
+                results[registration.id]['message'] = _conflict_message(row.status, row.claimed_by,
+                                                                        row.claimed_at, admin, now)
+            for batch_id, released in Counter(r.selected_batch_id for r in lost if r.selected_batch_id).items():
+                release_seats(batch_id, released)
+            accepted = [r for r in accepted if r.id in won]
+        accepted_ids = [registration.id for registration in accepted]
+        if not accepted:
+            db.session.commit()
+            return [results[reg_id] for reg_id in ids]
+
+        users = [
+            User(
+                name=registration.name,
+                email=registration.email,
+                role='student',
+                status='active',
+                temp_password=temp_password,
+                created_at=now
+            )
+            for registration in accepted
+        ]
+        db.session.add_all(users)
+        db.session.flush()  # One batched INSERT ... RETURNING for all user ids
+        user_ids = [user.id for user in users]
+
+        db.session.add_all([
+            StudentProfile(
+                user_id=user_id,
+                dob=registration.dob,
+                grade=registration.grade,
+                contact_number=registration.mobile,
+                address=registration.address,
+                class_type=registration.class_type,
+                batch_id=registration.selected_batch_id,
+                student_id_number=registration.student_id_number
+            )
+            for user_id, registration in zip(user_ids, accepted)
+        ])
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for reg_id in accepted_ids:
+            results[reg_id]['message'] = f'Accept failed: {e}'
+        return [results[reg_id] for reg_id in ids]
+
+    for user_id, reg_id in zip(user_ids, accepted_ids):
+        results[reg_id].update(success=True, message='Accepted', user_id=user_id)
+
+    return [results[reg_id] for reg_id in ids]
@@ -0,0 +1,236 @@
+"""Class session scheduling: double-booking checks, conflict reports and
+recurring session generation."""
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import or_
+
+from models import db, ClassSession, SessionRecurrence, Holiday
+
+# Sessions in these states do not occupy a room or a teacher
+INACTIVE_STATUSES = ('cancelled',)
+
+# How far ahead a new recurrence rule is materialized
+RECURRENCE_HORIZON_DAYS = 56
+
+FREQUENCY_STEP_DAYS = {'weekly': 7, 'biweekly': 14}
+
+
+def _overlapping(query, session_date, start_time, end_time, exclude_id=None):
+    """Restrict ``query`` to active sessions overlapping the given slot.
+
+    With the (resource, date, start_time) indexes this is an index range
+    scan over one resource's sessions on one day.
+    """
+    query = query.filter(
+        ClassSession.date == session_date,
+        ClassSession.start_time < end_time,
+        ClassSession.end_time > start_time,
+        or_(ClassSession.status.is_(None), ClassSession.status.notin_(INACTIVE_STATUSES))
+    )
+    if exclude_id is not None:
+        query = query.filter(ClassSession.id != exclude_id)
+    return query
+
+
+def find_conflicts(session_date, start_time, end_time, classroom_id=None, teacher_user_id=None, exclude_id=None):
+    """Return {'classroom': [...], 'teacher': [...]} sessions clashing with a slot"""
+    conflicts = {'classroom': [], 'teacher': []}
+    if classroom_id:
+        conflicts['classroom'] = _overlapping(
+            ClassSession.query.filter(ClassSession.classroom_id == classroom_id),
+            session_date, start_time, end_time, exclude_id
+        ).order_by(ClassSession.start_time).all()
+    if teacher_user_id:
+        conflicts['teacher'] = _overlapping(
+            ClassSession.query.filter(ClassSession.teacher_user_id == teacher_user_id),
+            session_date, start_time, end_time, exclude_id
+        ).order_by(ClassSession.start_time).all()
+    return conflicts
+
+
+def _sweep(rows):
+    """Pairs of overlapping rows; ``rows`` are sorted by (resource, date, start)"""
+    pairs = []
+    open_rows = []
+    current = None
+    for row in rows:
+        key = (row.resource_id, row.date)
+        if key != current:
+            current = key
+            open_rows = []
+        # Drop sessions that ended before this one starts
+        open_rows = [other for other in open_rows if other.end_time > row.start_time]
+        pairs.extend((other, row) for other in open_rows)
+        open_rows.append(row)
+    return pairs
+
+
+def conflict_report(date_from, date_to):
+    """All room and teacher double-bookings between two dates (inclusive)"""
+    report = {}
+    for kind, column in (('classroom', ClassSession.classroom_id), ('teacher', ClassSession.teacher_user_id)):
+        rows = db.session.query(
+            ClassSession.id,
+            column.label('resource_id'),
+            ClassSession.date,
+            ClassSession.start_time,
+            ClassSession.end_time
+        ).filter(
+            column.isnot(None),
+            ClassSession.date >= date_from,
+            ClassSession.date <= date_to,
+            or_(ClassSession.status.is_(None), ClassSession.status.notin_(INACTIVE_STATUSES))
+        ).order_by(column, ClassSession.date, ClassSession.start_time).all()
+
+        report[kind] = [
+            {
+                f'{kind}_id': first.resource_id,
+                'date': first.date.isoformat(),
+                'session_ids': [first.id, second.id],
+                'overlap': [max(first.start_time, second.start_time).strftime('%H:%M'),
+                            min(first.end_time, second.end_time).strftime('%H:%M')],
+            }
+            for first, second in _sweep(rows)
+        ]
+    return report
+
+
+def describe_conflicts(conflicts):
+    """Human readable summary for flash messages"""
+    messages = []
+    for session in conflicts['classroom']:
+        messages.append(f"{session.classroom.name if session.classroom else 'Classroom'} is booked "
+                        f"{session.start_time.strftime('%H:%M')}-{session.end_time.strftime('%H:%M')}")
+    for session in conflicts['teacher']:
+        messages.append(f"{session.teacher.name if session.teacher else 'Teacher'} is teaching "
+                        f"{session.start_time.strftime('%H:%M')}-{session.end_time.strftime('%H:%M')}")
+    return '; '.join(messages)
+
+
+def occurrence_dates(rule, window_start, window_end):
+    """Dates a recurrence rule falls on between two dates (inclusive)"""
+    step = FREQUENCY_STEP_DAYS[rule.frequency]
+    first = rule.start_date + timedelta(days=(rule.weekday - rule.start_date.weekday()) % 7)
+    end = min(window_end, rule.end_date) if rule.end_date else window_end
+
+    current = first
+    if window_start > first:
+        # Jump straight to the first occurrence on or after window_start
+        current = first + timedelta(days=-(-(window_start - first).days // step) * step)
+    while current <= end:
+        yield current
+        current += timedelta(days=step)
+
+
+def _clashes(busy, key, start_time, end_time):
+    return any(start < end_time and end > start_time for start, end in busy.get(key, ()))
+
+
+def extend_recurrences(until, recurrence_ids=None):
+    """Materialize ClassSession rows for active rules up to ``until``.
+
+    Only dates after each rule's ``generated_until`` are considered, so
+    existing sessions are never re-created. Holidays are skipped and slots
+    that would double-book a classroom or teacher are reported instead of
+    inserted. All checks run against one prefetched set of busy slots and
+    the new sessions are written with a single executemany INSERT.
+    """
+    report = {'created': 0, 'holidays': 0, 'conflicts': []}
+
+    query = SessionRecurrence.query.filter(
+        SessionRecurrence.is_active == True,
+        SessionRecurrence.start_date <= until,
+        or_(SessionRecurrence.generated_until.is_(None), SessionRecurrence.generated_until < until),
+        or_(SessionRecurrence.end_date.is_(None), SessionRecurrence.generated_until.is_(None),
+            SessionRecurrence.generated_until < SessionRecurrence.end_date)
+    )
+    if recurrence_ids is not None:
+        query = query.filter(SessionRecurrence.id.in_(recurrence_ids))
+    rules = query.all()
+    if not rules:
+        return report
+
+    def next_date(rule):
+        if rule.generated_until:
+            return max(rule.start_date, rule.generated_until + timedelta(days=1))
+        return rule.start_date
+
+    window_start = min(next_date(rule) for rule in rules)
+    holidays = {day for (day,) in db.session.query(Holiday.date)
+                .filter(Holiday.date >= window_start, Holiday.date <= until)}
+
+    # Slots already taken in the window, per (resource, id, date)
+    classroom_ids = {rule.classroom_id for rule in rules if rule.classroom_id}
+    teacher_ids = {rule.teacher_user_id for rule in rules if rule.teacher_user_id}
+    rule_ids = [rule.id for rule in rules]
+    busy = defaultdict(list)
+    existing = set()
+    resource_filters = [ClassSession.recurrence_id.in_(rule_ids)]
+    if classroom_ids:
+        resource_filters.append(ClassSession.classroom_id.in_(classroom_ids))
+    if teacher_ids:
+        resource_filters.append(ClassSession.teacher_user_id.in_(teacher_ids))
+    for row in db.session.query(
+        ClassSession.classroom_id, ClassSession.teacher_user_id, ClassSession.recurrence_id,
+        ClassSession.date, ClassSession.start_time, ClassSession.end_time, ClassSession.status
+    ).filter(
+        ClassSession.date >= window_start,
+        ClassSession.date <= until,
+        or_(*resource_filters)
+    ):
+        if row.recurrence_id:
+            existing.add((row.recurrence_id, row.date))
+        if row.status in INACTIVE_STATUSES:
+            continue
+        if row.classroom_id:
+            busy[('classroom', row.classroom_id, row.date)].append((row.start_time, row.end_time))
+        if row.teacher_user_id:
+            busy[('teacher', row.teacher_user_id, row.date)].append((row.start_time, row.end_time))
+
+    rows = []
+    for rule in rules:
+        for day in occurrence_dates(rule, next_date(rule), until):
+            if (rule.id, day) in existing:
+                continue
+            if day in holidays:
+                report['holidays'] += 1
+                continue
+
+            keys = []
+            if rule.classroom_id:
+                keys.append(('classroom', rule.classroom_id, day))
+            if rule.teacher_user_id:
+                keys.append(('teacher', rule.teacher_user_id, day))
+            clashing = [key[0] for key in keys if _clashes(busy, key, rule.start_time, rule.end_time)]
+            if clashing:
+                report['conflicts'].append({
+                    'recurrence_id': rule.id,
+                    'batch_id': rule.batch_id,
+                    'date': day.isoformat(),
+                    'reason': f"{' and '.join(clashing)} already booked",
+                })
+                continue
+
+            for key in keys:
+                busy[key].append((rule.start_time, rule.end_time))
+            rows.append({
+                'batch_id': rule.batch_id,
+                'teacher_user_id': rule.teacher_user_id,
+                'classroom_id': rule.classroom_id,
+                'date': day,
+                'start_time': rule.start_time,
+                'end_time': rule.end_time,
+                'topic': rule.topic,
+                'status': 'scheduled',
+                'recurrence_id': rule.id,
+            })
+
+        rule.generated_until = min(until, rule.end_date) if rule.end_date else until
+
+    if rows:
+        db.session.execute(ClassSession.__table__.insert(), rows)
+    db.session.commit()
+
+    report['created'] = len(rows)
+    return report
@@ -0,0 +1,140 @@
+"""Full-text search over users, registrations, batches and classrooms.
+
+On SQLite each searchable table gets an FTS5 index (``<table>_fts``) that is
+kept in sync by triggers, so every write path - forms, imports, raw SQL -
+updates it without extra code. Search terms are matched as word prefixes and
+results are ranked with bm25, best match first; the rank is the leading
+keyset sort key, so every page of a search is in relevance order. Other
+databases, and SQLite builds without FTS5 (where no index is created), fall
+back to case-insensitive ``LIKE '%x%'`` filters in the list's usual order.
+"""
+import re
+
+from sqlalchemy import event, or_
+from sqlalchemy.orm import with_expression
+
+from models import db, User, RegistrationRequest, Batch, Classroom
+
+# Searchable columns per model
+SEARCH_FIELDS = {
+    User: ('name', 'email'),
+    RegistrationRequest: ('name', 'email'),
+    Batch: ('name', 'subject'),
+    Classroom: ('name', 'location'),
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Cache of whether the FTS tables exist, per database URL
+_fts_ready = {}
+
+
+def _fts_table(model):
+    return f'{model.__tablename__}_fts'
+
+
+def _index_ddl(model):
+    """CREATE statements for one model's FTS table and sync triggers"""
+    table = model.__tablename__
+    fts = _fts_table(model)
+    fields = SEARCH_FIELDS[model]
+    cols = ', '.join(fields)
+    new_vals = ', '.join(f'new.{f}' for f in fields)
+    old_vals = ', '.join(f'old.{f}' for f in fields)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def _has_fts5(connection):
+    """Whether the SQLite library was built with the FTS5 module"""
+    options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def ensure_search_index(connection):
+    """Create any missing FTS tables and triggers, backfilling new ones"""
+    if connection.dialect.name != 'sqlite' or not _has_fts5(connection):
+        return
+
+    for model in SEARCH_FIELDS:
+        fts = _fts_table(model)
+        exists = connection.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': fts}
+        ).first()
+        for statement in _index_ddl(model):
+            connection.execute(db.text(statement))
+        if not exists:
+            # Index rows that were written before the FTS table existed
+            connection.execute(db.text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+    _fts_ready.pop(str(connection.engine.url), None)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    # db.create_all() builds the search index along with the tables
+    ensure_search_index(connection)
+
+
+def fts_available():
+    """Whether the current database has the FTS tables"""
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _fts_ready:
+        ready = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                found = conn.execute(
+                    db.text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN :names")
+                    .bindparams(db.bindparam('names', expanding=True)),
+                    {'names': [_fts_table(model) for model in SEARCH_FIELDS]}
+                ).scalar()
+                ready = found == len(SEARCH_FIELDS)
+        _fts_ready[key] = ready
+    return _fts_ready[key]
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    tokens = _TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _like_filter(model, text):
+    # lower() keeps PostgreSQL's case-sensitive LIKE in line with SQLite's
+    columns = [getattr(model, field) for field in SEARCH_FIELDS[model]]
+    return or_(*[db.func.lower(column).contains(text.lower()) for column in columns])
+
+
+def apply_search(query, model, text, sort_keys):
+    """Restrict ``query`` to ``model`` rows matching ``text``, best match first.
+
+    Returns the query and the ``paginate_keyset`` sort keys to page it by:
+    the bm25 rank (lower is better) ahead of ``sort_keys`` when the FTS index
+    is there, otherwise ``sort_keys`` unchanged with a LIKE filter.
+    """
+    expression = match_expression(text)
+    if not expression or not fts_available():
+        return query.filter(_like_filter(model, text)), sort_keys
+
+    fts = _fts_table(model)
+    ranked = db.text(
+        f"SELECT rowid, bm25({fts}) AS search_rank FROM {fts} WHERE {fts} MATCH :q"
+    ).bindparams(q=expression).columns(db.column('rowid', db.Integer), db.column('search_rank', db.Float)).subquery()
+    # The rank is loaded onto each row as model.search_rank, where the cursor
+    # reads it back; populate_existing also sets it on rows already in the session
+    query = query.join(ranked, ranked.c.rowid == model.id) \
+        .options(with_expression(model.search_rank, ranked.c.search_rank)) \
+        .execution_options(populate_existing=True)
+    return query, [(ranked.c.search_rank, False), *sort_keys]
+
@@ -1,7 +1,12 @@
 from app import app
-from models import db, User, StudentProfile, TeacherProfile, Batch, RegistrationRequest, Classroom, ClassSession
-from datetime import datetime, date
+from models import (db, User, StudentProfile, TeacherProfile, Batch, RegistrationRequest, Classroom, ClassSession,
+                    SessionRecurrence, Holiday)
+from datetime import datetime, date, time, timedelta
+from itertools import islice
+import argparse
+import bisect
 import os
+import random
 
 def create_sample_data():
     """Create sample data for testing the admin dashboard"""
@@ -217,5 +222,357 @@ def create_sample_data():
         print(f"- Pending: {len([r for r in requests if r.payment_status == 'pending'])}")
         print("=" * 50)
 
+
+# Synthetic data for load and regression testing. Every value comes from one
+# random.Random(seed) and dates are relative to an anchor Monday, so the same
+# arguments always produce the same database.
+
+FIRST_NAMES = ['Ashan', 'Kavindi', 'Nipun', 'Sachini', 'Ruwan', 'Malsha', 'Tharindu', 'Dilini', 'Kasun', 'Nethmi',
+               'Chamod', 'Ishara', 'Pasindu', 'Hiruni', 'Supun', 'Sanduni', 'Lahiru', 'Oshadi', 'Dinuka', 'Nadeesha',
+               'Arjun', 'Priya', 'Karthik', 'Lakshmi', 'Mohamed', 'Fathima', 'Ravindu', 'Yasara', 'Janith', 'Thisari']
+LAST_NAMES = ['Perera', 'Fernando', 'Silva', 'Jayasinghe', 'Bandara', 'Wijesinghe', 'Dissanayake', 'Rathnayake',
+              'Gunawardena', 'Herath', 'Senanayake', 'Karunaratne', 'Jayawardena', 'Kumara', 'Rajapaksha',
+              'Wickramasinghe', 'Pathirana', 'Ekanayake', 'Sivakumar', 'Nadarajah', 'Rizvi', 'Liyanage']
+CITIES = ['Colombo', 'Kandy', 'Galle', 'Kurunegala', 'Negombo', 'Matara', 'Jaffna', 'Anuradhapura', 'Ratnapura',
+          'Badulla', 'Gampaha', 'Kalutara', 'Batticaloa', 'Trincomalee']
+
+# Relative weights; A/L subjects are only taught to A/L batches
+SUBJECT_WEIGHTS = {'Mathematics': 10, 'Science': 8, 'English': 9, 'Sinhala': 4, 'Tamil': 2, 'History': 3,
+                   'Physics': 8, 'Chemistry': 7, 'Combined Mathematics': 8, 'Biology': 6, 'ICT': 5,
+                   'Accounting': 4, 'Economics': 3}
+AL_SUBJECTS = {'Physics', 'Chemistry', 'Combined Mathematics', 'Biology', 'ICT', 'Accounting', 'Economics'}
+GRADE_WEIGHTS = {'Grade 6': 4, 'Grade 7': 4, 'Grade 8': 5, 'Grade 9': 6, 'Grade 10': 8, 'O/L': 12}
+CLASS_TYPE_WEIGHTS = {'physical': 6, 'online': 3, 'both': 2}
+ROOM_CAPACITIES = [20, 25, 30, 35, 40, 60, 100]
+
+# Teaching slots: every day of the week, classes starting 07:00 to 19:00
+SLOT_DAYS = range(7)
+SLOT_HOURS = range(7, 20)
+
+# Target share of room slots in use, which sets how many classrooms are made
+ROOM_UTILISATION = 0.7
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _person(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _mobile(rng):
+    return f'07{rng.choice("01245678")}{rng.randrange(10 ** 7):07d}'
+
+
+def _moment(rng, start, end):
+    """Random datetime between two dates"""
+    seconds = int((end - start).total_seconds())
+    return datetime.combine(start, time.min) + timedelta(seconds=rng.randrange(max(seconds, 1)))
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bulk_insert(table, rows, chunk_size):
+    """executemany INSERT of ``rows`` (an iterable of dicts), one transaction per chunk"""
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        with db.engine.begin() as conn:
+            conn.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def _advance_sequences(tables):
+    """Move PostgreSQL id sequences past explicitly inserted ids"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for table in tables:
+            # is_called=false: the next nextval() returns MAX(id) + 1, and 1 for an empty table
+            conn.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"
+            ))
+
+
+def generate_dataset(students=10000, teachers=None, weeks=12, seed=0, anchor=None, chunk_size=5000, echo=print):
+    """Fill an empty database with a realistic, deterministic synthetic dataset.
+
+    Every model gets rows: teachers with subjects, batches sized to hold about
+    85% of the students, classrooms enough for the weekly timetable, weekly
+    recurrence rules without room or teacher clashes, ``weeks`` weeks of
+    class sessions (three quarters in the past), registrations and holidays.
+    Rows are written with Core executemany INSERTs and explicit ids, and on
+    PostgreSQL the id sequences are then moved past them. Returns
+    {table name: rows inserted}.
+    """
+    rng = random.Random(seed)
+    teachers = teachers or max(1, students // 100)
+    anchor = anchor or date.today()
+    anchor -= timedelta(days=anchor.weekday())
+    window_start = anchor - timedelta(weeks=weeks * 3 // 4)
+    window_end = window_start + timedelta(weeks=weeks, days=-1)
+    stamp = datetime.combine(anchor, time(6))
+    counts = {}
+
+    db.create_all()
+    if db.session.query(User.id).first() is not None:
+        raise SystemExit('The database already has data; point DATABASE_URL at a new file')
+
+    # Teachers: user ids 2.., with one to three subjects and an uneven workload
+    teacher_rows = []
+    for i in range(teachers):
+        subjects = rng.sample(list(SUBJECT_WEIGHTS), rng.choice([1, 1, 2, 2, 3]))
+        teacher_rows.append({'user_id': i + 2, 'subjects': subjects, 'load': rng.choice([1, 1, 2, 2, 3, 5])})
+
+    # Batches: enough seats for ~85% of students at 80% fill, at least two per teacher
+    average_capacity = 32
+    batch_count = max(teachers * 2, -(-int(students * 0.85) // int(average_capacity * 0.8)))
+    teacher_weights = [row['load'] for row in teacher_rows]
+    batches = []
+    for batch_id in range(1, batch_count + 1):
+        teacher_index = rng.choices(range(teachers), weights=teacher_weights)[0]
+        teacher = teacher_rows[teacher_index]
+        subject = rng.choice(teacher['subjects'])
+        grade = 'A/L' if subject in AL_SUBJECTS else _pick(rng, GRADE_WEIGHTS)
+        ended = rng.random() < 0.1
+        start = window_start - timedelta(days=rng.randrange(0, 180))
+        end = (window_start + timedelta(days=rng.randrange(7, max(8, (anchor - window_start).days))) if ended
+               else window_end + timedelta(days=rng.randrange(30, 365)))
+        batches.append({
+            'id': batch_id,
+            'name': f'{grade} {subject} {start.year} - Group {batch_id}',
+            'grade': grade,
+            'subject': subject,
+            'capacity': rng.choice([20, 25, 30, 35, 40, 50]),
+            'current_enrollment': 0,
+            'teacher_id': teacher_index + 1,
+            'teacher_name': None,
+            'class_type': _pick(rng, CLASS_TYPE_WEIGHTS),
+            'start_date': start,
+            'end_date': end,
+            'is_active': not ended,
+            'notes': None,
+            'created_at': _moment(rng, start - timedelta(days=30), start),
+            'updated_at': stamp,
+        })
+
+    # Students pick batches by popularity; a full batch means a retry, then none
+    popularity = [rng.lognormvariate(0, 0.8) if batch['is_active'] else 0.05 for batch in batches]
+    cumulative = []
+    total = 0
+    for weight in popularity:
+        total += weight
+        cumulative.append(total)
+    assignment = []
+    for _ in range(students):
+        batch_id = None
+        if rng.random() < 0.85:
+            for _attempt in range(3):
+                batch = batches[min(bisect.bisect(cumulative, rng.random() * total), batch_count - 1)]
+                if batch['current_enrollment'] < batch['capacity']:
+                    batch['current_enrollment'] += 1
+                    batch_id = batch['id']
+                    break
+        assignment.append(batch_id)
+
+    # Weekly slots per batch, placed without room or teacher clashes
+    teacher_busy = set()
+    room_slots = []
+    recurrences = []
+    for batch in batches:
+        teacher_user_id = teacher_rows[batch['teacher_id'] - 1]['user_id']
+        duration = 2 if batch['grade'] == 'A/L' else 1
+        for _ in range(rng.choice([1, 2, 2, 3])):
+            for _attempt in range(20):
+                day = rng.choice(SLOT_DAYS)
+                hour = rng.choice(SLOT_HOURS[:len(SLOT_HOURS) - duration + 1])
+                cells = [(teacher_user_id, day, hour + h) for h in range(duration)]
+                if not teacher_busy.intersection(cells):
+                    teacher_busy.update(cells)
+                    break
+            else:
+                continue
+            needs_room = batch['class_type'] != 'online'
+            if needs_room:
+                room_slots.append((len(recurrences), day, hour, duration))
+            recurrences.append({
+                'id': len(recurrences) + 1,
+                'batch_id': batch['id'],
+                'teacher_user_id': teacher_user_id,
+                'classroom_id': None,
+                'frequency': 'weekly',
+                'weekday': day,
+                'start_time': time(hour),
+                'end_time': time(hour + duration),
+                'start_date': max(batch['start_date'], window_start),
+                'end_date': batch['end_date'],
+                'topic': f"{batch['subject']} class",
+                'generated_until': min(batch['end_date'], window_end),
+                'is_active': batch['is_active'],
+                'created_at': batch['created_at'],
+            })
+
+    # Classrooms: first fit into rooms, adding a room whenever none is free
+    room_count = max(1, int(len(room_slots) * 1.5 / (len(SLOT_DAYS) * len(SLOT_HOURS) * ROOM_UTILISATION)))
+    room_busy = set()
+    for index, day, hour, duration in room_slots:
+        room = rng.randrange(room_count)
+        for offset in range(room_count + 1):
+            candidate = (room + offset) % room_count if offset < room_count else room_count
+            if all((candidate, day, hour + h) not in room_busy for h in range(duration)):
+                break
+        if candidate == room_count:
+            room_count += 1
+        room_busy.update((candidate, day, hour + h) for h in range(duration))
+        recurrences[index]['classroom_id'] = candidate + 1
+
+    holidays = {}
+    month = date(window_start.year, window_start.month, 1)
+    while month <= window_end:
+        for _ in range(2):
+            day = month + timedelta(days=rng.randrange(28))
+            holidays[day] = rng.choice(['Poya Day', 'Public Holiday', 'Bank Holiday'])
+        month = (month + timedelta(days=32)).replace(day=1)
+
+    echo(f'Writing {teachers} teachers, {students} students, {batch_count} batches, {room_count} classrooms, '
+         f'{len(recurrences)} weekly slots over {weeks} weeks...')
+
+    admin = {'id': 1, 'name': 'Admin User', 'email': 'admin@nanapatha.com', 'role': 'admin', 'status': 'active',
+             'phone': None, 'created_at': stamp, 'updated_at': stamp}
+    teacher_users = ({
+        'id': row['user_id'], 'name': _person(rng), 'email': f"teacher{row['user_id']}@nanapatha.lk",
+        'role': 'teacher', 'status': rng.choices(['active', 'inactive', 'pending'], [92, 5, 3])[0],
+        'phone': _mobile(rng), 'created_at': _moment(rng, window_start - timedelta(days=730), window_start),
+        'updated_at': stamp,
+    } for row in teacher_rows)
+    counts['users'] = _bulk_insert(User.__table__, [admin], chunk_size) + \
+        _bulk_insert(User.__table__, teacher_users, chunk_size)
+    counts['teacher_profiles'] = _bulk_insert(TeacherProfile.__table__, ({
+        'id': i + 1, 'user_id': row['user_id'], 'subjects': row['subjects'], 'contact_number': _mobile(rng),
+        'bio': f"Teaches {', '.join(row['subjects'])}", 'active_flag': rng.random() < 0.95, 'updated_at': stamp,
+    } for i, row in enumerate(teacher_rows)), chunk_size)
+    counts['classrooms'] = _bulk_insert(Classroom.__table__, ({
+        'id': i + 1, 'name': f'Room {chr(65 + i % 6)}-{100 + i}', 'capacity': rng.choice(ROOM_CAPACITIES),
+        'location': f'{rng.choice(["Main", "Science", "New", "East"])} Building, Floor {i % 4 + 1}',
+        'is_active': True, 'notes': None, 'created_at': stamp, 'updated_at': stamp,
+    } for i in range(room_count)), chunk_size)
+    counts['batches'] = _bulk_insert(Batch.__table__, batches, chunk_size)
+
+    # Students: users and profiles written together, chunk by chunk
+    first_student = teachers + 2
+    counts['users'] += students
+    counts['student_profiles'] = students
+    for offset in range(0, students, chunk_size):
+        users, profiles = [], []
+        for i in range(offset, min(offset + chunk_size, students)):
+            user_id = first_student + i
+            created = _moment(rng, window_start - timedelta(days=730), anchor)
+            batch_id = assignment[i]
+            users.append({
+                'id': user_id, 'name': _person(rng), 'email': f'student{user_id}@example.lk', 'role': 'student',
+                'status': rng.choices(['active', 'inactive', 'pending'], [90, 7, 3])[0], 'phone': None,
+                'created_at': created, 'updated_at': stamp,
+            })
+            grade = batches[batch_id - 1]['grade'] if batch_id else _pick(rng, GRADE_WEIGHTS)
+            profiles.append({
+                'id': i + 1, 'user_id': user_id, 'dob': date(anchor.year - rng.randint(11, 19), rng.randint(1, 12),
+                                                             rng.randint(1, 28)),
+                'grade': grade, 'batch_id': batch_id, 'contact_number': _mobile(rng),
+                'address': f'{rng.randint(1, 500)} Main Road, {rng.choice(CITIES)}',
+                'class_type': batches[batch_id - 1]['class_type'] if batch_id else _pick(rng, CLASS_TYPE_WEIGHTS),
+                'student_id_number': f'NP{created.year}{i + 1:07d}', 'updated_at': stamp,
+            })
+        with db.engine.begin() as conn:
+            conn.execute(User.__table__.insert(), users)
+            conn.execute(StudentProfile.__table__.insert(), profiles)
+
+    def registration_rows():
+        for i in range(students // 4):
+            submitted = _moment(rng, window_start, anchor)
+            status = rng.choices(['accepted', 'rejected', 'pending'], [70, 20, 10])[0]
+            existing = rng.random() < 0.25
+            claimed = status == 'pending' and rng.random() < 0.3
+            yield {
+                'id': i + 1, 'name': _person(rng), 'email': f'applicant{i + 1}@example.lk', 'mobile': _mobile(rng),
+                'address': f'{rng.randint(1, 500)} Temple Road, {rng.choice(CITIES)}',
+                'dob': date(anchor.year - rng.randint(11, 19), rng.randint(1, 12), rng.randint(1, 28)),
+                'grade': _pick(rng, GRADE_WEIGHTS), 'class_type': _pick(rng, CLASS_TYPE_WEIGHTS),
+                'selected_batch_id': None if existing else rng.randint(1, batch_count),
+                'student_id_number': f'NP{submitted.year - 1}{rng.randrange(10 ** 6):06d}' if existing else None,
+                'registration_type': 'existing' if existing else 'new',
+                'payment_status': 'paid' if existing or status == 'accepted'
+                else rng.choices(['pending', 'paid', 'failed'], [6, 3, 1])[0],
+                'payment_amount': None if existing else rng.choice([12000, 15000, 18000]),
+                'payment_method': None if existing else rng.choice(['cash', 'bank_transfer', 'online_payment']),
+                'status': status,
+                'claimed_by': 'Admin User' if claimed else None,
+                'claimed_at': submitted + timedelta(hours=rng.randint(1, 48)) if claimed else None,
+                'admin_note': None, 'version': 1, 'submitted_at': submitted,
+                'processed_at': None if status == 'pending' else submitted + timedelta(days=rng.randint(0, 7)),
+                'updated_at': stamp,
+            }
+
+    counts['registration_requests'] = _bulk_insert(RegistrationRequest.__table__, registration_rows(), chunk_size)
+    counts['holidays'] = _bulk_insert(Holiday.__table__, (
+        {'id': i + 1, 'date': day, 'name': name} for i, (day, name) in enumerate(sorted(holidays.items()))
+    ), chunk_size)
+    counts['session_recurrences'] = _bulk_insert(SessionRecurrence.__table__, recurrences, chunk_size)
+
+    def session_rows():
+        session_id = 0
+        for rule in recurrences:
+            day = rule['start_date'] + timedelta(days=(rule['weekday'] - rule['start_date'].weekday()) % 7)
+            while day <= rule['generated_until']:
+                if day not in holidays:
+                    session_id += 1
+                    if day < anchor:
+                        status = 'completed' if rng.random() < 0.94 else 'cancelled'
+                    else:
+                        status = 'scheduled' if rng.random() < 0.98 else 'cancelled'
+                    yield {
+                        'id': session_id, 'batch_id': rule['batch_id'], 'teacher_user_id': rule['teacher_user_id'],
+                        'classroom_id': rule['classroom_id'], 'date': day, 'start_time': rule['start_time'],
+                        'end_time': rule['end_time'], 'topic': rule['topic'], 'status': status,
+                        'recurrence_id': rule['id'], 'updated_at': stamp,
+                    }
+                day += timedelta(days=7)
+
+    counts['class_sessions'] = _bulk_insert(ClassSession.__table__, session_rows(), chunk_size)
+
+    _advance_sequences([model.__table__ for model in (User, TeacherProfile, Classroom, Batch, StudentProfile,
+                                                      RegistrationRequest, Holiday, SessionRecurrence,
+                                                      ClassSession)])
+    return counts
+
+
 if __name__ == '__main__':
-    create_sample_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Fill the database with sample data, or with a large '
+                                                 'synthetic dataset when --students is given')
+    parser.add_argument('--students', type=int, help='number of students to generate')
+    parser.add_argument('--teachers', type=int, help='number of teachers (default: students / 100)')
+    parser.add_argument('--weeks', type=int, default=12, help='weeks of class sessions (default: 12)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--anchor', type=date.fromisoformat,
+                        help='"today" for generated dates, YYYY-MM-DD (default: today)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='rows per INSERT transaction')
+    args = parser.parse_args()
+
+    if args.students is None:
+        create_sample_data()
+    else:
+        started = datetime.now()
+        with app.app_context():
+            counts = generate_dataset(args.students, args.teachers, args.weeks, args.seed, args.anchor,
+                                      args.chunk_size)
+        for table, count in counts.items():
+            print(f'- {table}: {count}')
+        print(f'{sum(counts.values())} rows in {(datetime.now() - started).total_seconds():.1f}s')
@@ -0,0 +1,87 @@
+"""Aggregate statistics computed in the database rather than in templates."""
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import db, User, StudentProfile, RegistrationRequest
+
+
+def batch_enrollment_counts(batch_ids=None):
+    """Return {batch_id: enrolled students} from one grouped COUNT.
+
+    ``batch_ids`` may be a list of ids or a query selecting ``Batch.id``;
+    batches without students are simply absent from the result.
+    """
+    query = db.session.query(
+        StudentProfile.batch_id,
+        func.count(StudentProfile.id)
+    ).filter(StudentProfile.batch_id.isnot(None))
+
+    if batch_ids is not None:
+        if isinstance(batch_ids, (list, tuple, set)) and not batch_ids:
+            return {}
+        query = query.filter(StudentProfile.batch_id.in_(batch_ids))
+
+    return dict(query.group_by(StudentProfile.batch_id).all())
+
+
+class StatsCache:
+    """In-process cache for the dashboard counters.
+
+    Write routes keep the cached values current with ``adjust`` when they know
+    the exact change, or drop them with ``invalidate``; every value also
+    expires after ``ttl`` seconds in case another worker changed the data.
+    """
+
+    def __init__(self, loaders, ttl=30):
+        self.loaders = loaders
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and now - cached[1] < self.ttl:
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        value = self.loaders[key]()
+        with self._lock:
+            self._values[key] = (value, now)
+        return value
+
+    def adjust(self, key, delta):
+        """Apply a known change to a cached counter (write-through)"""
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None:
+                self._values[key] = (max(0, cached[0] + delta), cached[1])
+
+    def invalidate(self, *keys):
+        """Forget the given counters, or all of them when called without keys"""
+        with self._lock:
+            for key in keys or list(self._values):
+                self._values.pop(key, None)
+
+    def info(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'cached': sorted(self._values),
+            }
+
+
+stats_cache = StatsCache({
+    'active_students': lambda: User.query.filter_by(role='student', status='active').count(),
+    'active_teachers': lambda: User.query.filter_by(role='teacher', status='active').count(),
+    'pending_registrations': lambda: RegistrationRequest.query.filter_by(status='pending').count(),
+})
@@ -0,0 +1,353 @@
+"""Weekly timetable solver for batches, teachers and classrooms.
+
+``TimetableSolver`` is a greedy placer with a repair step: batches are taken
+most-constrained first and each required session goes to the best free
+(day, hour, room) - spreading a batch over different days and using the
+smallest room that seats its enrollment. When nothing is free it tries to
+move one already placed session out of the way. The solver itself works on
+plain records so it can be benchmarked without a database; ``plan_week``
+loads the demand from the models and diffs the result against the sessions
+already in the week.
+"""
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import or_
+
+from models import db, Batch, Classroom, ClassSession, TeacherProfile
+from scheduling import INACTIVE_STATUSES
+from stats import batch_enrollment_counts
+
+# Teaching days (0 = Monday) and session start hours considered by default
+DEFAULT_DAYS = (0, 1, 2, 3, 4, 5)
+DEFAULT_HOURS = tuple(range(8, 20))
+
+# Placements tried when repairing one unplaceable session
+MAX_REPAIR_ATTEMPTS = 50
+
+Demand = namedtuple('Demand', 'batch_id teacher_id enrollment needs_room sessions duration')
+Room = namedtuple('Room', 'id capacity')
+Placement = namedtuple('Placement', 'batch_id day hour duration room_id teacher_id')
+
+
+class TimetableSolver:
+    """Place weekly sessions without room, teacher or batch double-booking"""
+
+    def __init__(self, rooms, days=DEFAULT_DAYS, hours=DEFAULT_HOURS, busy=()):
+        self.rooms = sorted(rooms, key=lambda room: (room.capacity, room.id))
+        self.capacities = [room.capacity for room in self.rooms]
+        self.room_capacity = {room.id: room.capacity for room in self.rooms}
+        self.days = tuple(days)
+        self.hours = tuple(hours)
+        self.last_hour = max(self.hours)
+        # (kind, id, day, hour) -> placement index, or None for fixed bookings
+        self.occupied = {}
+        for cell in busy:
+            self.occupied[cell] = None
+        # (day, hour) -> sorted (capacity, room_id) of rooms still free then
+        self.free_rooms = {
+            (day, hour): [(room.capacity, room.id) for room in self.rooms
+                          if ('room', room.id, day, hour) not in self.occupied]
+            for day in self.days for hour in range(min(self.hours), self.last_hour + 1)
+        }
+        self.placements = []
+        self.demands = {}
+        self.slot_load = defaultdict(int)
+        # batch_id -> {day: sessions placed that day}
+        self.batch_days = defaultdict(Counter)
+
+    def _cells(self, demand, day, hour, room_id):
+        for h in range(hour, hour + demand.duration):
+            yield ('batch', demand.batch_id, day, h)
+            if demand.teacher_id:
+                yield ('teacher', demand.teacher_id, day, h)
+            if room_id:
+                yield ('room', room_id, day, h)
+
+    def _free(self, demand, day, hour, room_id):
+        return all(cell not in self.occupied for cell in self._cells(demand, day, hour, room_id))
+
+    def _fits_day(self, demand, hour):
+        return hour + demand.duration - 1 <= self.last_hour
+
+    def _person_free(self, demand, day, hour):
+        for h in range(hour, hour + demand.duration):
+            if ('batch', demand.batch_id, day, h) in self.occupied:
+                return False
+            if demand.teacher_id and ('teacher', demand.teacher_id, day, h) in self.occupied:
+                return False
+        return True
+
+    def _room_free(self, room_id, day, hour, duration):
+        return all(('room', room_id, day, h) not in self.occupied for h in range(hour, hour + duration))
+
+    def _room_candidates(self, demand):
+        start = bisect_left(self.capacities, demand.enrollment)
+        return self.rooms[start:]
+
+    def _smallest_free_room(self, demand, day, hour):
+        # Batch and teacher are already known to be free, so only rooms are checked
+        free = self.free_rooms[(day, hour)]
+        for capacity, room_id in free[bisect_left(free, (demand.enrollment, 0)):]:
+            if demand.duration == 1 or self._room_free(room_id, day, hour, demand.duration):
+                return room_id
+        return None
+
+    def _place(self, demand, day, hour, room_id):
+        index = len(self.placements)
+        self.placements.append(Placement(demand.batch_id, day, hour, demand.duration, room_id, demand.teacher_id))
+        for cell in self._cells(demand, day, hour, room_id):
+            self.occupied[cell] = index
+        if room_id:
+            for h in range(hour, hour + demand.duration):
+                self.free_rooms[(day, h)].remove((self.room_capacity[room_id], room_id))
+        self.slot_load[(day, hour)] += 1
+        self.batch_days[demand.batch_id][day] += 1
+        return index
+
+    def _unplace(self, index):
+        placement = self.placements[index]
+        demand = self.demands[placement.batch_id]
+        for cell in self._cells(demand, placement.day, placement.hour, placement.room_id):
+            del self.occupied[cell]
+        if placement.room_id:
+            for h in range(placement.hour, placement.hour + placement.duration):
+                insort(self.free_rooms[(placement.day, h)], (self.room_capacity[placement.room_id], placement.room_id))
+        self.slot_load[(placement.day, placement.hour)] -= 1
+        self.batch_days[placement.batch_id][placement.day] -= 1
+        self.placements[index] = None
+
+    def _score(self, demand, day, hour):
+        # Lower is better: spread a batch across days, then balance slot load
+        return (self.batch_days[demand.batch_id][day], self.slot_load[(day, hour)], hour, day)
+
+    def _best_slot(self, demand):
+        # The score does not depend on the room, so rooms are only searched
+        # for slots in score order until one has a free room
+        slots = sorted(
+            (self._score(demand, day, hour), day, hour)
+            for day in self.days for hour in self.hours
+            if self._fits_day(demand, hour) and self._person_free(demand, day, hour)
+        )
+        for score, day, hour in slots:
+            if not demand.needs_room:
+                return score, day, hour, None
+            room_id = self._smallest_free_room(demand, day, hour)
+            if room_id is not None:
+                return score, day, hour, room_id
+        return None
+
+    def _repair(self, demand):
+        """Move one blocking session elsewhere so that ``demand`` fits"""
+        attempts = 0
+        # Batches that found no other slot; trying them again cannot succeed
+        stuck = set()
+        used_days = self.batch_days[demand.batch_id]
+        for day in sorted(self.days, key=lambda d: used_days[d]):
+            for hour in self.hours:
+                if not self._fits_day(demand, hour):
+                    continue
+                rooms = [room.id for room in self._room_candidates(demand)] if demand.needs_room else [None]
+                for room_id in rooms:
+                    blockers = {self.occupied[cell] for cell in self._cells(demand, day, hour, room_id)
+                                if cell in self.occupied}
+                    if len(blockers) != 1 or None in blockers:
+                        continue
+                    blocker = blockers.pop()
+                    if self.placements[blocker].batch_id in stuck or self.placements[blocker].batch_id == demand.batch_id:
+                        continue
+
+                    attempts += 1
+                    moved = self.placements[blocker]
+                    moved_demand = self.demands[moved.batch_id]
+                    self._unplace(blocker)
+                    index = self._place(demand, day, hour, room_id)
+                    relocation = self._best_slot(moved_demand)
+                    if relocation is not None:
+                        self._place(moved_demand, relocation[1], relocation[2], relocation[3])
+                        return True
+
+                    # Undo and keep looking
+                    self._unplace(index)
+                    self._place(moved_demand, moved.day, moved.hour, moved.room_id)
+                    stuck.add(moved.batch_id)
+                    if attempts >= MAX_REPAIR_ATTEMPTS:
+                        return False
+        return False
+
+    def solve(self, demands, preferred=None):
+        """Place every demanded session.
+
+        ``preferred`` maps batch_id to existing (day, hour, room_id) slots
+        that are kept when still valid, so re-planning a week is stable.
+        Returns (placements, unplaced) where unplaced lists
+        ``(batch_id, missing_sessions)``.
+        """
+        preferred = preferred or {}
+        for demand in demands:
+            self.demands[demand.batch_id] = demand
+
+        def difficulty(demand):
+            rooms = len(self._room_candidates(demand)) if demand.needs_room else len(self.rooms) + 1
+            return (rooms, -demand.sessions * demand.duration, demand.batch_id)
+
+        # Demand shapes that repair already failed for; placements only ever
+        # use up space, so retrying them for another batch is wasted work
+        hopeless = set()
+        unplaced = []
+        for demand in sorted(demands, key=difficulty):
+            shape = (demand.teacher_id, demand.needs_room and bisect_left(self.capacities, demand.enrollment),
+                     demand.duration)
+            placed = 0
+            for day, hour, room_id in preferred.get(demand.batch_id, ()):
+                if placed >= demand.sessions:
+                    break
+                if demand.needs_room and self.room_capacity.get(room_id, -1) < demand.enrollment:
+                    continue
+                if room_id not in self.room_capacity:
+                    room_id = None  # Online batch whose old room was deactivated; it needs none
+                if day in self.days and hour in self.hours and self._fits_day(demand, hour) \
+                        and self._free(demand, day, hour, room_id):
+                    self._place(demand, day, hour, room_id)
+                    placed += 1
+
+            for _ in range(demand.sessions - placed):
+                best = self._best_slot(demand)
+                if best is not None:
+                    self._place(demand, best[1], best[2], best[3])
+                    placed += 1
+                elif shape not in hopeless and self._repair(demand):
+                    placed += 1
+                else:
+                    hopeless.add(shape)
+                    break
+
+            if placed < demand.sessions:
+                unplaced.append((demand.batch_id, demand.sessions - placed))
+
+        return [p for p in self.placements if p], unplaced
+
+
+def plan_week(week_start, sessions_per_batch=2, duration=1, batch_ids=None, days=DEFAULT_DAYS, hours=DEFAULT_HOURS):
+    """Solve a week for active batches and diff it against existing sessions.
+
+    Scheduled sessions of the planned batches are re-planned (keeping their
+    current slots where possible); completed sessions and sessions of every
+    other batch are fixed.
+    Returns {'week_start', 'add', 'keep', 'remove', 'unplaced'}.
+    """
+    week_start = week_start - timedelta(days=week_start.weekday())
+    week_end = week_start + timedelta(days=6)
+
+    batch_query = Batch.query.filter(Batch.is_active == True)
+    if batch_ids:
+        batch_query = batch_query.filter(Batch.id.in_(batch_ids))
+    batches = batch_query.all()
+    planned_ids = {batch.id for batch in batches}
+
+    enrollment = batch_enrollment_counts([batch.id for batch in batches])
+    teacher_ids = [batch.teacher_id for batch in batches if batch.teacher_id]
+    teacher_users = dict(db.session.query(TeacherProfile.id, TeacherProfile.user_id)
+                         .filter(TeacherProfile.id.in_(teacher_ids))) if teacher_ids else {}
+    demands = [
+        Demand(
+            batch_id=batch.id,
+            teacher_id=teacher_users.get(batch.teacher_id),
+            enrollment=enrollment.get(batch.id, 0),
+            needs_room=batch.class_type != 'online',
+            sessions=sessions_per_batch,
+            duration=duration
+        )
+        for batch in batches
+    ]
+    rooms = [Room(room_id, capacity or 0) for room_id, capacity
+             in db.session.query(Classroom.id, Classroom.capacity).filter(Classroom.is_active == True)]
+
+    # Existing sessions: fixed for other batches, preferred for planned ones
+    busy = []
+    preferred = defaultdict(list)
+    existing = []
+    completed = defaultdict(int)
+    for session in ClassSession.query.filter(
+        ClassSession.date >= week_start,
+        ClassSession.date <= week_end,
+        or_(ClassSession.status.is_(None), ClassSession.status.notin_(INACTIVE_STATUSES))
+    ):
+        day = session.date.weekday()
+        end_hour = session.end_time.hour + (1 if session.end_time.minute else 0)
+        if session.batch_id in planned_ids and session.status != 'completed':
+            existing.append(session)
+            if session.start_time.minute == 0:
+                preferred[session.batch_id].append((day, session.start_time.hour, session.classroom_id))
+            continue
+        if session.batch_id in planned_ids:
+            completed[session.batch_id] += 1
+        for hour in range(session.start_time.hour, max(end_hour, session.start_time.hour + 1)):
+            busy.append(('batch', session.batch_id, day, hour))
+            if session.teacher_user_id:
+                busy.append(('teacher', session.teacher_user_id, day, hour))
+            if session.classroom_id:
+                busy.append(('room', session.classroom_id, day, hour))
+
+    demands = [demand._replace(sessions=max(demand.sessions - completed[demand.batch_id], 0))
+               for demand in demands]
+    solver = TimetableSolver(rooms, days=days, hours=hours, busy=busy)
+    placements, unplaced = solver.solve(demands, preferred)
+
+    def as_dict(placement):
+        return {
+            'batch_id': placement.batch_id,
+            'date': (week_start + timedelta(days=placement.day)).isoformat(),
+            'start_time': time(placement.hour).strftime('%H:%M'),
+            'end_time': time(placement.hour + placement.duration).strftime('%H:%M')
+            if placement.hour + placement.duration < 24 else '23:59',
+            'classroom_id': placement.room_id,
+            'teacher_user_id': placement.teacher_id,
+        }
+
+    proposed = [as_dict(placement) for placement in placements]
+    remaining = {}
+    for session in existing:
+        key = (session.batch_id, session.date.isoformat(), session.start_time.strftime('%H:%M'),
+               session.end_time.strftime('%H:%M'), session.classroom_id)
+        remaining.setdefault(key, []).append(session)
+
+    diff = {'week_start': week_start.isoformat(), 'add': [], 'keep': [], 'remove': [], 'unplaced': []}
+    for item in proposed:
+        key = (item['batch_id'], item['date'], item['start_time'], item['end_time'], item['classroom_id'])
+        if remaining.get(key):
+            session = remaining[key].pop()
+            diff['keep'].append({'session_id': session.id, **item})
+        else:
+            diff['add'].append(item)
+    for sessions in remaining.values():
+        for session in sessions:
+            diff['remove'].append({'session_id': session.id, 'batch_id': session.batch_id,
+                                   'date': session.date.isoformat(),
+                                   'start_time': session.start_time.strftime('%H:%M')})
+    diff['unplaced'] = [{'batch_id': batch_id, 'missing_sessions': missing} for batch_id, missing in unplaced]
+    return diff
+
+
+def apply_plan(diff):
+    """Write a plan: insert added sessions and cancel removed ones"""
+    rows = [{
+        'batch_id': item['batch_id'],
+        'teacher_user_id': item['teacher_user_id'],
+        'classroom_id': item['classroom_id'],
+        'date': datetime.strptime(item['date'], '%Y-%m-%d').date(),
+        'start_time': datetime.strptime(item['start_time'], '%H:%M').time(),
+        'end_time': datetime.strptime(item['end_time'], '%H:%M').time(),
+        'status': 'scheduled',
+    } for item in diff['add']]
+    if rows:
+        db.session.execute(ClassSession.__table__.insert(), rows)
+
+    removed = [item['session_id'] for item in diff['remove']]
+    if removed:
+        ClassSession.query.filter(ClassSession.id.in_(removed)).update(
+            {ClassSession.status: 'cancelled'}, synchronize_session=False
+        )
+    db.session.commit()
+    return {'added': len(rows), 'cancelled': len(removed)}